@@ -4,8 +4,7 @@ from treeherder.autoclassify.matchers import (crash_signature_matcher,
 from treeherder.model.models import (BugJobMap,
                                      ClassifiedFailure,
                                      JobNote,
-                                     TextLogError,
-                                     TextLogErrorMatch)
+                                     TextLogError)
 
 from .utils import (crash_line,
                     create_lines,
@@ -233,10 +232,7 @@ def test_classify_crash(test_repository, test_job, test_job_2, test_matcher):
                                      (crash_line, {"signature": None})])
 
     classified_failure = ClassifiedFailure.objects.create()
-    TextLogErrorMatch.objects.create(text_log_error=error_lines_ref[0],
-                                     classified_failure=classified_failure,
-                                     matcher_name=test_matcher.__class__.__name__,
-                                     score=1.0)
+    error_lines_ref[0].create_match(test_matcher.__class__.__name__, classified_failure)
     do_autoclassify(test_job_2, failure_lines, [crash_signature_matcher])
 
     expected_classified = failure_lines[0:2]
@@ -4,12 +4,16 @@ from first import first
 
 from treeherder.autoclassify.matchers import precise_matcher
 from treeherder.autoclassify.utils import score_matches
-from treeherder.model.models import (FailureLine,
+from treeherder.model.models import (ClassifiedFailure,
+                                     ClassifiedFailureIndex,
+                                     FailureLine,
                                      TextLogErrorMatch,
                                      TextLogErrorMetadata)
 
 from .utils import (create_failure_lines,
-                    create_text_log_errors)
+                    create_lines,
+                    create_text_log_errors,
+                    test_line)
 
 
 def test_precise_matcher_with_matches(classified_failures):
@@ -76,3 +80,38 @@ def test_scored_matches_with_manipulated_score(classified_failures):
 
     score, _ = first(results)
     assert score == Decimal('0.8')
+
+
+def test_precise_matcher_best_first(classified_failures, test_job_2, test_matcher):
+    tle = TextLogErrorMatch.objects.first().text_log_error
+    best, other = classified_failures[0], ClassifiedFailure.objects.create()
+
+    # the same line in another job matched less well to a different classification
+    (tle_2,), _ = create_lines(test_job_2, [(test_line, {})])
+    match = TextLogErrorMatch.objects.create(text_log_error=tle_2, classified_failure=other,
+                                             matcher_name=test_matcher, score=Decimal('0.8'))
+    ClassifiedFailureIndex.objects.add_matches([match])
+
+    assert list(precise_matcher(tle)) == [(Decimal(1), best.id), (Decimal('0.8'), other.id)]
+
+
+def test_precise_matcher_ignores_ignored_lines(classified_failures):
+    tle = TextLogErrorMatch.objects.first().text_log_error
+    assert precise_matcher(tle) is not None
+
+    # lines marked as ignored are not considered for autoclassification
+    tle.verify_classification(None)
+    assert precise_matcher(tle) is None
+
+    tle.verify_classification(classified_failures[0])
+    matched = {classified_failure_id for _, classified_failure_id in precise_matcher(tle)}
+    assert classified_failures[0].id in matched
+
+
+def test_classification_index_replace(classified_failures):
+    classified_failures[1].set_bug(1234)
+    classified_failures[0].set_bug(1234)
+
+    assert set(ClassifiedFailureIndex.objects.values_list('classified_failure', flat=True)) == {
+        classified_failures[1].id}
+    assert ClassifiedFailureIndex.objects.count() == 2
@@ -1,6 +1,8 @@
 import copy
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from tests import test_utils
 from tests.sample_data_generator import job_data
@@ -8,7 +10,8 @@ from treeherder.etl.jobs import (_remove_existing_jobs,
                                  store_job_data)
 from treeherder.etl.push import store_push_data
 from treeherder.model.models import (Job,
-                                     JobLog)
+                                     JobLog,
+                                     reference_data_deleted)
 
 
 def test_ingest_single_sample_job(test_repository, failure_classifications,
@@ -302,3 +305,67 @@ def test_ingest_job_with_updated_job_group(test_repository, failure_classificati
 
     assert second_job.job_group.name == second_job_datum["job"]["group_name"]
     assert first_job.job_group.name == first_job_datum["job"]["group_name"]
+
+
+def test_ingest_job_reference_data_cached(test_repository, failure_classifications,
+                                          sample_data, sample_push, mock_log_parser):
+    """Reference data is only looked up in the database until it's cached"""
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data[:3])
+    for datum in job_data:
+        datum['revision'] = sample_push[0]['revision']
+    # The later jobs have the same reference data as the first.
+    for datum in job_data[1:]:
+        datum['job'] = dict(job_data[0]['job'], job_guid=datum['job']['job_guid'])
+    reference_tables = ('build_platform', 'machine_platform', 'machine', 'job_type',
+                        'job_group', 'product', 'reference_data_signatures',
+                        'option_collection', 'failure_classification')
+
+    def reference_data_queries(datum):
+        with CaptureQueriesContext(connection) as captured:
+            store_job_data(test_repository, [datum])
+        return [query['sql'] for query in captured.captured_queries
+                if any('FROM `{}`'.format(table) in query['sql'] or
+                       'INTO `{}`'.format(table) in query['sql']
+                       for table in reference_tables)]
+
+    assert reference_data_queries(job_data[0])
+    assert not reference_data_queries(job_data[1])
+    assert Job.objects.count() == 2
+
+    # Deleting reference data drops the cached copies.
+    reference_data_deleted()
+    assert reference_data_queries(job_data[2])
+
+
+def test_ingest_job_writes_job_once(test_repository, failure_classifications,
+                                    sample_data, sample_push, mock_log_parser):
+    """A new job is stored with a single statement"""
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data[:1])
+    job_data[0]['revision'] = sample_push[0]['revision']
+
+    with CaptureQueriesContext(connection) as captured:
+        store_job_data(test_repository, job_data)
+
+    job_writes = [query['sql'] for query in captured.captured_queries
+                  if query['sql'].startswith(('INSERT INTO `job` ', 'UPDATE `job` '))]
+    assert len(job_writes) == 1
+    job = Job.objects.get()
+    assert job.guid == job_data[0]['job']['job_guid']
+    assert job.state == 'completed'
+    assert job.failure_classification.name == 'not classified'
+
+
+def test_job_upsert_keeps_completed_jobs(test_job):
+    """Updates racing the completion of a job don't undo it"""
+    stale_job = Job.objects.get(id=test_job.id)
+    stale_job.id = None
+    stale_job.state = 'pending'
+    stale_job.result = 'unknown'
+
+    assert Job.objects.upsert(stale_job, update_fields=['state', 'result']) == test_job.id
+
+    test_job.refresh_from_db()
+    assert test_job.state == 'completed'
+    assert test_job.result != 'unknown'
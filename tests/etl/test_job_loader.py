@@ -1,3 +1,4 @@
+import asyncio
 import copy
 import uuid
 
@@ -7,11 +8,13 @@ import slugid
 
 from treeherder.etl.exceptions import MissingPushException
 from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.taskcluster_pulse import handler
 from treeherder.etl.taskcluster_pulse.handler import handleMessage
 from treeherder.model.models import (Job,
                                      JobDetail,
                                      JobLog,
                                      TaskclusterMetadata)
+from treeherder.utils.cache import LRUCache
 
 
 @pytest.fixture
@@ -73,6 +76,31 @@ async def new_pulse_jobs(sample_data, test_repository, push_stored):
     return jobs
 
 
+def test_task_definitions_fetched_once(sample_data, monkeypatch):
+    """The definition of a task is fetched once for all the messages about it"""
+    messages = list(copy.deepcopy(sample_data.taskcluster_pulse_messages).values())
+    tasks = copy.deepcopy(sample_data.taskcluster_tasks)
+    fetched = []
+
+    class Queue:
+        def __init__(self, options, session=None):
+            pass
+
+        async def task(self, taskId):
+            fetched.append(taskId)
+            return tasks[taskId]
+
+    monkeypatch.setattr(handler.taskcluster.aio, 'Queue', Queue)
+    monkeypatch.setattr(handler, 'taskDefinitions', LRUCache(100))
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(handler.prefetchTaskDefinitions(messages + messages))
+    for message in messages:
+        loop.run_until_complete(handleMessage(message))
+
+    assert sorted(fetched) == sorted({message["payload"]["status"]["taskId"] for message in messages})
+
+
 @pytest.fixture
 def new_transformed_jobs(sample_data, test_repository, push_stored):
     revision = push_stored[0]["revisions"][0]["revision"]
@@ -204,6 +232,49 @@ def test_ingest_pulse_jobs_with_missing_push(pulse_jobs):
     assert Job.objects.count() == 0
 
 
+def test_ingest_pulse_jobs_batch(pulse_jobs, test_repository, push_stored,
+                                 failure_classifications, mock_log_parser):
+    """
+    Ingest a batch of jobs together, skipping those which can't be stored yet
+    """
+    revision = push_stored[0]["revision"]
+    for job in pulse_jobs:
+        job["origin"]["revision"] = revision
+    missing_push_job = copy.deepcopy(pulse_jobs[0])
+    missing_push_job["taskId"] = "e4f8e4c6-9fd7-4f4c-bbd5-1d1ab3b0e4b2/0"
+    missing_push_job["origin"]["revision"] = "1234567890123456789012345678901234567890"
+
+    failed = JobLoader().process_jobs(pulse_jobs + [missing_push_job], 'https://tc.example.com')
+
+    assert [(job, type(e)) for (job, e) in failed] == [(missing_push_job, MissingPushException)]
+    assert Job.objects.count() == 5
+    assert TaskclusterMetadata.objects.count() == 5
+    assert [{"name": item.name, "url": item.url} for item in JobLog.objects.filter(job_id=1)] == [
+        {"name": "builds-4h",
+         "url": "http://ftp.mozilla.org/pub/mozilla.org/spidermonkey/tinderbox-builds/mozilla-inbound-linux64/mozilla-inbound_linux64_spidermonkey-warnaserr-bm57-build1-build352.txt.gz"},
+        {"name": "errorsummary_json",
+         "url": "http://mozilla-releng-blobs.s3.amazonaws.com/blobs/Mozilla-Inbound-Non-PGO/sha512/05c7f57df6583c6351c6b49e439e2678e0f43c2e5b66695ea7d096a7519e1805f441448b5ffd4cc3b80b8b2c74b244288fda644f55ed0e226ef4e25ba02ca466"}]
+
+
+def test_ingest_pulse_jobs_batch_transitions(first_job, failure_classifications,
+                                             mock_log_parser):
+    """
+    The state transitions of a job within a batch follow the usual rules
+    """
+    completed = copy.deepcopy(first_job)
+    completed["state"] = "completed"
+    completed["result"] = "fail"
+    pending = copy.deepcopy(first_job)
+    pending["state"] = "pending"
+    pending["result"] = "unknown"
+
+    assert JobLoader().process_jobs([completed, pending], 'https://tc.example.com') == []
+
+    job = Job.objects.get()
+    assert job.state == "completed"
+    assert job.result == "testfailed"
+
+
 def test_transition_pending_running_complete(first_job,
                                              failure_classifications,
                                              mock_log_parser):
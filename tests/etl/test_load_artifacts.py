@@ -1,6 +1,11 @@
+import datetime
 import json
 
-from treeherder.etl.artifact import store_job_artifacts
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.etl.artifact import (parse_step_time,
+                                     store_job_artifacts)
 from treeherder.model.models import (JobDetail,
                                      TextLogError,
                                      TextLogStep)
@@ -110,3 +115,111 @@ def test_load_non_ascii_textlog_errors(test_job):
     assert TextLogError.objects.count() == 2
     assert TextLogError.objects.get(line_number=1587).line == '07:51:28  WARNING - \U000000c3'
     assert TextLogError.objects.get(line_number=1588).line == '07:51:29  WARNING - <U+01D400>'
+
+
+def test_load_textlog_summary_in_bulk(test_job):
+    steps = [{
+        'name': 'step {}'.format(i),
+        'started': '2016-05-10 12:44:23.103904',
+        'started_linenumber': i * 100,
+        'finished_linenumber': i * 100 + 99,
+        'finished': '2016-05-10T13:44:23+01:00',
+        'result': 'testfailed',
+        'errors': [{'line': 'TEST-UNEXPECTED-FAIL | {}'.format(j), 'linenumber': i * 100 + j}
+                   for j in range(50)]
+    } for i in range(5)]
+    text_log_summary_artifact = {
+        'type': 'json',
+        'name': 'text_log_summary',
+        'blob': json.dumps({'step_data': {'steps': steps}}),
+        'job_guid': test_job.guid
+    }
+
+    with CaptureQueriesContext(connection) as captured:
+        store_job_artifacts([text_log_summary_artifact])
+
+    assert len([query for query in captured.captured_queries
+                if query['sql'].startswith('INSERT')]) == 2
+    assert TextLogStep.objects.count() == 5
+    assert TextLogError.objects.count() == 250
+    for step in TextLogStep.objects.all():
+        assert step.started == datetime.datetime(2016, 5, 10, 12, 44, 23, 103904)
+        assert step.finished == datetime.datetime(2016, 5, 10, 13, 44, 23)
+        assert step.errors.count() == 50
+        assert all(step.started_line_number <= error.line_number <= step.finished_line_number
+                   for error in step.errors.all())
+
+
+def test_parse_step_time():
+    assert parse_step_time('2016-05-10 12:44:23.103904') == datetime.datetime(2016, 5, 10, 12, 44, 23, 103904)
+    assert parse_step_time('2016-05-10T12:44:23Z') == datetime.datetime(2016, 5, 10, 12, 44, 23)
+    assert parse_step_time('May 10 2016 12:44') == datetime.datetime(2016, 5, 10, 12, 44)
+
+
+def test_load_unserialized_artifacts(test_job):
+    """artifacts passed within a process needn't have their blobs serialized"""
+    store_job_artifacts([{
+        'type': 'json',
+        'name': 'Job Info',
+        'blob': {'job_details': [{'title': 'mytitle', 'value': 'myvalue'}]},
+        'job_guid': test_job.guid
+    }, {
+        'type': 'json',
+        'name': 'text_log_summary',
+        'blob': {'step_data': {'steps': [{
+            'name': 'foo',
+            'started_linenumber': 8,
+            'finished_linenumber': 10,
+            'result': 'testfailed',
+            'errors': [{'line': 'TEST-UNEXPECTED-FAIL | foo', 'linenumber': 9}]
+        }]}},
+        'job_guid': test_job.guid
+    }])
+
+    assert list(JobDetail.objects.values_list('title', 'value')) == [('mytitle', 'myvalue')]
+    assert list(TextLogError.objects.values_list('line', flat=True)) == ['TEST-UNEXPECTED-FAIL | foo']
+
+
+def test_load_job_details_in_bulk(test_job):
+    def job_info_artifact(job_details):
+        return {
+            'type': 'json',
+            'name': 'Job Info',
+            'blob': json.dumps({'job_details': job_details}),
+            'job_guid': test_job.guid
+        }
+
+    job_details = [{'title': 'title {}'.format(i), 'value': 'value {}'.format(i)}
+                   for i in range(100)]
+    store_job_artifacts([job_info_artifact(job_details + job_details[:10])])
+    assert JobDetail.objects.count() == 100
+
+    job_details[0]['url'] = 'https://example.com/'
+    job_details.append({'title': 'new title', 'value': 'new value'})
+    with CaptureQueriesContext(connection) as captured:
+        store_job_artifacts([job_info_artifact(job_details)])
+
+    # the job, its existing details, one update and one insert
+    assert len([query for query in captured.captured_queries
+                if 'SAVEPOINT' not in query['sql']]) == 4
+    assert JobDetail.objects.count() == 101
+    assert JobDetail.objects.get(title='title 0').url == 'https://example.com/'
+    assert JobDetail.objects.get(title='new title').value == 'new value'
+
+
+def test_load_job_details_differing_in_case(test_job):
+    def job_info_artifact(job_details):
+        return {
+            'type': 'json',
+            'name': 'Job Info',
+            'blob': json.dumps({'job_details': job_details}),
+            'job_guid': test_job.guid
+        }
+
+    store_job_artifacts([job_info_artifact([{'title': 'Title', 'value': 'Value'}])])
+    # the same detail as far as the unique index is concerned, so it's updated
+    store_job_artifacts([job_info_artifact([{'title': 'title', 'value': 'value ',
+                                             'url': 'https://example.com/'}])])
+
+    assert JobDetail.objects.count() == 1
+    assert JobDetail.objects.get().url == 'https://example.com/'
@@ -4,14 +4,20 @@ import json
 import time
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from tests.etl.test_perf_data_adapters import _verify_signature
 from tests.test_utils import create_generic_job
+from treeherder.etl import perf
 from treeherder.etl.perf import store_performance_artifact
 from treeherder.model.models import Push
-from treeherder.perf.models import (PerformanceDatum,
+from treeherder.perf.models import (SIGNATURES_VERSION_CACHE_KEY,
+                                    PerformanceDatum,
                                     PerformanceFramework,
-                                    PerformanceSignature)
+                                    PerformanceSignature,
+                                    signatures_deleted)
+from treeherder.utils.cache import VersionedLRUCache
 
 FRAMEWORK_NAME = 'cheezburger'
 MEASUREMENT_UNIT = 'ms'
@@ -261,3 +267,91 @@ def test_changing_extra_options_decouples_perf_signatures(test_repository, later
     # Perfherder treats perf data with new properties as entirely new data.
     # Thus, it creates new & separate signatures for them.
     assert initial_signature_amount < PerformanceSignature.objects.all().count()
+
+
+def test_ingestion_queries_do_not_grow_with_subtests(perf_job, sample_perf_artifact):
+    many_subtests_artifact = copy.deepcopy(sample_perf_artifact)
+    many_subtests_artifact['blob']['suites'][0]['subtests'] = [
+        {'name': 'test{}'.format(i), 'value': float(i)} for i in range(200)]
+    _, submit_datum = _prepare_test_data(many_subtests_artifact)
+    # leave out the queries of (eagerly run) alert generation
+    perf_job.repository.performance_alerts_enabled = False
+    perf_job.repository.save()
+
+    with CaptureQueriesContext(connection) as context:
+        store_performance_artifact(perf_job, submit_datum)
+    assert len(context.captured_queries) < 20
+    assert PerformanceDatum.objects.count() == 205
+
+    # storing the same artifact again doesn't duplicate anything
+    store_performance_artifact(perf_job, submit_datum)
+    assert PerformanceDatum.objects.count() == 205
+    assert PerformanceSignature.objects.count() == 205
+
+
+def test_signatures_are_cached_between_artifacts(test_repository, perf_job, later_perf_push,
+                                                 generic_reference_data, sample_perf_artifact):
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+    # leave out the queries of (eagerly run) alert generation
+    test_repository.performance_alerts_enabled = False
+    test_repository.save()
+    store_performance_artifact(perf_job, submit_datum)
+
+    later_job = create_generic_job('lateguid', test_repository,
+                                   later_perf_push.id, generic_reference_data)
+    with CaptureQueriesContext(connection) as context:
+        store_performance_artifact(later_job, submit_datum)
+    assert not any('FROM `performance_signature`' in query['sql']
+                   for query in context.captured_queries)
+    assert PerformanceDatum.objects.filter(job=later_job).count() == 8
+    signature = PerformanceSignature.objects.get(suite='cheezburger metrics', test='test1')
+    assert signature.last_updated == later_perf_push.time
+
+    # deleted signatures mustn't be served from the cache
+    PerformanceSignature.objects.all().delete()
+    signatures_deleted()
+    store_performance_artifact(later_job, submit_datum)
+    assert PerformanceSignature.objects.count() == 8
+    assert PerformanceDatum.objects.filter(job=later_job).count() == 8
+
+
+def test_signatures_modified_by_other_workers_are_not_served_from_cache(
+        monkeypatch, test_repository, perf_job, later_perf_push, generic_reference_data,
+        sample_perf_artifact, sample_perf_artifact_with_new_unit):
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+    _, updated_submit_datum = _prepare_test_data(sample_perf_artifact_with_new_unit)
+    test_repository.performance_alerts_enabled = False
+    test_repository.save()
+    store_performance_artifact(perf_job, submit_datum)
+
+    # another worker, with its own cache, changes the measurement units...
+    worker_cache = perf._signature_cache
+    monkeypatch.setattr(perf, '_signature_cache',
+                        VersionedLRUCache(SIGNATURES_VERSION_CACHE_KEY, 100))
+    later_job = create_generic_job('lateguid', test_repository,
+                                   later_perf_push.id, generic_reference_data)
+    store_performance_artifact(later_job, updated_submit_datum)
+    monkeypatch.setattr(perf, '_signature_cache', worker_cache)
+
+    # ...so the units this worker cached are no longer those in the database
+    store_performance_artifact(later_job, submit_datum)
+    signature = PerformanceSignature.objects.get(suite='cheezburger metrics', test='test1')
+    assert signature.measurement_unit == MEASUREMENT_UNIT
+
+
+def test_datums_of_missing_signatures_are_not_dropped(test_repository, perf_job, later_perf_push,
+                                                      generic_reference_data, sample_perf_artifact):
+    _, submit_datum = _prepare_test_data(sample_perf_artifact)
+    test_repository.performance_alerts_enabled = False
+    test_repository.save()
+    store_performance_artifact(perf_job, submit_datum)
+
+    # signatures deleted without telling the workers are still cached...
+    PerformanceSignature.objects.all().delete()
+    later_job = create_generic_job('lateguid', test_repository,
+                                   later_perf_push.id, generic_reference_data)
+    store_performance_artifact(later_job, submit_datum)
+
+    # ...yet the datums are stored against signatures created anew
+    assert PerformanceSignature.objects.count() == 8
+    assert PerformanceDatum.objects.filter(job=later_job).count() == 8
@@ -0,0 +1,50 @@
+import copy
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.etl.push import store_push
+from treeherder.model.models import (Commit,
+                                     Push)
+
+
+def test_store_push_updates_commits(test_repository, sample_push):
+    """storing a push again only writes the commits which are new or changed"""
+    push = copy.deepcopy(sample_push[0])
+    push['revisions'] = [{'revision': '{:040x}'.format(i),
+                          'author': 'Jane Doe <jdoe@mozilla.com>',
+                          'comment': 'Bug {} - Fix things'.format(i)}
+                         for i in range(100)]
+    store_push(test_repository, push)
+
+    push['revisions'][0]['comment'] = 'Backed out changeset'
+    push['revisions'].append({'revision': 'f' * 40,
+                              'author': 'John Doe <jdoe@mozilla.com>',
+                              'comment': 'Bug 1 - Fix more things'})
+    with CaptureQueriesContext(connection) as captured:
+        store_push(test_repository, push)
+
+    assert len(captured.captured_queries) < 10
+    assert Push.objects.count() == 1
+    assert Commit.objects.count() == 101
+    assert set(Commit.objects.values_list('revision', 'author', 'comments')) == {
+        (revision['revision'], revision['author'], revision['comment'])
+        for revision in push['revisions']}
+
+
+def test_store_push_with_commits_stored_concurrently(monkeypatch, test_repository, sample_push):
+    """commits stored meanwhile by another worker are updated rather than failing the push"""
+    push = sample_push[0]
+    bulk_create = Commit.objects.bulk_create
+
+    def concurrent_bulk_create(commits):
+        Commit.objects.create(push=commits[0].push, revision=commits[0].revision,
+                              author='Someone else', comments='')
+        return bulk_create(commits)
+
+    monkeypatch.setattr(Commit.objects, 'bulk_create', concurrent_bulk_create)
+    store_push(test_repository, push)
+
+    assert set(Commit.objects.values_list('revision', 'author', 'comments')) == {
+        (revision['revision'], revision['author'], revision['comment'])
+        for revision in push['revisions']}
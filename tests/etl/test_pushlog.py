@@ -1,10 +1,12 @@
 import json
 import os
+import threading
 
 import responses
 from django.core.cache import cache
 
 from treeherder.etl.pushlog import HgPushlogProcess
+from treeherder.etl.tasks import pushlog_tasks
 from treeherder.model.models import (Commit,
                                      Push)
 
@@ -123,3 +125,41 @@ def test_empty_json_pushes(test_repository, test_base_dir,
     process.run(pushlog_fake_url, test_repository.name)
 
     assert Push.objects.count() == 0
+
+
+def test_fetch_push_logs_concurrently(test_repository, test_repository_2, settings,
+                                      monkeypatch):
+    """all the repositories are polled in one task, despite any failures"""
+    settings.PUSHLOG_POLL_THREADS = 2
+    fetched = []
+
+    def fetch_hg_push_log(repo_name, repo_url):
+        fetched.append((repo_name, repo_url))
+        if repo_name == test_repository.name:
+            raise Exception('Pushlog unavailable')
+
+    monkeypatch.setattr(pushlog_tasks, 'fetch_hg_push_log', fetch_hg_push_log)
+    pushlog_tasks.fetch_push_logs()
+
+    assert {(test_repository.name, test_repository.url),
+            (test_repository_2.name, test_repository_2.url)}.issubset(fetched)
+
+
+def test_fetch_push_logs_concurrently_times_out(monkeypatch):
+    """a pushlog taking too long to fetch doesn't hold up the others"""
+    monkeypatch.setattr(pushlog_tasks, 'FETCH_PUSH_LOG_TIME_LIMIT', 0.1)
+    release = threading.Event()
+    fetched = []
+
+    def fetch_hg_push_log(repo_name, repo_url):
+        if repo_name == 'stuck':
+            release.wait()
+        fetched.append(repo_name)
+
+    monkeypatch.setattr(pushlog_tasks, 'fetch_hg_push_log', fetch_hg_push_log)
+    try:
+        pushlog_tasks.fetch_push_logs_concurrently(
+            [('stuck', 'url'), ('first', 'url'), ('second', 'url')], 2)
+        assert sorted(fetched) == ['first', 'second']
+    finally:
+        release.set()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from treeherder.etl.text import (astral_filter,
+                                 astral_filter_lines,
                                  filter_re)
 
 
@@ -33,3 +34,8 @@ def test_astra_filter_hex_value():
     """check the expected outcome is also not changed"""
     hex_values = '\U00000048\U00000049'
     assert hex_values == astral_filter(hex_values)
+
+
+def test_astral_filter_lines():
+    assert astral_filter_lines(['foo', None, 'bar']) == ['foo', None, 'bar']
+    assert astral_filter_lines(['foo', None, u'🍆 bar']) == ['foo', None, '<U+01F346> bar']
@@ -1,10 +1,14 @@
+import gzip
+
 import pytest
 import responses
 
+from tests.sampledata import SampleData
 from tests.test_utils import add_log_response
 from treeherder.log_parser.artifactbuildercollection import (MAX_DOWNLOAD_SIZE_IN_BYTES,
                                                              ArtifactBuilderCollection,
-                                                             LogSizeException)
+                                                             LogSizeException,
+                                                             _lines_with_terms)
 from treeherder.log_parser.artifactbuilders import BuildbotLogViewArtifactBuilder
 
 
@@ -65,6 +69,32 @@ def test_all_builders_complete():
     assert exp == lpc.artifacts
 
 
+@responses.activate
+def test_parse_skips_only_unwanted_lines():
+    """test that parsing matches running every builder against every line"""
+    log = "mozilla-inbound-android-api-11-debug-bm91-build1-build1317.txt.gz"
+    url = add_log_response(log)
+    lpc = ArtifactBuilderCollection(url)
+    lpc.parse()
+
+    builders = ArtifactBuilderCollection(url).builders
+    with gzip.open(SampleData().get_log_path(log)) as f:
+        for line in f.read().splitlines():
+            for builder in builders:
+                builder.parse_line(line.decode('utf-8', 'replace'))
+
+    for actual, expected in zip(lpc.builders, builders):
+        expected.finish_parse()
+        assert actual.lineno == expected.lineno
+        assert actual.get_artifact() == expected.get_artifact()
+
+
+def test_lines_with_terms():
+    lines = [b'foo', b'', b'an error', b'error: error', b'ERROR', b'bar', b'\xff error']
+    assert _lines_with_terms(lines, {b'error', b'RROR'}) == {2, 3, 4, 6}
+    assert _lines_with_terms(lines, {b'baz'}) == set()
+
+
 @responses.activate
 def test_log_download_size_limit():
     """Test that logs whose Content-Length exceed the size limit are not parsed."""
@@ -1,7 +1,16 @@
+import time
+
+import pytest
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mozlog.formatters.tbplformatter import TbplFormatter
 
+from treeherder.log_parser.crossreference import crossreference_job
 from treeherder.model.models import (FailureLine,
-                                     TextLogError)
+                                     TextLogError,
+                                     TextLogErrorMetadata,
+                                     TextLogStep)
 
 from ..autoclassify.utils import (create_failure_lines,
                                   create_text_log_errors,
@@ -99,3 +108,51 @@ def test_crossreference_error_lines_leading_groups(test_job):
         assert error_line.metadata.failure_line == failure_line
         assert error_line.metadata.best_is_verified is False
         assert error_line.metadata.best_classification is None
+
+
+def _create_many_lines(job, count):
+    """Create `count` matching structured and unstructured lines, interleaved with unmatched errors"""
+    step = TextLogStep.objects.create(job=job, name='everything', started_line_number=1,
+                                      finished_line_number=3 * count, result=TextLogStep.TEST_FAILED)
+    formatter = TbplFormatter()
+    failure_lines = []
+    errors = []
+    for i in range(count):
+        data = dict(test_line, test='test{}'.format(i), subtest=None)
+        failure_lines.append(FailureLine(job_guid=job.guid, repository=job.repository, line=i, **data))
+        summary = formatter(dict(data, action='test_end')).split("\n")[0]
+        errors.append(TextLogError(step=step, line_number=3 * i,
+                                   line='12:34:56  INFO - ' + summary))
+        errors.append(TextLogError(step=step, line_number=3 * i + 1,
+                                   line='12:34:56  ERROR - Unmatched line {}'.format(i)))
+    FailureLine.objects.bulk_create(failure_lines)
+    TextLogError.objects.bulk_create(errors)
+
+
+def test_crossreference_error_lines_in_bulk(test_job):
+    _create_many_lines(test_job, 50)
+
+    with CaptureQueriesContext(connection) as captured:
+        assert crossreference_job(test_job)
+
+    assert len(captured.captured_queries) < 10
+    metadata = TextLogErrorMetadata.objects.select_related('text_log_error', 'failure_line')
+    assert metadata.count() == 50
+    for error_metadata in metadata:
+        assert error_metadata.text_log_error.line_number == 3 * error_metadata.failure_line.line
+
+
+@pytest.mark.slow
+def test_crossreference_error_lines_time(test_job):
+    _create_many_lines(test_job, 5000)
+
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as captured:
+        assert crossreference_job(test_job)
+    duration = time.perf_counter() - start
+
+    assert TextLogErrorMetadata.objects.count() == 5000
+    assert len(captured.captured_queries) < 10
+    # Generous enough for a slow test database, but far below what a query
+    # per line would take.
+    assert duration < 10
@@ -1,5 +1,10 @@
+import gzip
+import os
+import re
+
 import pytest
 
+from tests.sampledata import SampleData
 from treeherder.log_parser.parsers import ErrorParser
 
 ERROR_TEST_CASES = (
@@ -89,3 +94,73 @@ def test_taskcluster_strip_prefix():
     parser.parse_line("[vcs 2016-09-07T19:03:02.188327Z] 23:57:52 ERROR - Return code: 1", 3)
     assert len(parser.artifact) == 1
     assert parser.artifact[0]['linenumber'] == 3
+
+
+class ReferenceErrorParser(ErrorParser):
+    """The error parser as it was before the candidate term prefilter."""
+
+    def parse_line(self, line, lineno):
+        if line.startswith('[taskcluster '):
+            self.is_taskcluster = True
+
+        if self.is_taskcluster:
+            line = re.sub(self.RE_TASKCLUSTER_NORMAL_PREFIX, "", line)
+
+        if self.is_error_line(line):
+            self.add(line, lineno)
+
+    def is_error_line(self, line):
+        if self.RE_EXCLUDE_1_SEARCH.search(line):
+            return False
+
+        if self.RE_ERR_1_MATCH.match(line):
+            return True
+
+        trimline = re.sub(self.RE_MOZHARNESS_PREFIX, "", line).rstrip()
+        if self.RE_EXCLUDE_2_SEARCH.search(trimline):
+            return False
+
+        return bool(any(term for term in self.IN_SEARCH_TERMS if term in trimline) or
+                    self.RE_ERR_MATCH.match(trimline) or self.RE_ERR_SEARCH.search(trimline))
+
+
+def _sample_log_lines():
+    logs_dir = SampleData().logs_dir
+    for filename in sorted(os.listdir(logs_dir)):
+        if filename.endswith('.txt.gz'):
+            with gzip.open(os.path.join(logs_dir, filename)) as f:
+                yield filename, [line.decode('utf-8', 'replace') for line in f]
+
+
+def _parse(parser_class, lines, taskcluster=False):
+    parser = parser_class()
+    parser.is_taskcluster = taskcluster
+    for lineno, line in enumerate(lines):
+        parser.parse_line(line, lineno)
+    return parser.artifact
+
+
+@pytest.mark.parametrize("line", ERROR_TEST_CASES + ErrorParser.IN_SEARCH_TERMS)
+def test_error_lines_are_candidates(line):
+    assert ErrorParser().has_candidate_term(line)
+    assert any(term in line.encode('utf-8') for term in ErrorParser.wanted_terms)
+
+
+@pytest.mark.slow
+def test_sample_logs_match_reference_parser():
+    for filename, lines in _sample_log_lines():
+        for taskcluster in (False, True):
+            expected = _parse(ReferenceErrorParser, lines, taskcluster)
+            assert _parse(ErrorParser, lines, taskcluster) == expected, filename
+
+
+@pytest.mark.slow
+def test_sample_logs_mostly_skipped():
+    """
+    Only the lines with a candidate term go through the regular expressions,
+    which in real logs is a small fraction of them
+    """
+    parser = ErrorParser()
+    lines = [line for _, log in _sample_log_lines() for line in log]
+    candidates = [line for line in lines if parser.has_candidate_term(line)]
+    assert len(candidates) < len(lines) // 10
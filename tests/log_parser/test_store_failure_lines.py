@@ -3,6 +3,8 @@ import json
 import pytest
 import responses
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from requests.exceptions import HTTPError
 
 from treeherder.log_parser.failureline import (store_failure_lines,
@@ -169,3 +171,31 @@ def test_store_error_summary_duplicate(activate_responses, test_repository, test
                                    "line": 2}])
 
     assert FailureLine.objects.count() == 2
+
+
+def test_store_error_summary_bulk(test_repository, test_job):
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json",
+                                    url='http://my-log.mozilla.org')
+    Group.objects.create(name="dom/tests")
+    log_list = [{"action": "test_result",
+                 "test": "test_{}.html".format(i),
+                 "status": "FAIL",
+                 "expected": "PASS",
+                 "group": ["dom/tests", "layout/tests"][i % 2] + "/mochitest.ini",
+                 "line": i}
+                for i in range(50)]
+    log_list.append({"action": "log", "level": "debug", "message": "test", "line": 50})
+
+    with CaptureQueriesContext(connection) as captured:
+        failure_lines = write_failure_lines(log_obj, log_list)
+
+    # The number of queries shouldn't depend on the number of lines.
+    assert len(captured.captured_queries) < 15
+    assert [fl.line for fl in failure_lines] == list(range(51))
+    assert all(fl.id for fl in failure_lines)
+    assert FailureLine.objects.count() == 51
+    assert Group.objects.count() == 2
+    for group_name, lines in (("dom/tests", range(0, 50, 2)), ("layout/tests", range(1, 50, 2))):
+        group = Group.objects.get(name=group_name)
+        assert sorted(group.failure_lines.values_list("line", flat=True)) == list(lines)
+    assert not failure_lines[-1].group.exists()
@@ -9,7 +9,8 @@ from tests.autoclassify.utils import (create_failure_lines,
                                       test_line)
 from treeherder.model.management.commands.cycle_data import (MINIMUM_PERFHERDER_EXPIRE_INTERVAL,
                                                              PerfherderCycler)
-from treeherder.model.models import (FailureLine,
+from treeherder.model.models import (ClassifiedFailureIndex,
+                                     FailureLine,
                                      Job,
                                      JobDetail,
                                      JobGroup,
@@ -149,6 +150,18 @@ def test_cycle_job_model_reference_data(test_repository, failure_classifications
     assert Machine.objects.filter(id__in=original_machine_ids).count() == len(original_machine_ids)
 
 
+def test_cycle_prunes_classification_index(test_job, classified_failures):
+    assert ClassifiedFailureIndex.objects.count() == len(classified_failures)
+
+    test_job.submit_time = datetime.datetime.now() - datetime.timedelta(weeks=1)
+    test_job.save()
+    call_command('cycle_data', 'from:treeherder', sleep_time=0, days=1)
+
+    # the matches the entries were made from are gone along with the job
+    assert Job.objects.count() == 0
+    assert ClassifiedFailureIndex.objects.count() == 0
+
+
 def test_cycle_job_with_performance_data(test_repository, failure_classifications,
                                          test_job, mock_log_parser,
                                          test_perf_signature):
@@ -7,8 +7,11 @@ from treeherder.model.models import Push
 from treeherder.perf.alerts import generate_new_alerts_in_series
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceAlertSummary,
+                                    PerformanceAnalysisState,
                                     PerformanceDatum,
                                     PerformanceSignature)
+from treeherder.perf.tasks import (generate_alerts,
+                                   schedule_alert_generation)
 
 
 def _verify_alert(alertid, expected_push_id, expected_prev_push_id,
@@ -140,6 +143,33 @@ def test_detect_alerts_in_series_with_retriggers(
                   PerformanceAlertSummary.UNTRIAGED, None)
 
 
+def test_detect_alerts_in_series_incrementally(test_repository,
+                                               test_issue_tracker,
+                                               failure_classifications,
+                                               generic_reference_data,
+                                               test_perf_signature):
+    # analyzing the series as each push comes in should give the
+    # same alerts as analyzing it all at once
+    base_time = time.time()  # generate it based off current time
+    INTERVAL = 30
+    for t in range(1, INTERVAL + 1):
+        _generate_performance_data(test_repository,
+                                   test_perf_signature,
+                                   test_issue_tracker,
+                                   generic_reference_data,
+                                   base_time, t, 0.5 if t <= INTERVAL / 2 else 1.0, 1)
+        generate_new_alerts_in_series(test_perf_signature)
+
+    assert PerformanceAlert.objects.count() == 1
+    assert PerformanceAlertSummary.objects.count() == 1
+    _verify_alert(1, (INTERVAL/2)+1, (INTERVAL/2), test_perf_signature, 0.5,
+                  1.0, True, PerformanceAlert.UNTRIAGED,
+                  PerformanceAlertSummary.UNTRIAGED, None)
+
+    state = PerformanceAnalysisState.objects.get(signature=test_perf_signature)
+    assert state.last_datum_id == PerformanceDatum.objects.latest('id').id
+
+
 def test_no_alerts_with_old_data(
         test_repository, test_issue_tracker,
         failure_classifications, generic_reference_data, test_perf_signature):
@@ -224,3 +254,18 @@ def test_alert_change_type_absolute(test_repository,
 
     assert PerformanceAlert.objects.count() == expected_num_alerts
     assert PerformanceAlertSummary.objects.count() == expected_num_alerts
+
+
+def test_alert_generation_is_coalesced(test_perf_signature, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(generate_alerts, 'apply_async',
+                        lambda *args, **kwargs: scheduled.append(kwargs['args']))
+
+    schedule_alert_generation(test_perf_signature.id)
+    schedule_alert_generation(test_perf_signature.id)
+    assert scheduled == [[test_perf_signature.id]]
+
+    # data arriving once the analysis has started needs another one
+    generate_alerts(test_perf_signature.id)
+    schedule_alert_generation(test_perf_signature.id)
+    assert scheduled == [[test_perf_signature.id], [test_perf_signature.id]]
@@ -1,9 +1,12 @@
+import copy
 import os
+import random
 
 import pytest
 
 from tests.sampledata import SampleData
 from treeherder.perfalert.perfalert import (RevisionDatum,
+                                            RevisionSeries,
                                             analyze,
                                             calc_t,
                                             default_weights,
@@ -33,6 +36,75 @@ def test_analyze_fn(revision_data, weight_fn, expected):
     assert analyze(data, weight_fn) == expected
 
 
+def _random_revision_data(num_revisions):
+    random.seed(num_revisions)
+    return [RevisionDatum(i, i, [random.gauss(100 + 10 * (i > num_revisions // 2), 3)
+                                 for _ in range(random.choice([1, 1, 2, 5]))])
+            for i in range(num_revisions)]
+
+
+@pytest.mark.parametrize("num_revisions", [1, 2, 7, 30])
+def test_revision_series_stats(num_revisions):
+    data = _random_revision_data(num_revisions)
+    series = RevisionSeries.from_revision_data(data)
+
+    for start in range(num_revisions):
+        for end in range(start + 1, num_revisions + 1):
+            expected = analyze(data[start:end])
+            assert series.stats(start, end) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("num_revisions", [2, 7, 30])
+def test_revision_series_calc_t(num_revisions):
+    data = _random_revision_data(num_revisions)
+    series = RevisionSeries.from_revision_data(data)
+
+    for i in range(1, num_revisions):
+        for back_start in range(i):
+            for fore_end in range(i + 1, num_revisions + 1):
+                # calc_t expects the back window ordered nearest first
+                back = data[back_start:i][::-1]
+                fore = data[i:fore_end]
+                assert series.calc_t(back_start, i, fore_end) == pytest.approx(
+                    calc_t(back, fore, linear_weights))
+
+
+def test_revision_series_constant_windows():
+    data = [RevisionDatum(i, i, [0.1] * (i % 3 + 1)) for i in range(10)]
+    data += [RevisionDatum(i, i, [0.3] * (i % 3 + 1)) for i in range(10, 20)]
+    series = RevisionSeries.from_revision_data(data)
+
+    # adding up 0.1 over and over doesn't give the same average each time,
+    # which mustn't show up as noise in windows without any
+    assert series.stats(0, 10) == {"avg": 0.1, "n": 19, "variance": 0.0}
+    assert series.stats(3, 8, 'back')["variance"] == 0.0
+    assert series.calc_t(5, 8, 10) == 0
+    assert series.calc_t(5, 10, 15) == float('inf')
+
+
+@pytest.mark.parametrize(("base", "step", "noise"), [
+    (2e8, 3e7, 20),
+    (5e8, 1e8, 1),
+    ])
+def test_revision_series_large_values(base, step, noise):
+    # large values with little noise are where floating point running totals
+    # over the whole series would lose the variance to cancellation; at this
+    # magnitude analyze() itself is only good to about a part in a million
+    random.seed(base)
+    data = [RevisionDatum(i, i, [random.gauss(base + step * (i >= 150), noise)
+                                 for _ in range(random.choice([1, 1, 2, 5]))])
+            for i in range(300)]
+    series = RevisionSeries.from_revision_data(data)
+
+    for i in range(1, len(data)):
+        back_start = series.back_window_start(i, 24, 12)
+        fore_end = series.fore_window_end(i, 12)
+        assert series.stats(back_start, i) == pytest.approx(analyze(data[back_start:i]))
+        assert series.stats(i, fore_end) == pytest.approx(analyze(data[i:fore_end]))
+        assert series.calc_t(back_start, i, fore_end) == pytest.approx(calc_t(
+            data[back_start:i][::-1], data[i:fore_end], linear_weights), rel=1e-5, abs=1e-5)
+
+
 def test_weights():
     assert [default_weights(i, 5) for i in range(5)] == [1.0, 1.0, 1.0, 1.0, 1.0]
     assert [linear_weights(i, 5) for i in range(5)] == [1.0, 0.8, 0.6, 0.4, 0.2]
@@ -125,3 +197,21 @@ def test_detect_changes_historical_data(filename, expected_timestamps):
     regression_timestamps = [d.push_timestamp for d in results if
                              d.change_detected]
     assert regression_timestamps == expected_timestamps
+
+
+def test_detect_changes_resumed():
+    data = _random_revision_data(60)
+    full = detect_changes(copy.deepcopy(data), t_threshold=2)
+
+    # resuming from any point with what the full analysis knew about the
+    # revisions before it should give the very same results
+    for resume_from in (1, 13, 40):
+        history = copy.deepcopy(data[:resume_from])
+        for (revision, analyzed) in zip(history, full):
+            revision.t = analyzed.t
+
+        result = detect_changes(history + copy.deepcopy(data[resume_from:]),
+                                t_threshold=2, resume_from=resume_from,
+                                last_seen_regression=full[resume_from].last_seen_regression)
+        assert [(d.t, d.change_detected) for d in result[resume_from:]] == \
+            [(d.t, d.change_detected) for d in full[resume_from:]]
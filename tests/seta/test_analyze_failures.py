@@ -1,5 +1,6 @@
 import pytest
 
+from treeherder.seta import analyze_failures
 from treeherder.seta.analyze_failures import get_failures_fixed_by_commit
 
 
@@ -12,3 +13,23 @@ def test_analyze_failures(fifteen_jobs_with_notes, failures_fixed_by_commit, pat
 
     for key in exp:
         assert sorted(ret[key]) == sorted(exp[key])
+
+
+@pytest.mark.django_db()
+def test_analyze_failures_in_chunks(monkeypatch, fifteen_jobs_with_notes, failures_fixed_by_commit,
+                                    patched_seta_fixed_by_commit_repos):
+    monkeypatch.setattr(analyze_failures, 'FIXED_BY_COMMIT_CHUNK_SIZE', 2)
+    parsed = []
+    get_seta_testtype = analyze_failures.get_seta_testtype
+
+    def parse(*args):
+        parsed.append(args)
+        return get_seta_testtype(*args)
+
+    monkeypatch.setattr(analyze_failures, 'get_seta_testtype', parse)
+    ret = get_failures_fixed_by_commit()
+
+    assert {key: sorted(value) for key, value in ret.items()} == {
+        key: sorted(value) for key, value in failures_fixed_by_commit.items()}
+    # each jobtype is only parsed once
+    assert len(parsed) == len(set(parsed))
@@ -1,8 +1,26 @@
 import pytest
 
-from treeherder.seta.high_value_jobs import get_high_value_jobs
+from treeherder.seta.high_value_jobs import (build_removals,
+                                             get_high_value_jobs)
 
 
 @pytest.mark.django_db()
 def test_get_high_value_jobs(fifteen_jobs_with_notes, failures_fixed_by_commit):
     get_high_value_jobs(failures_fixed_by_commit)
+
+
+def test_build_removals():
+    failures = {
+        'revision a': ['job 1', 'job 2'],
+        'revision b': ['job 2', 'job 2'],
+        'revision c': ['job 3'],
+        'revision d': ['job 1', 'job 3', 'job 4'],
+    }
+    active_jobs = ['job 1', 'job 2', 'job 3', 'job 4', 'job 5']
+
+    # job 2 is the last to catch revisions a & b, and job 3 the only one to catch c
+    assert build_removals(active_jobs, failures, target=100) == ['job 1', 'job 4', 'job 5']
+    # missing a quarter of the failures allows removing job 3, after which job 4
+    # is the last job to catch revision d
+    assert build_removals(active_jobs, failures, target=75) == ['job 1', 'job 3', 'job 5']
+    assert build_removals(active_jobs, failures, target=50) == ['job 1', 'job 2', 'job 4', 'job 5']
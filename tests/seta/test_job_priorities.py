@@ -3,6 +3,8 @@ import datetime
 import pytest
 from mock import patch
 
+from treeherder.etl.seta import (get_reference_data_names,
+                                 refresh_reference_data_names)
 from treeherder.seta.job_priorities import (SetaError,
                                             seta_job_scheduling)
 
@@ -33,3 +35,39 @@ def test_gecko_decision_task_invalid_repo():
 
     assert str(exception_info.value) == "The specified project repo 'mozilla-repo-x' " \
                                         "is not supported by SETA."
+
+
+@pytest.mark.django_db()
+@patch('treeherder.etl.seta.list_runnable_jobs')
+def test_reference_data_names_cached(runnable_jobs_list, runnable_jobs_data):
+    '''The runnable jobs are only fetched once for all the build systems of a project.'''
+    runnable_jobs_list.return_value = runnable_jobs_data
+    ref_data_names = get_reference_data_names('try', 'taskcluster')
+    assert ref_data_names == {
+        ('reftest-e10s-1', 'opt', 'linux32'): 'test-linux32/opt-reftest-e10s-1',
+        ('reftest-e10s-2', 'opt', 'linux64'): 'test-linux64/opt-reftest-e10s-2',
+    }
+
+    assert get_reference_data_names('try', 'taskcluster') == ref_data_names
+    assert len(get_reference_data_names('try', 'buildbot')) == 2
+    assert len(get_reference_data_names('try', '*')) == 3
+    assert runnable_jobs_list.call_count == 1
+
+
+@pytest.mark.django_db()
+@patch('treeherder.etl.seta.query_latest_gecko_decision_task_id')
+@patch('treeherder.etl.seta.list_runnable_jobs')
+def test_refresh_reference_data_names(runnable_jobs_list, decision_task_id, runnable_jobs_data):
+    '''The reference data names are only rebuilt when there is a new decision task.'''
+    runnable_jobs_list.return_value = runnable_jobs_data
+    decision_task_id.return_value = 'XVDNiP07RNaaEghhvkZJWg'
+    refresh_reference_data_names('try')
+    refresh_reference_data_names('try')
+    assert runnable_jobs_list.call_count == 1
+
+    decision_task_id.return_value = 'AFq3FRt4TyiTwIN7fUqOQg'
+    refresh_reference_data_names('try')
+    runnable_jobs_list.assert_called_with('try', 'AFq3FRt4TyiTwIN7fUqOQg')
+
+    get_reference_data_names('try', 'taskcluster')
+    assert runnable_jobs_list.call_count == 2
@@ -0,0 +1,62 @@
+import time
+
+from treeherder.utils.cache import (LRUCache,
+                                    VersionedLRUCache,
+                                    bump_cache_version)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert 'b' not in cache
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_lru_cache_pop_and_clear():
+    cache = LRUCache(10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = LRUCache(10, ttl=60)
+    cache.set('a', 1)
+
+    now[0] += 59
+    assert cache.get('a') == 1
+    now[0] += 1
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_versioned_lru_cache_drops_entries_on_version_change():
+    first = VersionedLRUCache('test-cache-version', 10)
+    second = VersionedLRUCache('test-cache-version', 10)
+    for cache in (first, second):
+        cache.refresh()
+        cache.set('a', 1)
+
+    # refreshing without any change keeps the entries
+    first.refresh()
+    assert first.get('a') == 1
+
+    bump_cache_version('test-cache-version')
+    for cache in (first, second):
+        assert cache.get('a') == 1
+        cache.refresh()
+        assert 'a' not in cache
@@ -0,0 +1,84 @@
+import gzip
+
+import responses
+from urllib3.exceptions import ProtocolError
+
+from treeherder.utils import http
+from treeherder.utils.http import (iter_lines,
+                                   spool_download)
+
+LOG_URL = 'http://my-log.mozilla.org/log.txt.gz'
+LOG = b''.join(b'line %d\r\n' % i for i in range(10000)) + b'last\rline'
+
+
+def test_iter_lines(monkeypatch):
+    assert list(iter_lines(LOG)) == LOG.splitlines()
+    assert list(iter_lines(b'')) == []
+
+    # Lines longer than a block, and blocks ending part way through a line.
+    monkeypatch.setattr(http, 'LINES_BLOCK_SIZE', 7)
+    assert list(iter_lines(LOG)) == LOG.splitlines()
+    assert list(iter_lines(b'a' * 20 + b'\r\n\n' + b'b' * 3)) == [b'a' * 20, b'', b'b' * 3]
+
+
+@responses.activate
+def test_spool_download():
+    responses.add(responses.GET, LOG_URL, body=gzip.compress(LOG),
+                  adding_headers={'Content-Encoding': 'gzip'})
+
+    with spool_download(LOG_URL) as log:
+        assert log[:] == LOG
+
+
+@responses.activate
+def test_spool_download_empty():
+    responses.add(responses.GET, LOG_URL, body=b'')
+
+    with spool_download(LOG_URL) as log:
+        assert log == b''
+
+
+@responses.activate
+def test_spool_download_resumes(monkeypatch):
+    """test that a dropped connection resumes the download from where it stopped"""
+    body = gzip.compress(LOG)
+    range_headers = []
+
+    def respond(request):
+        range_header = request.headers.get('Range')
+        range_headers.append(range_header)
+        if not range_header:
+            return (200, {'Content-Encoding': 'gzip'}, body)
+        start = int(range_header[len('bytes='):-1])
+        return (206, {'Content-Encoding': 'gzip'}, body[start:])
+
+    responses.add_callback(responses.GET, LOG_URL, callback=respond)
+
+    make_request = http.make_request
+
+    def drop_first_connection(url, **kwargs):
+        response = make_request(url, **kwargs)
+        if len(range_headers) == 1:
+            stream = response.raw.stream
+
+            def dropped_stream(amt, decode_content=None):
+                yield next(stream(1000, decode_content=decode_content))
+                raise ProtocolError('Connection dropped')
+
+            response.raw.stream = dropped_stream
+        return response
+
+    monkeypatch.setattr(http, 'make_request', drop_first_connection)
+
+    with spool_download(LOG_URL) as log:
+        assert log[:] == LOG
+    assert range_headers == [None, 'bytes=1000-']
+
+
+def test_get_session_is_shared(monkeypatch):
+    session = http.get_session()
+    assert http.get_session() is session
+
+    # but not with forked processes
+    monkeypatch.setattr(http.os, 'getpid', lambda: -1)
+    assert http.get_session() is not session
@@ -6,7 +6,8 @@ import newrelic.agent
 from django.db.utils import IntegrityError
 from first import first
 
-from treeherder.model.models import (Job,
+from treeherder.model.models import (ClassifiedFailureIndex,
+                                     Job,
                                      JobNote,
                                      TextLogError,
                                      TextLogErrorMatch)
@@ -177,8 +178,10 @@ def update_db(matches):
     Save TextLogErrorMatch instances to the DB
 
     We loop each Match instance instead of calling bulk_create() so we can
-    catch any potential IntegrityErrors and continue.
+    catch any potential IntegrityErrors and continue. The saved matches are
+    then added to the classification index together.
     """
+    saved = []
     for match in matches:
         try:
             match.save()
@@ -188,6 +191,10 @@ def update_db(matches):
                 "Tried to create duplicate match for TextLogError %i with matcher %s and classified_failure %i",
                 args,
             )
+        else:
+            saved.append(match)
+
+    ClassifiedFailureIndex.objects.add_matches(saved)
 
 
 def create_note(job, all_matched):
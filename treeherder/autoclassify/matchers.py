@@ -1,63 +1,48 @@
 import logging
 from difflib import SequenceMatcher
-from itertools import chain
 
 import newrelic.agent
-from django.db.models import Q
 
-from treeherder.model.models import TextLogErrorMatch
-from treeherder.utils.queryset import chunked_qs_reverse
+from treeherder.model.models import (ClassifiedFailureIndex,
+                                     classification_index_key,
+                                     classification_index_lookups)
 
-from .utils import (score_matches,
-                    time_boxed)
+from .utils import score_matches
 
 logger = logging.getLogger(__name__)
 
 
+def _index_entries(lookup):
+    """Query the classifications of lines with the given fields, best first."""
+    return (ClassifiedFailureIndex.objects.filter(lookup_key=classification_index_key(lookup))
+                                          .order_by('-score', '-classified_failure'))
+
+
 @newrelic.agent.function_trace()
 def precise_matcher(text_log_error):
-    """Query for TextLogErrorMatches identical to matches of the given TextLogError."""
+    """Look up the classifications of lines identical to the given TextLogError's."""
     failure_line = text_log_error.metadata.failure_line
     logger.debug("Looking for test match in failure %d", failure_line.id)
 
     if failure_line.action != "test_result" or failure_line.message is None:
         return
 
-    f = {
-        'text_log_error___metadata__failure_line__action': 'test_result',
-        'text_log_error___metadata__failure_line__test': failure_line.test,
-        'text_log_error___metadata__failure_line__subtest': failure_line.subtest,
-        'text_log_error___metadata__failure_line__status': failure_line.status,
-        'text_log_error___metadata__failure_line__expected': failure_line.expected,
-        'text_log_error___metadata__failure_line__message': failure_line.message
-    }
-    qwargs = (
-        Q(text_log_error___metadata__best_classification=None)
-        & (Q(text_log_error___metadata__best_is_verified=True)
-           | Q(text_log_error__step__job=text_log_error.step.job))
-    )
-    qs = (TextLogErrorMatch.objects.filter(**f)
-                                   .exclude(qwargs)
-                                   .order_by('-score', '-classified_failure'))
-
-    if not qs:
+    (lookup,) = classification_index_lookups(failure_line)
+    entries = list(_index_entries(lookup))
+    if not entries:
         return
 
-    # chunk through the QuerySet because it could potentially be very large
-    # time bound each call to the scoring function to avoid job timeouts
     # returns an iterable of (score, classified_failure_id) tuples
-    chunks = chunked_qs_reverse(qs, chunk_size=20000)
-    return chain.from_iterable(time_boxed(score_matches, chunks, time_budget=500))
+    return score_matches(entries)
 
 
 @newrelic.agent.function_trace()
 def crash_signature_matcher(text_log_error):
     """
-    Query for TextLogErrorMatches with the same crash signature.
+    Look up the classifications of lines with the same crash signature.
 
-    Produces two queries, first checking if the same test produces matches
-    and secondly checking without the same test but lowering the produced
-    scores.
+    First checks if the same test produces matches and secondly checks
+    without the same test but lowering the produced scores.
     """
     failure_line = text_log_error.metadata.failure_line
 
@@ -66,39 +51,18 @@ def crash_signature_matcher(text_log_error):
         failure_line.signature == "None"):
         return
 
-    f = {
-        'text_log_error___metadata__failure_line__action': 'crash',
-        'text_log_error___metadata__failure_line__signature': failure_line.signature,
-    }
-    qwargs = (
-        Q(text_log_error___metadata__best_classification=None)
-        & (Q(text_log_error___metadata__best_is_verified=True)
-           | Q(text_log_error__step__job=text_log_error.step.job))
-    )
-    qs = (TextLogErrorMatch.objects.filter(**f)
-                                   .exclude(qwargs)
-                                   .select_related('text_log_error', 'text_log_error___metadata')
-                                   .order_by('-score', '-classified_failure'))
-
-    size = 20000
-    time_budget = 500
+    same_test_lookup, any_test_lookup = classification_index_lookups(failure_line)
 
     # See if we can get any matches when filtering by the same test
-    first_attempt = qs.filter(text_log_error___metadata__failure_line__test=failure_line.test)
-    chunks = chunked_qs_reverse(first_attempt, chunk_size=size)
-    scored_matches = chain.from_iterable(time_boxed(score_matches, chunks, time_budget))
-    if scored_matches:
-        return scored_matches
+    entries = list(_index_entries(same_test_lookup))
+    if entries:
+        return score_matches(entries)
 
     # try again without filtering to the test but applying a .8 score multiplyer
-    chunks = chunked_qs_reverse(qs, chunk_size=size)
-    scored_matches = chain.from_iterable(time_boxed(
-        score_matches,
-        chunks,
-        time_budget,
-        score_multiplier=(8, 10),
-    ))
-    return scored_matches
+    entries = list(_index_entries(any_test_lookup))
+    if not entries:
+        return
+    return score_matches(entries, score_multiplier=(8, 10))
 
 
 class MatchScorer:
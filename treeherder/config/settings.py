@@ -320,6 +320,8 @@ CELERY_TASK_QUEUES = [
     Queue('store_pulse_tasks', Exchange('default'), routing_key='store_pulse_tasks'),
     Queue('store_pulse_pushes', Exchange('default'), routing_key='store_pulse_pushes'),
     Queue('seta_analyze_failures', Exchange('default'), routing_key='seta_analyze_failures'),
+    Queue('seta_refresh_reference_data_names', Exchange('default'),
+          routing_key='seta_refresh_reference_data_names'),
 ]
 
 # Force all queues to be explicitly listed in `CELERY_TASK_QUEUES` to help prevent typos
@@ -375,6 +377,15 @@ CELERY_BEAT_SCHEDULE = {
             'queue': "seta_analyze_failures"
         }
     },
+    # rebuilds the SETA reference data names whenever a new decision task runs
+    'seta-refresh-reference-data-names': {
+        'task': 'seta-refresh-reference-data-names',
+        'schedule': timedelta(minutes=5),
+        'relative': True,
+        'options': {
+            'queue': "seta_refresh_reference_data_names"
+        }
+    },
 }
 
 # CORS Headers
@@ -423,6 +434,11 @@ BUGFILER_API_KEY = env("BUG_FILER_API_KEY", default=None)
 # For intermittents commenter
 COMMENTER_API_KEY = env("BUG_COMMENTER_API_KEY", default=None)
 
+# Pushlog polling
+# Number of threads fetching the pushlogs of all the repositories together in a
+# single task. When 0, a task is queued to fetch the pushlog of each repository.
+PUSHLOG_POLL_THREADS = env.int("PUSHLOG_POLL_THREADS", default=0)
+
 # Log Parsing
 PARSER_MAX_STEP_ERROR_LINES = 100
 FAILURE_LINES_CUTOFF = 35
@@ -440,6 +456,10 @@ PERFHERDER_ALERTS_FORE_WINDOW = 12
 # Only generate alerts for data newer than this time in seconds in perfherder
 PERFHERDER_ALERTS_MAX_AGE = timedelta(weeks=2)
 
+# Alert generation for a signature is delayed by this much, so that all the
+# datums ingested meanwhile (e.g. from retriggers) are analyzed by a single task
+PERFHERDER_ALERTS_SCHEDULING_DELAY = timedelta(minutes=2)
+
 # Performance sheriff bot settings
 MAX_BACKFILLS_PER_PLATFORM = {
     'linux': 200,
@@ -1,12 +1,13 @@
+import datetime
 import logging
 
 import dateutil.parser
-import simplejson as json
 from django.db import transaction
 from django.db.utils import IntegrityError
 
+from treeherder.etl.common import load_artifact_blob
 from treeherder.etl.perf import store_performance_artifact
-from treeherder.etl.text import astral_filter
+from treeherder.etl.text import astral_filter_lines
 from treeherder.model import error_summary
 from treeherder.model.models import (Job,
                                      JobDetail,
@@ -16,13 +17,28 @@ from treeherder.model.models import (Job,
 logger = logging.getLogger(__name__)
 
 
+def _job_detail_key(title, value):
+    """
+    Key job details the way their unique index compares them: the collation
+    of the title and value columns ignores case and trailing spaces.
+    """
+    return tuple(field.lower().rstrip(' ') if field is not None else None
+                 for field in (title, value))
+
+
 def store_job_info_artifact(job, job_info_artifact):
     """
     Store the contents of the job info artifact
     in job details
     """
-    new_job_details = json.loads(job_info_artifact['blob'])['job_details']
-    existing_job_details = JobDetail.objects.filter(job=job)
+    new_job_details = load_artifact_blob(job_info_artifact)['job_details']
+    max_lengths = {field: JobDetail._meta.get_field(field).max_length
+                   for field in ('title', 'value', 'url')}
+    existing_job_details = {
+        _job_detail_key(title, value): (job_detail_id, url)
+        for (job_detail_id, title, value, url) in JobDetail.objects.filter(
+            job=job).values_list('id', 'title', 'value', 'url')
+    }
 
     # Use a dict for to_create because sometimes we are sent duplicate details which would cause
     # an IntegrityError during bulk_create due to the constraints of a unique index.
@@ -37,67 +53,92 @@ def store_job_info_artifact(job, job_info_artifact):
             'url': job_detail.get('url')
         }
         for (k, v) in job_detail_dict.items():
-            max_field_length = JobDetail._meta.get_field(k).max_length
-            if v is not None and len(v) > max_field_length:
+            if v is not None and len(v) > max_lengths[k]:
                 logger.warning("Job detail '%s' for job_guid %s too long, truncating",
-                               v[:max_field_length], job.guid)
-                job_detail_dict[k] = v[:max_field_length]
-
-        title = job_detail_dict['title']
-        value = job_detail_dict['value']
-
-        existing_job_detail = existing_job_details.filter(job=job, title=title, value=value).first()
-        if existing_job_detail:
-            # move the url field to be updated in defaults now that it's
-            # had its size trimmed, if necessary
-            # job_detail_dict['defaults'] = {'url': job_detail_dict['url']}
-            # del job_detail_dict['url']
-            to_update.append(JobDetail(id=existing_job_detail.id, job=job, **job_detail_dict))
+                               v[:max_lengths[k]], job.guid)
+                job_detail_dict[k] = v[:max_lengths[k]]
+
+        key = _job_detail_key(job_detail_dict['title'], job_detail_dict['value'])
+        if key in existing_job_details:
+            # only the url of an existing job detail can have changed
+            (job_detail_id, url) = existing_job_details[key]
+            if url != job_detail_dict['url']:
+                to_update.append(JobDetail(id=job_detail_id, job=job, **job_detail_dict))
         else:
-            key = '{}{}'.format(title, value)
             to_create[key] = JobDetail(job=job, **job_detail_dict)
 
     if len(to_update):
-        JobDetail.objects.bulk_update(to_update, ['title', 'value', 'url'])
+        JobDetail.objects.bulk_update(to_update, ['url'])
     if len(to_create):
-        JobDetail.objects.bulk_create(to_create.values())
+        try:
+            with transaction.atomic():
+                JobDetail.objects.bulk_create(to_create.values())
+        except IntegrityError:
+            # the collation may equate yet more titles and values than the
+            # keys above do (e.g. with accents), or the details were stored
+            # concurrently, so look each of them up the way the database does
+            for job_detail in to_create.values():
+                JobDetail.objects.update_or_create(job=job,
+                                                   title=job_detail.title,
+                                                   value=job_detail.value,
+                                                   defaults={'url': job_detail.url})
+
+
+def parse_step_time(value):
+    """
+    Parse the started/finished time of a text log step, ignoring any timezone.
+    """
+    # The log parser produces times in StepParser.DATE_FORMAT, which
+    # `fromisoformat` parses far faster than dateutil's generic parser.
+    try:
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return dateutil.parser.parse(value, ignoretz=True)
 
 
 def store_text_log_summary_artifact(job, text_log_summary_artifact):
     """
     Store the contents of the text log summary artifact
     """
-    step_data = json.loads(
-        text_log_summary_artifact['blob'])['step_data']
+    step_data = load_artifact_blob(text_log_summary_artifact)['step_data']
     result_map = {v: k for (k, v) in TextLogStep.RESULTS}
+    max_name_length = TextLogStep._meta.get_field('name').max_length
+
+    log_steps = []
+    for step in step_data['steps']:
+        # process start/end times if we have them
+        # we currently don't support timezones in treeherder, so
+        # just ignore that when importing/updating the bug to avoid
+        # a ValueError (though by default the text log summaries
+        # we produce should have time expressed in UTC anyway)
+        time_kwargs = {}
+        for tkey in ('started', 'finished'):
+            if step.get(tkey):
+                time_kwargs[tkey] = parse_step_time(step[tkey])
+
+        log_steps.append(TextLogStep(
+            job=job,
+            started_line_number=step['started_linenumber'],
+            finished_line_number=step['finished_linenumber'],
+            name=step['name'][:max_name_length],
+            result=result_map[step['result']],
+            **time_kwargs))
+
     with transaction.atomic():
-        for step in step_data['steps']:
-            name = step['name'][:TextLogStep._meta.get_field('name').max_length]
-            # process start/end times if we have them
-            # we currently don't support timezones in treeherder, so
-            # just ignore that when importing/updating the bug to avoid
-            # a ValueError (though by default the text log summaries
-            # we produce should have time expressed in UTC anyway)
-            time_kwargs = {}
-            for tkey in ('started', 'finished'):
-                if step.get(tkey):
-                    time_kwargs[tkey] = dateutil.parser.parse(
-                        step[tkey], ignoretz=True)
-
-            log_step = TextLogStep.objects.create(
-                job=job,
-                started_line_number=step['started_linenumber'],
-                finished_line_number=step['finished_linenumber'],
-                name=name,
-                result=result_map[step['result']],
-                **time_kwargs)
-
-            if step.get('errors'):
-                for error in step['errors']:
-                    TextLogError.objects.create(
-                        step=log_step,
-                        line_number=error['linenumber'],
-                        line=astral_filter(error['line']))
+        TextLogStep.objects.bulk_create(log_steps)
+
+        # bulk_create doesn't set the ids of the steps on MySQL, so look them up
+        step_ids = {
+            (started_line_number, finished_line_number): step_id
+            for (step_id, started_line_number, finished_line_number) in TextLogStep.objects.filter(
+                job=job).values_list('id', 'started_line_number', 'finished_line_number')
+        }
+        errors = [(step_ids[(step['started_linenumber'], step['finished_linenumber'])], error)
+                  for step in step_data['steps'] for error in step.get('errors') or []]
+        lines = astral_filter_lines([error['line'] for (_, error) in errors])
+        TextLogError.objects.bulk_create(
+            TextLogError(step_id=step_id, line_number=error['linenumber'], line=line)
+            for ((step_id, error), line) in zip(errors, lines))
 
     # get error summary immediately (to warm the cache)
     error_summary.get_error_summary(job)
@@ -111,7 +152,7 @@ def store_job_artifacts(artifact_data):
         {
             'type': 'json',
             'name': 'my-artifact-name',
-            # blob can be any kind of structured data
+            # blob can be any kind of structured data, or its JSON serialization
             'blob': { 'stuff': [1, 2, 3, 4, 5] },
             'job_guid': 'd22c74d4aa6d2a1dcba96d95dccbd5fdca70cf33'
         }
@@ -153,16 +194,3 @@ def store_job_artifacts(artifact_data):
                                artifact_name, job.guid)
         else:
             logger.error('store_job_artifacts: artifact type %s not understood', artifact_name)
-
-
-def serialize_artifact_json_blobs(artifacts):
-    """
-    Ensure that JSON artifact blobs passed as dicts are converted to JSON
-    """
-    for artifact in artifacts:
-        blob = artifact['blob']
-        if (artifact['type'].lower() == 'json' and
-                not isinstance(blob, str)):
-            artifact['blob'] = json.dumps(blob)
-
-    return artifacts
@@ -1,5 +1,6 @@
 import calendar
 
+import simplejson as json
 from dateutil import parser
 
 
@@ -10,6 +11,17 @@ def get_guid_root(guid):
     return guid
 
 
+def load_artifact_blob(artifact):
+    """
+    Return the contents of a json artifact, whose blob may be either the
+    structured data itself or its serialization.
+    """
+    blob = artifact['blob']
+    if isinstance(blob, (str, bytes)):
+        return json.loads(blob)
+    return blob
+
+
 def to_timestamp(datestr):
     """Converts a date string to a UTC timestamp"""
     return calendar.timegm(parser.parse(datestr).utctimetuple())
@@ -1,5 +1,6 @@
 import logging
 import uuid
+from collections import defaultdict
 
 import jsonschema
 import newrelic.agent
@@ -60,28 +61,82 @@ class JobLoader:
     }
 
     def process_job(self, pulse_job, root_url):
-        if self._is_valid_job(pulse_job):
+        prepared = self._prepare_job(pulse_job, {}, set())
+        if prepared:
+            repository, transformed_job = prepared
             try:
-                project = pulse_job["origin"]["project"]
-                newrelic.agent.add_custom_parameter("project", project)
-
-                repository = Repository.objects.get(name=project)
-                if repository.active_status != 'active':
-                    (real_task_id, _) = task_and_retry_ids(pulse_job["taskId"])
-                    logger.debug("Task %s belongs to a repository that is not active.", real_task_id)
-                    return
-
-                if pulse_job["state"] != "unscheduled":
-                    try:
-                        self.validate_revision(repository, pulse_job)
-                        transformed_job = self.transform(pulse_job)
-                        store_job_data(repository, [transformed_job])
-                        # Returning the transformed_job is only for testing purposes
-                        return transformed_job
-                    except AttributeError:
-                        logger.warning("Skipping job due to bad attribute", exc_info=1)
-            except Repository.DoesNotExist:
-                logger.info("Job with unsupported project: %s", project)
+                store_job_data(repository, [transformed_job])
+                # Returning the transformed_job is only for testing purposes
+                return transformed_job
+            except AttributeError:
+                logger.warning("Skipping job due to bad attribute", exc_info=1)
+
+    def process_jobs(self, pulse_jobs, root_url):
+        """
+        Validate, transform and store a batch of pulse jobs, storing the jobs
+        of each repository together.
+
+        Returns the pulse jobs which couldn't be stored (e.g. because their
+        push doesn't exist yet), each along with the exception raised.
+        """
+        failed = []
+        repositories = {}
+        known_revisions = set()
+        jobs_by_repository = defaultdict(list)
+        for pulse_job in pulse_jobs:
+            try:
+                prepared = self._prepare_job(pulse_job, repositories, known_revisions)
+            except Exception as e:
+                failed.append((pulse_job, e))
+                continue
+            if prepared:
+                repository, transformed_job = prepared
+                jobs_by_repository[repository].append((pulse_job, transformed_job))
+
+        for repository, jobs in jobs_by_repository.items():
+            try:
+                store_job_data(repository, [transformed_job for (_, transformed_job) in jobs])
+            except Exception as e:
+                failed.extend((pulse_job, e) for (pulse_job, _) in jobs)
+
+        return failed
+
+    def _prepare_job(self, pulse_job, repositories, known_revisions):
+        """
+        Returns the repository and transformed job for the pulse job, or None
+        if it's not to be stored. ``repositories`` and ``known_revisions``
+        save looking up the same repositories and pushes again in a batch.
+        """
+        if not self._is_valid_job(pulse_job):
+            return None
+
+        project = pulse_job["origin"]["project"]
+        newrelic.agent.add_custom_parameter("project", project)
+        try:
+            if project not in repositories:
+                repositories[project] = Repository.objects.get(name=project)
+            repository = repositories[project]
+        except Repository.DoesNotExist:
+            logger.info("Job with unsupported project: %s", project)
+            return None
+
+        if repository.active_status != 'active':
+            (real_task_id, _) = task_and_retry_ids(pulse_job["taskId"])
+            logger.debug("Task %s belongs to a repository that is not active.", real_task_id)
+            return None
+
+        if pulse_job["state"] == "unscheduled":
+            return None
+
+        try:
+            revision_key = (repository.id, pulse_job["origin"].get("revision"))
+            if revision_key not in known_revisions:
+                self.validate_revision(repository, pulse_job)
+                known_revisions.add(revision_key)
+            return repository, self.transform(pulse_job)
+        except AttributeError:
+            logger.warning("Skipping job due to bad attribute", exc_info=1)
+            return None
 
     def validate_revision(self, repository, pulse_job):
         revision = pulse_job["origin"].get("revision")
@@ -4,16 +4,17 @@ import os
 import time
 from datetime import datetime
 from hashlib import sha1
+from itertools import islice
 
 import newrelic.agent
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.utils import IntegrityError
+from django.db import (IntegrityError,
+                       transaction)
 from past.builtins import long
 
-from treeherder.etl.artifact import (serialize_artifact_json_blobs,
-                                     store_job_artifacts)
+from treeherder.etl.artifact import store_job_artifacts
 from treeherder.etl.common import get_guid_root
-from treeherder.model.models import (BuildPlatform,
+from treeherder.model.models import (REFERENCE_DATA_VERSION_CACHE_KEY,
+                                     BuildPlatform,
                                      FailureClassification,
                                      Job,
                                      JobGroup,
@@ -27,9 +28,19 @@ from treeherder.model.models import (BuildPlatform,
                                      Push,
                                      ReferenceDataSignatures,
                                      TaskclusterMetadata)
+from treeherder.utils.cache import VersionedLRUCache
 
 logger = logging.getLogger(__name__)
 
+# Reference data rows (platforms, machines, job types, ...) are never modified
+# once created, so each process keeps its own copies of the ones it has seen,
+# keyed by their natural keys, saving several queries per job. These copies
+# are dropped whenever any such rows are deleted, since new rows may reuse
+# the natural keys.
+REFERENCE_DATA_CACHE_SIZE = 10000
+_reference_data_cache = VersionedLRUCache(REFERENCE_DATA_VERSION_CACHE_KEY,
+                                          REFERENCE_DATA_CACHE_SIZE)
+
 
 def _get_number(s):
     try:
@@ -38,13 +49,56 @@ def _get_number(s):
         return 0
 
 
+def _get_reference_data(model, defaults=None, create=True, **lookup):
+    """
+    Returns the ``model`` instance matching ``lookup``, from the cache if
+    possible, otherwise getting (or creating, with ``defaults``) it.
+
+    Lookups which fail, e.g. because the instance doesn't exist and isn't
+    to be created, are not cached.
+    """
+    key = (model.__name__,) + tuple(sorted(lookup.items()))
+    instance = _reference_data_cache.get(key)
+    if instance is None:
+        if create:
+            instance, _ = model.objects.get_or_create(defaults=defaults, **lookup)
+        else:
+            instance = model.objects.get(**lookup)
+        _reference_data_cache.set(key, instance)
+    return instance
+
+
+def _ensure_option_collection(option_names):
+    """
+    Creates the option collection for the given option names if it doesn't
+    exist yet, and returns its hash.
+    """
+    option_collection_hash = OptionCollection.calculate_hash(option_names)
+    key = (OptionCollection.__name__, option_collection_hash)
+    if _reference_data_cache.get(key) is None:
+        if not OptionCollection.objects.filter(
+                option_collection_hash=option_collection_hash).exists():
+            # in the unlikely event that we haven't seen this set of options
+            # before, add the appropriate database rows
+            options = []
+            for option_name in option_names:
+                option, _ = Option.objects.get_or_create(name=option_name)
+                options.append(option)
+            for option in options:
+                OptionCollection.objects.create(
+                    option_collection_hash=option_collection_hash,
+                    option=option)
+        _reference_data_cache.set(key, True)
+    return option_collection_hash
+
+
 def _remove_existing_jobs(data):
     """
     Remove jobs from data where we already have them in the same state.
 
     1. split the incoming jobs into pending, running and complete.
     2. fetch the ``job_guids`` from the db that are in the same state as they
-       are in ``data``.
+       are in ``data``, or that earlier entries of ``data`` moved on from.
     3. build a new list of jobs in ``new_data`` that are not already in
        the db and pass that back.  It could end up empty at that point.
     """
@@ -69,6 +123,8 @@ def _remove_existing_jobs(data):
                     current_state == 'running'):
                 continue
             new_data.append(datum)
+        # later data for the same job (in a batch) is checked against this
+        state_map[job['job_guid']] = job['state']
 
     return new_data
 
@@ -84,49 +140,41 @@ def _load_job(repository, job_datum, push_id):
     ``job_guid`` (root ``job_guid``). Then we can find the right
     ``pending``/``running`` job and update it with this ``retry`` job.
     """
-    build_platform, _ = BuildPlatform.objects.get_or_create(
+    build_platform = _get_reference_data(
+        BuildPlatform,
         os_name=job_datum.get('build_platform', {}).get('os_name', 'unknown'),
         platform=job_datum.get('build_platform', {}).get('platform', 'unknown'),
         architecture=job_datum.get('build_platform', {}).get('architecture',
                                                              'unknown'))
 
-    machine_platform, _ = MachinePlatform.objects.get_or_create(
+    machine_platform = _get_reference_data(
+        MachinePlatform,
         os_name=job_datum.get('machine_platform', {}).get('os_name', 'unknown'),
         platform=job_datum.get('machine_platform', {}).get('platform', 'unknown'),
         architecture=job_datum.get('machine_platform', {}).get('architecture',
                                                                'unknown'))
 
-    option_names = job_datum.get('option_collection', [])
-    option_collection_hash = OptionCollection.calculate_hash(
-        option_names)
-    if not OptionCollection.objects.filter(
-            option_collection_hash=option_collection_hash).exists():
-        # in the unlikely event that we haven't seen this set of options
-        # before, add the appropriate database rows
-        options = []
-        for option_name in option_names:
-            option, _ = Option.objects.get_or_create(name=option_name)
-            options.append(option)
-        for option in options:
-            OptionCollection.objects.create(
-                option_collection_hash=option_collection_hash,
-                option=option)
-
-    machine, _ = Machine.objects.get_or_create(
+    option_collection_hash = _ensure_option_collection(
+        job_datum.get('option_collection', []))
+
+    machine = _get_reference_data(
+        Machine,
         name=job_datum.get('machine', 'unknown'))
 
-    job_type, _ = JobType.objects.get_or_create(
+    job_type = _get_reference_data(
+        JobType,
         symbol=job_datum.get('job_symbol') or 'unknown',
         name=job_datum.get('name') or 'unknown')
 
-    job_group, _ = JobGroup.objects.get_or_create(
+    job_group = _get_reference_data(
+        JobGroup,
         name=job_datum.get('group_name') or 'unknown',
         symbol=job_datum.get('group_symbol') or 'unknown')
 
     product_name = job_datum.get('product_name', 'unknown')
     if not product_name.strip():
         product_name = 'unknown'
-    product, _ = Product.objects.get_or_create(name=product_name)
+    product = _get_reference_data(Product, name=product_name)
 
     job_guid = job_datum['job_guid']
     job_guid = job_guid[0:50]
@@ -144,8 +192,8 @@ def _load_job(repository, job_datum, push_id):
 
     reference_data_name = job_datum.get('reference_data_name', None)
 
-    default_failure_classification = FailureClassification.objects.get(
-        name='not classified')
+    default_failure_classification = _get_reference_data(
+        FailureClassification, create=False, name='not classified')
 
     sh = sha1()
     sh.update(''.join(
@@ -164,7 +212,8 @@ def _load_job(repository, job_datum, push_id):
     if not reference_data_name:
         reference_data_name = signature_hash
 
-    signature, _ = ReferenceDataSignatures.objects.get_or_create(
+    signature = _get_reference_data(
+        ReferenceDataSignatures,
         name=reference_data_name,
         signature=signature_hash,
         build_system_type=build_system_type,
@@ -194,61 +243,19 @@ def _load_job(repository, job_datum, push_id):
     end_time = datetime.fromtimestamp(
         _get_number(job_datum.get('end_timestamp')))
 
-    # first, try to create the job with the given guid (if it doesn't
-    # exist yet)
+    # A job with a suffixed guid (e.g. a retry) takes over the job with the
+    # root guid (e.g. the pending or running one) if there is one
     job_guid_root = get_guid_root(job_guid)
-    if not Job.objects.filter(guid__in=[job_guid, job_guid_root]).exists():
-        # This could theoretically already have been created by another process
-        # that is running updates simultaneously.  So just attempt to create
-        # it, but allow it to skip if it's the same guid.  The odds are
-        # extremely high that this is a pending and running job that came in
-        # quick succession and are being processed by two different workers.
-        Job.objects.get_or_create(
-            guid=job_guid,
-            defaults={
-                "repository": repository,
-                "signature": signature,
-                "build_platform": build_platform,
-                "machine_platform": machine_platform,
-                "machine": machine,
-                "option_collection_hash": option_collection_hash,
-                "job_type": job_type,
-                "job_group": job_group,
-                "product": product,
-                "failure_classification": default_failure_classification,
-                "who": who,
-                "reason": reason,
-                "result": result,
-                "state": state,
-                "tier": tier,
-                "submit_time": submit_time,
-                "start_time": start_time,
-                "end_time": end_time,
-                "last_modified": datetime.now(),
-                "push_id": push_id
-            }
-        )
-    # Can't just use the ``job`` we would get from the ``get_or_create``
-    # because we need to try the job_guid_root instance first for update,
-    # rather than a possible retry job instance.
-    try:
-        job = Job.objects.get(guid=job_guid_root)
-    except ObjectDoesNotExist:
-        job = Job.objects.get(guid=job_guid)
-
-    # add taskcluster metadata if applicable
-    if all([k in job_datum for k in ['taskcluster_task_id', 'taskcluster_retry_id']]):
-        try:
-            TaskclusterMetadata.objects.create(
-                job=job,
-                task_id=job_datum['taskcluster_task_id'],
-                retry_id=job_datum['taskcluster_retry_id'])
-        except IntegrityError:
-            pass
-
-    # Update job with any data that would have changed
-    Job.objects.filter(id=job.id).update(
+    if job_guid != job_guid_root:
+        Job.objects.filter(guid=job_guid_root).update(guid=job_guid)
+
+    # Create the job, or update it with any data that would have changed. This
+    # could be racing another process storing the same job (the odds are that
+    # this is a pending and running job that came in quick succession), which
+    # is why it's done in one statement.
+    job = Job(
         guid=job_guid,
+        repository=repository,
         signature=signature,
         build_platform=build_platform,
         machine_platform=machine_platform,
@@ -257,6 +264,9 @@ def _load_job(repository, job_datum, push_id):
         job_type=job_type,
         job_group=job_group,
         product=product,
+        failure_classification=default_failure_classification,
+        who=who,
+        reason=reason,
         result=result,
         state=state,
         tier=tier,
@@ -265,14 +275,15 @@ def _load_job(repository, job_datum, push_id):
         end_time=end_time,
         last_modified=datetime.now(),
         push_id=push_id)
+    Job.objects.upsert(job, update_fields=[
+        'signature', 'build_platform', 'machine_platform', 'machine',
+        'option_collection_hash', 'job_type', 'job_group', 'product', 'result',
+        'state', 'tier', 'submit_time', 'start_time', 'end_time',
+        'last_modified', 'push'])
 
     artifacts = job_datum.get('artifacts', [])
 
-    has_text_log_summary = any(x for x in artifacts
-                               if x['name'] == 'text_log_summary')
     if artifacts:
-        artifacts = serialize_artifact_json_blobs(artifacts)
-
         # need to add job guid to artifacts, since they likely weren't
         # present in the beginning
         for artifact in artifacts:
@@ -288,42 +299,118 @@ def _load_job(repository, job_datum, push_id):
 
         store_job_artifacts(artifacts)
 
-    log_refs = job_datum.get('log_references', [])
+    return job
+
+
+def _get_taskcluster_metadata(job, job_datum):
+    """
+    Returns the (unsaved) taskcluster metadata of the job, if applicable
+    """
+    if all([k in job_datum for k in ['taskcluster_task_id', 'taskcluster_retry_id']]):
+        return TaskclusterMetadata(
+            job=job,
+            task_id=job_datum['taskcluster_task_id'],
+            retry_id=job_datum['taskcluster_retry_id'])
+    return None
+
+
+def _get_job_logs(job, job_datum):
+    """
+    Returns the (unsaved) logs referenced by the job
+    """
+    has_text_log_summary = any(x for x in job_datum.get('artifacts', [])
+                               if x['name'] == 'text_log_summary')
+    parse_status_map = dict([(k, v) for (v, k) in JobLog.STATUSES])
+
     job_logs = []
-    if log_refs:
-        for log in log_refs:
-            name = log.get('name') or 'unknown'
-            name = name[0:50]
-
-            url = log.get('url') or 'unknown'
-            url = url[0:255]
-
-            # this indicates that a summary artifact was submitted with
-            # this job that corresponds to the buildbot_text log url.
-            # Therefore, the log does not need parsing.  So we should
-            # ensure that it's marked as already parsed.
-            if has_text_log_summary and name == 'buildbot_text':
-                parse_status = JobLog.PARSED
+    for log in job_datum.get('log_references', []):
+        name = log.get('name') or 'unknown'
+        name = name[0:50]
+
+        url = log.get('url') or 'unknown'
+        url = url[0:255]
+
+        # this indicates that a summary artifact was submitted with
+        # this job that corresponds to the buildbot_text log url.
+        # Therefore, the log does not need parsing.  So we should
+        # ensure that it's marked as already parsed.
+        if has_text_log_summary and name == 'buildbot_text':
+            parse_status = JobLog.PARSED
+        else:
+            mapped_status = parse_status_map.get(
+                log.get('parse_status'))
+            if mapped_status:
+                parse_status = mapped_status
             else:
-                parse_status_map = dict([(k, v) for (v, k) in
-                                         JobLog.STATUSES])
-                mapped_status = parse_status_map.get(
-                    log.get('parse_status'))
-                if mapped_status:
-                    parse_status = mapped_status
-                else:
-                    parse_status = JobLog.PENDING
+                parse_status = JobLog.PENDING
 
-            jl, _ = JobLog.objects.get_or_create(
-                job=job, name=name, url=url, defaults={
-                    'status': parse_status
-                })
+        job_logs.append(JobLog(job=job, name=name, url=url, status=parse_status))
 
-            job_logs.append(jl)
+    return job_logs
 
-        _schedule_log_parsing(job, job_logs, result)
 
-    return job_guid
+def _store_taskcluster_metadata(taskcluster_metadata):
+    """
+    Stores the given taskcluster metadata of the jobs which don't have any yet.
+    """
+    new_metadata = {}
+    for metadata in taskcluster_metadata:
+        new_metadata.setdefault(metadata.job_id, metadata)
+    for job_id in TaskclusterMetadata.objects.filter(
+            job_id__in=list(new_metadata)).values_list('job_id', flat=True):
+        del new_metadata[job_id]
+    if not new_metadata:
+        return
+
+    try:
+        with transaction.atomic():
+            TaskclusterMetadata.objects.bulk_create(new_metadata.values())
+    except IntegrityError:
+        # some were stored concurrently, go through them one by one
+        for metadata in new_metadata.values():
+            TaskclusterMetadata.objects.get_or_create(
+                job_id=metadata.job_id,
+                defaults={'task_id': metadata.task_id, 'retry_id': metadata.retry_id})
+
+
+def _store_job_logs(job_logs):
+    """
+    Stores those of the given job logs which don't exist yet, and returns
+    the stored logs in the same order, keeping the status of existing ones.
+    """
+    def stored_job_logs():
+        return {
+            (job_log.job_id, job_log.name, job_log.url): job_log
+            for job_log in JobLog.objects.filter(
+                job_id__in={job_log.job_id for job_log in job_logs})
+        }
+
+    stored = stored_job_logs()
+    new_logs = {}
+    for job_log in job_logs:
+        key = (job_log.job_id, job_log.name, job_log.url)
+        if key not in stored:
+            new_logs.setdefault(key, job_log)
+    if new_logs:
+        try:
+            with transaction.atomic():
+                JobLog.objects.bulk_create(new_logs.values())
+        except IntegrityError:
+            # some were stored concurrently, or the database considers a name
+            # or url equal to one stored before which doesn't compare equal
+            # here (e.g. because of trailing spaces)
+            for job_log in new_logs.values():
+                JobLog.objects.get_or_create(job_id=job_log.job_id,
+                                             name=job_log.name,
+                                             url=job_log.url,
+                                             defaults={'status': job_log.status})
+        stored = stored_job_logs()
+
+    # logs stored under a name or url only the database considers equal
+    # to theirs are looked up the way it compares them
+    return [stored.get((job_log.job_id, job_log.name, job_log.url)) or
+            JobLog.objects.get(job_id=job_log.job_id, name=job_log.name, url=job_log.url)
+            for job_log in job_logs]
 
 
 def _schedule_log_parsing(job, job_logs, result):
@@ -374,6 +461,9 @@ def store_job_data(repository, originalData):
     """
     Store job data instances into jobs db
 
+    The jobs are stored in a single transaction, so storing jobs in batches
+    (e.g. those of several pulse messages) saves many queries and commits.
+
     Example:
     [
         {
@@ -437,53 +527,75 @@ def store_job_data(repository, originalData):
     if not data:
         return
 
-    superseded_job_guid_placeholders = []
+    _reference_data_cache.refresh()
+
+    # look up the pushes of all the jobs (bar those with short revisions) at once
+    push_ids = dict(Push.objects.filter(
+        repository=repository,
+        revision__in={datum['revision'] for datum in data if len(datum['revision']) >= 40}
+    ).values_list('revision', 'id'))
+
+    superseded_guids = []
+    taskcluster_metadata = []
+    logs_to_store = []
+    loaded_jobs = []
+
+    with transaction.atomic():
+        for datum in data:
+            try:
+                # TODO: this might be a good place to check the datum against
+                # a JSON schema to ensure all the fields are valid.  Then
+                # the exception we caught would be much more informative.  That
+                # being said, if/when we transition to only using the pulse
+                # job consumer, then the data will always be vetted with a
+                # JSON schema before we get to this point.
+                job = datum['job']
+                revision = datum['revision']
+                superseded = datum.get('superseded', [])
+
+                push_id = push_ids.get(revision)
+                if push_id is None:
+                    revision_field = 'revision__startswith' if len(revision) < 40 else 'revision'
+                    filter_kwargs = {'repository': repository, revision_field: revision}
+                    push_id = Push.objects.values_list('id', flat=True).get(**filter_kwargs)
+
+                # load job, undoing just its changes if that fails part way
+                with transaction.atomic():
+                    loaded_job = _load_job(repository, job, push_id)
+
+                metadata = _get_taskcluster_metadata(loaded_job, job)
+                if metadata:
+                    taskcluster_metadata.append(metadata)
+                job_logs = _get_job_logs(loaded_job, job)
+                logs_to_store.extend(job_logs)
+                loaded_jobs.append((loaded_job, len(job_logs), job.get('result', 'unknown')))
+
+                superseded_guids.extend(superseded)
+            except Exception as e:
+                # Surface the error immediately unless running in production, where we'd
+                # rather report it on New Relic and not block storing the remaining jobs.
+                if 'DYNO' not in os.environ:
+                    raise
+
+                logger.exception(e)
+                # make more fields visible in new relic for the job
+                # where we encountered the error
+                datum.update(datum.get("job", {}))
+                newrelic.agent.record_exception(params=datum)
+
+                # skip any jobs that hit errors in these stages.
+                continue
 
-    # TODO: Refactor this now that store_job_data() is only over called with one job at a time.
-    for datum in data:
-        try:
-            # TODO: this might be a good place to check the datum against
-            # a JSON schema to ensure all the fields are valid.  Then
-            # the exception we caught would be much more informative.  That
-            # being said, if/when we transition to only using the pulse
-            # job consumer, then the data will always be vetted with a
-            # JSON schema before we get to this point.
-            job = datum['job']
-            revision = datum['revision']
-            superseded = datum.get('superseded', [])
-
-            revision_field = 'revision__startswith' if len(revision) < 40 else 'revision'
-            filter_kwargs = {'repository': repository, revision_field: revision}
-            push_id = Push.objects.values_list('id', flat=True).get(**filter_kwargs)
-
-            # load job
-            job_guid = _load_job(repository, job, push_id)
-
-            for superseded_guid in superseded:
-                superseded_job_guid_placeholders.append(
-                    # superseded by guid, superseded guid
-                    [job_guid, superseded_guid]
-                )
-        except Exception as e:
-            # Surface the error immediately unless running in production, where we'd
-            # rather report it on New Relic and not block storing the remaining jobs.
-            # TODO: Once buildbot support is removed, remove this as part of
-            # refactoring this method to process just one job at a time.
-            if 'DYNO' not in os.environ:
-                raise
-
-            logger.exception(e)
-            # make more fields visible in new relic for the job
-            # where we encountered the error
-            datum.update(datum.get("job", {}))
-            newrelic.agent.record_exception(params=datum)
-
-            # skip any jobs that hit errors in these stages.
-            continue
+        _store_taskcluster_metadata(taskcluster_metadata)
+        stored_logs = iter(_store_job_logs(logs_to_store))
 
-    # Update the result/state of any jobs that were superseded by those ingested above.
-    if superseded_job_guid_placeholders:
-        for (job_guid, superseded_by_guid) in superseded_job_guid_placeholders:
-            Job.objects.filter(guid=superseded_by_guid).update(
+        # Update the result/state of any jobs that were superseded by those ingested above.
+        if superseded_guids:
+            Job.objects.filter(guid__in=superseded_guids).update(
                 result='superseded',
                 state='completed')
+
+    # only once the logs are committed can they be parsed
+    for loaded_job, log_count, result in loaded_jobs:
+        if log_count:
+            _schedule_log_parsing(loaded_job, list(islice(stored_logs, log_count)), result)
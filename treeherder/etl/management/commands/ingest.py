@@ -1,7 +1,8 @@
 import asyncio
-import inspect
+import functools
 import logging
 import os
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 import aiohttp
@@ -11,12 +12,12 @@ import taskcluster.aio
 import taskcluster_urls as liburls
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection
 
 from treeherder.client.thclient import TreeherderClient
 from treeherder.config.settings import GITHUB_TOKEN
-from treeherder.etl.db_semaphore import (acquire_connection,
-                                         release_connection)
 from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.push import store_push
 from treeherder.etl.push_loader import PushLoader
 from treeherder.etl.pushlog import HgPushlogProcess
 from treeherder.etl.taskcluster_pulse.handler import (EXCHANGE_EVENT_MAP,
@@ -35,26 +36,33 @@ conn = aiohttp.TCPConnector(limit=10)
 timeout = aiohttp.ClientTimeout(total=0)
 session = taskcluster.aio.createSession(loop=loop, connector=conn, timeout=timeout)
 
-# Executor to run threads in parallel
-executor = ThreadPoolExecutor()
-
 stateToExchange = {}
 for key, value in EXCHANGE_EVENT_MAP.items():
     stateToExchange[value] = key
 
+# Defaults for backfilling the tasks of task groups, see `Backfill`.
+FETCH_CONCURRENCY = 20
+STORE_THREADS = min(10, settings.CONN_RESOURCES)
+STORE_BATCH_SIZE = 100
+PROGRESS_INTERVAL = 10
+
 
 async def handleTaskId(taskId, root_url):
     asyncQueue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session)
     results = await asyncio.gather(asyncQueue.status(taskId), asyncQueue.task(taskId))
-    await handleTask({
+    runs = await handleTask({
         "status": results[0]["status"],
         "task": results[1],
     }, root_url)
+    for run in runs:
+        JobLoader().process_job(run, root_url)
 
 
 async def handleTask(task, root_url):
+    """Returns the pulse jobs for the runs of the task"""
     taskId = task["status"]["taskId"]
     runs = task["status"]["runs"]
+    jobs = []
     # If we iterate in order of the runs, we will not be able to mark older runs as
     # "retry" instead of exception
     for run in reversed(runs):
@@ -74,12 +82,11 @@ async def handleTask(task, root_url):
             taskRuns = await handleMessage(message, task["task"])
         except Exception as e:
             logger.exception(e)
+            continue
 
         if taskRuns:
-            # Schedule and run jobs inside the thread pool executor
-            jobFutures = [routine_to_future(
-                process_job_with_threads, run, root_url) for run in taskRuns]
-            await await_futures(jobFutures)
+            jobs.extend(run for run in taskRuns if run)
+    return jobs
 
 
 async def fetchGroupTasks(taskGroupId, root_url):
@@ -99,49 +106,152 @@ async def fetchGroupTasks(taskGroupId, root_url):
     return tasks
 
 
-async def processTasks(taskGroupId, root_url):
-    try:
-        tasks = await fetchGroupTasks(taskGroupId, root_url)
-        logger.info("We have %s tasks to process", len(tasks))
-    except Exception as e:
-        logger.exception(e)
-
-    if not tasks:  # No tasks to process
-        return
+class Backfill:
+    """
+    Ingests all the tasks of task groups (e.g. the decision task groups of a
+    range of pushes), as a pipeline of:
 
-    # Schedule and run tasks inside the thread pool executor
-    taskFutures = [routine_to_future(handleTask, task, root_url) for task in tasks]
-    await await_futures(taskFutures)
+    1. fetching the tasks' artifacts and turning their runs into pulse jobs,
+       for up to ``fetch_concurrency`` tasks at a time
+    2. storing the jobs of several tasks together, in batches of about
+       ``batch_size`` jobs, in up to ``store_threads`` threads (each with its
+       own database connection)
 
+    Fetched tasks wait for a free thread in a bounded queue, so that fetching
+    can't get far ahead of storing. Progress is logged periodically.
 
-async def routine_to_future(func, *args):
-    """Arrange for a function to be executed in the thread pool executor.
-    Returns an asyncio.Futures object.
+    With a ``checkpoint_file``, the ids of the tasks whose jobs were all stored
+    are appended to it, and those already in it are skipped, so that an
+    interrupted backfill can be resumed.
     """
-    def _wrap_coroutine(func, *args):
-        """Wraps a coroutine into a regular routine to be ran by threads."""
-        asyncio.run(func(*args))
-
-    event_loop = asyncio.get_event_loop()
-    if inspect.iscoroutinefunction(func):
-        return await event_loop.run_in_executor(executor, _wrap_coroutine, func, *args)
-    return await event_loop.run_in_executor(executor, func, *args)
 
+    def __init__(self, root_url, fetch_concurrency=FETCH_CONCURRENCY,
+                 store_threads=STORE_THREADS, batch_size=STORE_BATCH_SIZE,
+                 checkpoint_file=None):
+        self.root_url = root_url
+        self.fetch_concurrency = fetch_concurrency
+        self.store_threads = min(store_threads, settings.CONN_RESOURCES)
+        self.batch_size = batch_size
+        self.checkpoint_file = checkpoint_file
+        self.stored_tasks = set()
+        self.groups_failed = 0
+        self.tasks_total = 0
+        self.tasks_fetched = 0
+        self.jobs_stored = 0
+        self.jobs_failed = 0
+
+    def run(self, taskGroupIds):
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file) as f:
+                self.stored_tasks = {line.strip() for line in f if line.strip()}
+            logger.info("Skipping the %s tasks stored before", len(self.stored_tasks))
+
+        self.started = time.monotonic()
+        with ThreadPoolExecutor(self.store_threads) as executor:
+            loop.run_until_complete(self._run(taskGroupIds, executor))
+        self.report_progress()
+
+    async def _run(self, taskGroupIds, executor):
+        queue = asyncio.Queue(maxsize=self.store_threads * self.batch_size)
+        storing = asyncio.ensure_future(self.store(queue, executor))
+        reporting = asyncio.ensure_future(self.report_progress_periodically())
+        try:
+            semaphore = asyncio.Semaphore(self.fetch_concurrency)
+            # the tasks of all the groups (e.g. of a range of pushes) share
+            # the same fetching concurrency
+            await asyncio.gather(*(self.fetch_group(taskGroupId, queue, semaphore)
+                                   for taskGroupId in taskGroupIds))
+            await queue.put(None)
+            await storing
+        finally:
+            storing.cancel()
+            reporting.cancel()
+
+    async def fetch_group(self, taskGroupId, queue, semaphore):
+        try:
+            group_tasks = await fetchGroupTasks(taskGroupId, self.root_url)
+        except Exception:
+            # none of its tasks get to the checkpoint, so a rerun retries the group
+            logger.exception("Failed to list the tasks of %s", taskGroupId)
+            self.groups_failed += 1
+            return
+        tasks = [task for task in group_tasks
+                 if task["status"]["taskId"] not in self.stored_tasks]
+        self.tasks_total += len(tasks)
+        logger.info("We have %s tasks to process in %s", len(tasks), taskGroupId)
+        await asyncio.gather(*(self.fetch(task, queue, semaphore) for task in tasks))
+
+    async def fetch(self, task, queue, semaphore):
+        async with semaphore:
+            try:
+                jobs = await handleTask(task, self.root_url)
+            except Exception as e:
+                logger.exception(e)
+                return
+        self.tasks_fetched += 1
+        await queue.put((task["status"]["taskId"], jobs))
+
+    async def store(self, queue, executor):
+        storing = set()
+        batch = []
+        finished = False
+        while not finished:
+            item = await queue.get()
+            if item is None:
+                finished = True
+            else:
+                batch.append(item)
+            # store what there is rather than wait when the fetching is behind
+            if batch and (finished or queue.empty() or
+                          sum(len(jobs) for (_, jobs) in batch) >= self.batch_size):
+                if len(storing) >= self.store_threads:
+                    _, storing = await asyncio.wait(storing, return_when=asyncio.FIRST_COMPLETED)
+                future = loop.run_in_executor(executor, self.store_batch, batch)
+                future.add_done_callback(functools.partial(self.stored, batch))
+                storing.add(future)
+                batch = []
+        if storing:
+            await asyncio.wait(storing)
+
+    def store_batch(self, batch):
+        try:
+            return JobLoader().process_jobs([job for (_, jobs) in batch for job in jobs],
+                                            self.root_url)
+        finally:
+            connection.close()
 
-async def await_futures(fs):
-    """Await for each asyncio.Futures given by fs to copmlete."""
-    for fut in fs:
+    def stored(self, batch, future):
         try:
-            await fut
+            failed = future.result()
         except Exception as e:
             logger.exception(e)
-
-
-def process_job_with_threads(pulse_job, root_url):
-    acquire_connection()
-    logger.info("Loading into DB:\t%s", pulse_job["taskId"])
-    JobLoader().process_job(pulse_job, root_url)
-    release_connection()
+            failed = [(job, e) for (_, jobs) in batch for job in jobs]
+        failed_tasks = set()
+        for (job, e) in failed:
+            logger.warning("Failed to store a job of task %s: %s", job["taskId"], e)
+            failed_tasks.add(job["taskId"])
+        jobs_count = sum(len(jobs) for (_, jobs) in batch)
+        self.jobs_failed += len(failed)
+        self.jobs_stored += jobs_count - len(failed)
+
+        if self.checkpoint_file:
+            with open(self.checkpoint_file, "a") as f:
+                for (taskId, jobs) in batch:
+                    # the jobs' "taskId" is the task id in another form and the run
+                    if not any(job["taskId"] in failed_tasks for job in jobs):
+                        f.write("{}\n".format(taskId))
+
+    async def report_progress_periodically(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            self.report_progress()
+
+    def report_progress(self):
+        elapsed = time.monotonic() - self.started
+        logger.info("Fetched %s/%s tasks (%s task groups failed), stored %s jobs (%s failed) "
+                    "in %.0fs, %.1f jobs/s",
+                    self.tasks_fetched, self.tasks_total, self.groups_failed, self.jobs_stored,
+                    self.jobs_failed, elapsed, self.jobs_stored / elapsed if elapsed else 0)
 
 
 def find_task_id(index_path, root_url):
@@ -158,6 +268,27 @@ def get_decision_task_id(project, revision, root_url):
     return find_task_id(index_path, root_url)
 
 
+def ingest_hg_push_range(repo, from_revision, to_revision):
+    """
+    Ingests the pushes after the one of ``from_revision`` up to the one of
+    ``to_revision``, returning their revisions (oldest first)
+    """
+    pushlog_url = "%s/json-pushes/?full=1&version=2&fromchange=%s&tochange=%s" % (
+        repo.url, from_revision, to_revision)
+    process = HgPushlogProcess()
+    pushes = process.extract(pushlog_url)["pushes"]
+    revisions = []
+    for push_id in sorted(pushes, key=int):
+        push = pushes[push_id]
+        if not push["changesets"]:
+            # obsolete push, see HgPushlogProcess.run
+            continue
+        push = process.transform_push(push)
+        store_push(repo, push)
+        revisions.append(push["revision"])
+    return revisions
+
+
 def repo_meta(project):
     _repo = Repository.objects.filter(name=project)[0]
     assert _repo, "The project {} you specified is incorrect".format(project)
@@ -314,7 +445,7 @@ class Command(BaseCommand):
         parser.add_argument(
             "ingestion_type",
             nargs=1,
-            help="Type of ingestion to do: [task|hg-push|git-commit|pr]"
+            help="Type of ingestion to do: [task|task-group|push|push-range|git-push|git-pushes|pr]"
         )
         parser.add_argument(
             "-p", "--project",
@@ -324,6 +455,14 @@ class Command(BaseCommand):
             "-c", "--commit", "-r", "--revision",
             help="Commit/revision to import"
         )
+        parser.add_argument(
+            "--from-revision",
+            help="Revision of the push before the range of pushes to import"
+        )
+        parser.add_argument(
+            "--to-revision",
+            help="Revision of the last push of the range of pushes to import"
+        )
         parser.add_argument(
             "--enable-eager-celery",
             action="store_true",
@@ -332,7 +471,8 @@ class Command(BaseCommand):
         parser.add_argument(
             "-a", "--ingest-all-tasks",
             action="store_true",
-            help="This will cause all tasks associated to a commit to be ingested. This can take a long time."
+            help="This will cause all tasks associated to a commit (or range of pushes) to be ingested. "
+                 "This can take a long time."
         )
         parser.add_argument(
             "--root-url",
@@ -346,6 +486,34 @@ class Command(BaseCommand):
             nargs="?",
             help="taskId to ingest"
         )
+        parser.add_argument(
+            "--task-group-id",
+            dest="taskGroupIds",
+            nargs="+",
+            help="taskGroupIds (e.g. of decision tasks) to ingest the tasks of"
+        )
+        parser.add_argument(
+            "--fetch-concurrency",
+            type=int,
+            default=FETCH_CONCURRENCY,
+            help="Number of tasks of task groups to fetch concurrently"
+        )
+        parser.add_argument(
+            "--store-threads",
+            type=int,
+            default=STORE_THREADS,
+            help="Number of threads storing the jobs of task groups (at most CONN_RESOURCES)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=STORE_BATCH_SIZE,
+            help="Number of jobs of task groups to store together"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording the tasks of task groups ingested, to resume ingesting them from"
+        )
         parser.add_argument(
             "--pr-url",
             dest="prUrl",
@@ -358,6 +526,13 @@ class Command(BaseCommand):
             help="Do not make changes to the database"
         )
 
+    def backfill(self, root_url, options):
+        return Backfill(root_url,
+                        fetch_concurrency=options["fetch_concurrency"],
+                        store_threads=options["store_threads"],
+                        batch_size=options["batch_size"],
+                        checkpoint_file=options["checkpoint"])
+
     def handle(self, *args, **options):
         typeOfIngestion = options["ingestion_type"][0]
         root_url = options["root_url"]
@@ -365,6 +540,9 @@ class Command(BaseCommand):
         if typeOfIngestion == "task":
             assert options["taskId"]
             loop.run_until_complete(handleTaskId(options["taskId"], root_url))
+        elif typeOfIngestion == "task-group":
+            assert options["taskGroupIds"]
+            self.backfill(root_url, options).run(options["taskGroupIds"])
         elif typeOfIngestion == "pr":
             assert options["prUrl"]
             pr_url = options["prUrl"]
@@ -394,7 +572,7 @@ class Command(BaseCommand):
                 ingest_git_push(options["project"], options["commit"])
             elif typeOfIngestion == "git-pushes":
                 ingest_git_pushes(options["project"], options["dryRun"])
-        elif typeOfIngestion == "push":
+        elif typeOfIngestion in ("push", "push-range"):
             if not options["enable_eager_celery"]:
                 logger.info(
                     "If you want all logs to be parsed use --enable-eager-celery"
@@ -403,18 +581,34 @@ class Command(BaseCommand):
                 # Make sure all tasks are run synchronously / immediately
                 settings.CELERY_TASK_ALWAYS_EAGER = True
 
-            # get reference to repo and ingest this particular revision for this project
             project = options["project"]
-            commit = options["commit"]
             repo = Repository.objects.get(name=project, active_status="active")
-            pushlog_url = "%s/json-pushes/?full=1&version=2" % repo.url
-            process = HgPushlogProcess()
-            process.run(pushlog_url, project, changeset=commit, last_push_id=None)
+            if typeOfIngestion == "push":
+                # get reference to repo and ingest this particular revision for this project
+                commit = options["commit"]
+                pushlog_url = "%s/json-pushes/?full=1&version=2" % repo.url
+                process = HgPushlogProcess()
+                process.run(pushlog_url, project, changeset=commit, last_push_id=None)
+                revisions = [commit]
+            else:
+                assert options["from_revision"] and options["to_revision"]
+                revisions = ingest_hg_push_range(repo, options["from_revision"],
+                                                 options["to_revision"])
+                logger.info("Ingested %s pushes", len(revisions))
 
             if options["ingest_all_tasks"]:
-                gecko_decision_task = get_decision_task_id(project, commit, repo.tc_root_url)
+                decision_task_ids = []
+                for revision in revisions:
+                    try:
+                        decision_task_ids.append(
+                            get_decision_task_id(project, revision, repo.tc_root_url))
+                    except Exception as e:
+                        # e.g. pushes which didn't run any tasks
+                        logger.warning("No decision task for %s: %s", revision, e)
                 logger.info("## START ##")
-                loop.run_until_complete(processTasks(gecko_decision_task, repo.tc_root_url))
+                # the tasks of all the pushes go through the same backfill, so
+                # they are fetched and stored concurrently and checkpointed together
+                self.backfill(repo.tc_root_url, options).run(decision_task_ids)
                 logger.info("## END ##")
             else:
                 logger.info(
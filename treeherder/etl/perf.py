@@ -1,16 +1,23 @@
 import copy
 import logging
+from collections import defaultdict
 from hashlib import sha1
 from typing import List
 
 import simplejson as json
+from django.db import (IntegrityError,
+                       transaction)
 
+from treeherder.etl.common import load_artifact_blob
 from treeherder.log_parser.utils import validate_perf_data
 from treeherder.model.models import OptionCollection
-from treeherder.perf.models import (PerformanceDatum,
+from treeherder.perf.models import (SIGNATURES_VERSION_CACHE_KEY,
+                                    PerformanceDatum,
                                     PerformanceFramework,
                                     PerformanceSignature)
-from treeherder.perf.tasks import generate_alerts
+from treeherder.perf.tasks import schedule_alert_generation
+from treeherder.utils.cache import (VersionedLRUCache,
+                                    bump_cache_version)
 
 logger = logging.getLogger(__name__)
 
@@ -42,25 +49,179 @@ def _order_and_concat(words: List) -> str:
     return ' '.join(sorted(words))
 
 
-def _create_or_update_signature(repository, signature_hash, framework, defaults):
-    signature, created = PerformanceSignature.objects.get_or_create(
-        repository=repository,
-        signature_hash=signature_hash,
-        framework=framework,
-        defaults=defaults)
-    if not created:
-        if signature.last_updated > defaults['last_updated']:
-            defaults['last_updated'] = signature.last_updated
-        signature, _ = PerformanceSignature.objects.update_or_create(
-            repository=repository,
-            signature_hash=signature_hash,
-            framework=framework,
-            defaults=defaults)
-    return signature
+# Signatures stored recently by this process, keyed by (repository id,
+# framework id, signature hash), so those recurring job after job need
+# neither a lookup nor an update unless their properties changed. Every
+# worker drops its copies whenever signatures are deleted or their properties
+# modified, so that the cached properties are those in the database.
+SIGNATURE_CACHE_SIZE = 10000
+_signature_cache = VersionedLRUCache(SIGNATURES_VERSION_CACHE_KEY, SIGNATURE_CACHE_SIZE)
+
+
+def _without_last_updated(properties):
+    return {field: value for (field, value) in properties.items() if field != 'last_updated'}
+
+
+def _create_or_update_signatures(repository, framework, signature_properties):
+    '''
+    Creates the missing signatures and updates the existing ones, given the
+    properties of each signature by its hash, and returns them by hash
+    '''
+    signatures = {}
+    uncached_properties = {}
+    # only the last_updated timestamp changes for most signatures
+    last_updated_bumps = defaultdict(list)
+    for (signature_hash, properties) in signature_properties.items():
+        cached = _signature_cache.get((repository.id, framework.id, signature_hash))
+        if (cached is None or
+                _without_last_updated(cached[1]) != _without_last_updated(properties)):
+            uncached_properties[signature_hash] = properties
+            continue
+
+        (signature_id, cached_properties) = cached
+        signature = PerformanceSignature(id=signature_id,
+                                         repository=repository,
+                                         framework=framework,
+                                         signature_hash=signature_hash,
+                                         **cached_properties)
+        if properties['last_updated'] > signature.last_updated:
+            signature.last_updated = properties['last_updated']
+            last_updated_bumps[signature.last_updated].append(signature)
+        signatures[signature_hash] = signature
+
+    for (last_updated, bumped_signatures) in last_updated_bumps.items():
+        PerformanceSignature.objects.filter(
+            id__in=[signature.id for signature in bumped_signatures],
+            last_updated__lt=last_updated).update(last_updated=last_updated)
+        for signature in bumped_signatures:
+            _cache_signature(signature, signature_properties[signature.signature_hash])
+
+    stored_signatures = _store_signatures(repository, framework, uncached_properties)
+    for signature in stored_signatures.values():
+        _cache_signature(signature, signature_properties[signature.signature_hash])
+    signatures.update(stored_signatures)
+
+    return signatures
+
+
+def _cache_signature(signature, properties):
+    _signature_cache.set((signature.repository_id, signature.framework_id, signature.signature_hash),
+                         (signature.id, {field: getattr(signature, field) for field in properties}))
+
+
+def _store_signatures(repository, framework, signature_properties):
+    '''
+    Same as `_create_or_update_signatures`, going through the database
+    for all signatures
+    '''
+    if not signature_properties:
+        return {}
+
+    signatures = {signature.signature_hash: signature
+                  for signature in PerformanceSignature.objects.filter(
+                      repository=repository,
+                      framework=framework,
+                      signature_hash__in=list(signature_properties))}
+
+    updated_signatures = []
+    modified = False
+    for (signature_hash, signature) in signatures.items():
+        properties = dict(signature_properties[signature_hash])
+        if signature.last_updated > properties['last_updated']:
+            properties['last_updated'] = signature.last_updated
+        changed_fields = [field for (field, value) in properties.items()
+                          if getattr(signature, field) != value]
+        if changed_fields:
+            for (field, value) in properties.items():
+                setattr(signature, field, value)
+            updated_signatures.append(signature)
+            modified = modified or changed_fields != ['last_updated']
+    if updated_signatures:
+        PerformanceSignature.objects.bulk_update(
+            updated_signatures, fields=list(next(iter(signature_properties.values())).keys()))
+    if modified:
+        # other workers may have cached the previous properties
+        bump_cache_version(SIGNATURES_VERSION_CACHE_KEY)
+
+    new_signatures = [PerformanceSignature(repository=repository,
+                                           framework=framework,
+                                           signature_hash=signature_hash,
+                                           **properties)
+                      for (signature_hash, properties) in signature_properties.items()
+                      if signature_hash not in signatures]
+    if new_signatures:
+        try:
+            with transaction.atomic():
+                PerformanceSignature.objects.bulk_create(new_signatures)
+        except IntegrityError:
+            # some were created concurrently, go through them one by one
+            for signature in new_signatures:
+                PerformanceSignature.objects.update_or_create(
+                    repository=repository,
+                    framework=framework,
+                    signature_hash=signature.signature_hash,
+                    defaults=signature_properties[signature.signature_hash])
+        signatures.update((signature.signature_hash, signature)
+                          for signature in PerformanceSignature.objects.filter(
+                              repository=repository,
+                              framework=framework,
+                              signature_hash__in=[signature.signature_hash
+                                                  for signature in new_signatures]))
+
+    return signatures
+
+
+def _store_signatures_and_datums(job, framework, summary_signatures, subtest_signatures,
+                                 subtest_parents, datums):
+    '''
+    Stores the signatures of a performance artifact and the datums of the job
+    against them, and returns the datums that weren't stored already
+    '''
+    signatures = _create_or_update_signatures(job.repository, framework,
+                                              summary_signatures)
+    for (subtest_signature_hash, summary_signature_hash) in subtest_parents.items():
+        if summary_signature_hash is not None:
+            subtest_signatures[subtest_signature_hash]['parent_signature_id'] = \
+                signatures[summary_signature_hash].id
+    signatures.update(_create_or_update_signatures(job.repository, framework,
+                                                   subtest_signatures))
+
+    existing_datums = set(PerformanceDatum.objects.filter(
+        repository=job.repository,
+        job=job,
+        push=job.push,
+        signature__in=[signature.id for signature in signatures.values()]
+    ).values_list('signature_id', flat=True))
+    new_datums = [PerformanceDatum(repository=job.repository,
+                                   job=job,
+                                   push=job.push,
+                                   signature=signatures[signature_hash],
+                                   push_timestamp=job.push.time,
+                                   value=value)
+                  for (signature_hash, (value, _)) in datums.items()
+                  if signatures[signature_hash].id not in existing_datums]
+    # the signatures' last_updated already accounts for these, which is
+    # all PerformanceDatum.save() would do on top of inserting them
+    try:
+        with transaction.atomic():
+            PerformanceDatum.objects.bulk_create(new_datums)
+    except IntegrityError:
+        # some were stored concurrently, only keep those we actually create
+        new_datums = [datum for datum in new_datums
+                      if PerformanceDatum.objects.get_or_create(
+                          repository=datum.repository,
+                          job=datum.job,
+                          push=datum.push,
+                          signature=datum.signature,
+                          push_timestamp=datum.push_timestamp,
+                          defaults={'value': datum.value})[1]]
+
+    return new_datums
 
 
 def _load_perf_datum(job, perf_datum):
     validate_perf_data(perf_datum)
+    _signature_cache.refresh()
 
     extra_properties = {}
     reference_data = {
@@ -83,6 +244,16 @@ def _load_perf_datum(job, perf_datum):
         logger.info("Performance framework %s is not enabled, skipping",
                     perf_datum['framework']['name'])
         return
+
+    # gather all signatures of the artifact up front, so they (and their
+    # datums) can be stored with a handful of queries; summaries go first
+    # as their subtests refer to them
+    summary_signatures = {}
+    subtest_signatures = {}
+    subtest_parents = {}
+    # signature hash -> (value, whether to generate alerts when the
+    # signature doesn't say)
+    datums = {}
     for suite in perf_datum['suites']:
         suite_extra_properties = copy.copy(extra_properties)
         ordered_tags = _order_and_concat(suite.get('tags', []))
@@ -106,41 +277,30 @@ def _load_perf_datum(job, perf_datum):
             summary_properties.update(suite_extra_properties)
             summary_signature_hash = _get_signature_hash(
                 summary_properties)
-            signature = _create_or_update_signature(
-                job.repository, summary_signature_hash, framework, {
-                    'test': '',
-                    'suite': suite['name'],
-                    'suite_public_name': suite.get('publicName'),
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'tags': ordered_tags,
-                    'extra_options': suite_extra_options,
-                    'measurement_unit': suite.get('unit'),
-                    'application': _get_application_name(perf_datum),
-                    'lower_is_better': suite.get('lowerIsBetter', True),
-                    'has_subtests': True,
-                    # these properties below can be either True, False, or null
-                    # (None). Null indicates no preference has been set.
-                    'should_alert': suite.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        suite.get('alertChangeType')),
-                    'alert_threshold': suite.get('alertThreshold'),
-                    'min_back_window': suite.get('minBackWindow'),
-                    'max_back_window': suite.get('maxBackWindow'),
-                    'fore_window': suite.get('foreWindow'),
-                    'last_updated': job.push.time
-                })
-            (_, datum_created) = PerformanceDatum.objects.get_or_create(
-                repository=job.repository,
-                job=job,
-                push=job.push,
-                signature=signature,
-                push_timestamp=job.push.time,
-                defaults={'value': suite['value']})
-            if signature.should_alert is not False and datum_created and \
-               job.repository.performance_alerts_enabled:
-                generate_alerts.apply_async(args=[signature.id],
-                                            queue='generate_perf_alerts')
+            summary_signatures[summary_signature_hash] = {
+                'test': '',
+                'suite': suite['name'],
+                'suite_public_name': suite.get('publicName'),
+                'option_collection_id': option_collection.id,
+                'platform_id': job.machine_platform_id,
+                'tags': ordered_tags,
+                'extra_options': suite_extra_options,
+                'measurement_unit': suite.get('unit'),
+                'application': _get_application_name(perf_datum),
+                'lower_is_better': suite.get('lowerIsBetter', True),
+                'has_subtests': True,
+                # these properties below can be either True, False, or null
+                # (None). Null indicates no preference has been set.
+                'should_alert': suite.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    suite.get('alertChangeType')),
+                'alert_threshold': suite.get('alertThreshold'),
+                'min_back_window': suite.get('minBackWindow'),
+                'max_back_window': suite.get('maxBackWindow'),
+                'fore_window': suite.get('foreWindow'),
+                'last_updated': job.push.time
+            }
+            datums.setdefault(summary_signature_hash, (suite['value'], True))
 
         for subtest in suite['subtests']:
             subtest_properties = {
@@ -150,64 +310,69 @@ def _load_perf_datum(job, perf_datum):
             subtest_properties.update(reference_data)
             subtest_properties.update(suite_extra_properties)
 
-            summary_signature = None
             if summary_signature_hash is not None:
                 subtest_properties.update({'parent_signature': summary_signature_hash})
-                summary_signature = PerformanceSignature.objects.get(
-                    repository=job.repository,
-                    framework=framework,
-                    signature_hash=summary_signature_hash)
             subtest_signature_hash = _get_signature_hash(subtest_properties)
-            value = list(subtest['value'] for subtest in suite['subtests'] if
-                         subtest['name'] == subtest_properties['test'])
-            signature = _create_or_update_signature(
-                job.repository, subtest_signature_hash, framework, {
-                    'test': subtest_properties['test'],
-                    'suite': suite['name'],
-                    'test_public_name': subtest.get('publicName'),
-                    'suite_public_name': suite.get('publicName'),
-                    'option_collection': option_collection,
-                    'platform': job.machine_platform,
-                    'tags': ordered_tags,
-                    'extra_options': suite_extra_options,
-                    'measurement_unit': subtest.get('unit'),
-                    'application': _get_application_name(perf_datum),
-                    'lower_is_better': subtest.get('lowerIsBetter', True),
-                    'has_subtests': False,
-                    # these properties below can be either True, False, or
-                    # null (None). Null indicates no preference has been
-                    # set.
-                    'should_alert': subtest.get('shouldAlert'),
-                    'alert_change_type': PerformanceSignature._get_alert_change_type(
-                        subtest.get('alertChangeType')),
-                    'alert_threshold': subtest.get('alertThreshold'),
-                    'min_back_window': subtest.get('minBackWindow'),
-                    'max_back_window': subtest.get('maxBackWindow'),
-                    'fore_window': subtest.get('foreWindow'),
-                    'parent_signature': summary_signature,
-                    'last_updated': job.push.time
-                })
-            (_, datum_created) = PerformanceDatum.objects.get_or_create(
-                repository=job.repository,
-                job=job,
-                push=job.push,
-                signature=signature,
-                push_timestamp=job.push.time,
-                defaults={'value': value[0]})
-
-            # by default if there is no summary, we should schedule a
-            # generate alerts task for the subtest, since we have new data
-            # (this can be over-ridden by the optional "should alert"
-            # property)
-            if ((signature.should_alert or (signature.should_alert is None and
-                                            suite.get('value') is None)) and
-                datum_created and job.repository.performance_alerts_enabled):
-                generate_alerts.apply_async(args=[signature.id],
-                                            queue='generate_perf_alerts')
+            subtest_signatures[subtest_signature_hash] = {
+                'test': subtest_properties['test'],
+                'suite': suite['name'],
+                'test_public_name': subtest.get('publicName'),
+                'suite_public_name': suite.get('publicName'),
+                'option_collection_id': option_collection.id,
+                'platform_id': job.machine_platform_id,
+                'tags': ordered_tags,
+                'extra_options': suite_extra_options,
+                'measurement_unit': subtest.get('unit'),
+                'application': _get_application_name(perf_datum),
+                'lower_is_better': subtest.get('lowerIsBetter', True),
+                'has_subtests': False,
+                # these properties below can be either True, False, or
+                # null (None). Null indicates no preference has been
+                # set.
+                'should_alert': subtest.get('shouldAlert'),
+                'alert_change_type': PerformanceSignature._get_alert_change_type(
+                    subtest.get('alertChangeType')),
+                'alert_threshold': subtest.get('alertThreshold'),
+                'min_back_window': subtest.get('minBackWindow'),
+                'max_back_window': subtest.get('maxBackWindow'),
+                'fore_window': subtest.get('foreWindow'),
+                'parent_signature_id': None,
+                'last_updated': job.push.time
+            }
+            subtest_parents[subtest_signature_hash] = summary_signature_hash
+            # by default if there is no summary, we should generate alerts
+            # for the subtest, since we have new data (this can be
+            # over-ridden by the optional "should alert" property)
+            datums.setdefault(subtest_signature_hash,
+                              (subtest['value'], suite.get('value') is None))
+
+    try:
+        with transaction.atomic():
+            new_datums = _store_signatures_and_datums(job, framework, summary_signatures,
+                                                      subtest_signatures, subtest_parents, datums)
+    except IntegrityError:
+        # signatures deleted without bumping their cache version (e.g. from
+        # the admin or a shell) are still cached with their former ids, so
+        # make every worker drop its copies and try again without them
+        logger.warning("Cached performance signatures of job %s no longer exist, "
+                       "storing its performance data again", job.id)
+        bump_cache_version(SIGNATURES_VERSION_CACHE_KEY)
+        _signature_cache.refresh()
+        new_datums = _store_signatures_and_datums(job, framework, summary_signatures,
+                                                  subtest_signatures, subtest_parents, datums)
+
+    if not job.repository.performance_alerts_enabled:
+        return
+    for datum in new_datums:
+        should_alert = datum.signature.should_alert
+        if should_alert is None:
+            should_alert = datums[datum.signature.signature_hash][1]
+        if should_alert:
+            schedule_alert_generation(datum.signature_id)
 
 
 def store_performance_artifact(job, artifact):
-    blob = json.loads(artifact['blob'])
+    blob = load_artifact_blob(artifact)
     performance_data = blob['performance_data']
 
     if isinstance(performance_data, list):
@@ -1,7 +1,8 @@
 import logging
 from datetime import datetime
 
-from django.db import transaction
+from django.db import (IntegrityError,
+                       transaction)
 
 from treeherder.model.models import (Commit,
                                      Push)
@@ -23,14 +24,38 @@ def store_push(repository, push_dict):
                 'time': datetime.utcfromtimestamp(
                     push_dict['push_timestamp'])
             })
+
+        # Pushes can have hundreds of commits (e.g. merges), so rather than
+        # update_or_create each of them, compare them with the stored ones
+        commits = {commit.revision: commit for commit in push.commits.all()}
+        new_commits = {}
+        changed_commits = {}
         for revision in push_dict['revisions']:
-            Commit.objects.update_or_create(
-                push=push,
-                revision=revision['revision'],
-                defaults={
-                    'author': revision['author'],
-                    'comments': revision['comment']
-                })
+            commit = commits.get(revision['revision'])
+            if commit is None:
+                commit = Commit(push=push, revision=revision['revision'])
+                commits[commit.revision] = commit
+                new_commits[commit.revision] = commit
+            elif commit.pk and (commit.author, commit.comments) != (
+                    revision['author'], revision['comment']):
+                changed_commits[commit.revision] = commit
+            commit.author = revision['author']
+            commit.comments = revision['comment']
+
+        try:
+            with transaction.atomic():
+                Commit.objects.bulk_create(list(new_commits.values()))
+        except IntegrityError:
+            # the push was stored concurrently, go through its commits one by one
+            for commit in new_commits.values():
+                Commit.objects.update_or_create(
+                    push=push,
+                    revision=commit.revision,
+                    defaults={
+                        'author': commit.author,
+                        'comments': commit.comments
+                    })
+        Commit.objects.bulk_update(list(changed_commits.values()), ['author', 'comments'])
 
 
 def store_push_data(repository, pushes):
@@ -12,8 +12,9 @@ RUNNABLE_JOBS_URL = 'https://firefox-ci-tc.services.mozilla.com/api/queue/v1/tas
 TASKCLUSTER_INDEX_URL = 'https://firefox-ci-tc.services.mozilla.com/api/index/v1/task/gecko.v2.%s.latest.taskgraph.decision'
 
 
-def _taskcluster_runnable_jobs(project):
-    decision_task_id = query_latest_gecko_decision_task_id(project)
+def _taskcluster_runnable_jobs(project, decision_task_id=None):
+    if decision_task_id is None:
+        decision_task_id = query_latest_gecko_decision_task_id(project)
     # Some trees (e.g. comm-central) don't have a decision task, which means there are no taskcluster runnable jobs
     if not decision_task_id:
         return []
@@ -54,8 +55,8 @@ def _taskcluster_runnable_jobs(project):
     return []
 
 
-def list_runnable_jobs(project):
-    return _taskcluster_runnable_jobs(project)
+def list_runnable_jobs(project, decision_task_id=None):
+    return _taskcluster_runnable_jobs(project, decision_task_id)
 
 
 def query_latest_gecko_decision_task_id(project):
@@ -2,7 +2,8 @@ import logging
 
 from django.core.cache import cache
 
-from treeherder.etl.runnable_jobs import list_runnable_jobs
+from treeherder.etl.runnable_jobs import (list_runnable_jobs,
+                                          query_latest_gecko_decision_task_id)
 from treeherder.seta.common import (convert_job_type_name_to_testtype,
                                     unique_key)
 from treeherder.seta.models import JobPriority
@@ -58,27 +59,26 @@ def job_priorities_to_jobtypes():
     return jobtypes
 
 
-# The only difference between projects is that their list will be based
-# on their own specific runnable_jobs.json artifact
-def get_reference_data_names(project="autoland", build_system="taskcluster"):
-    '''
-    We want all reference data names for every task that runs on a specific project.
+# The build systems whose reference data names are cached separately; the
+# names for '*' are the union of these.
+REF_DATA_NAMES_BUILD_SYSTEMS = ('buildbot', 'taskcluster')
 
-    For example: "test-linux64/opt-mochitest-webgl-e10s-1"
+
+def _ref_data_names_cache_key(project, build_system):
+    return '{}-{}-ref_data_names_cache'.format(project, build_system)
+
+
+def _decision_task_cache_key(project):
+    return '{}-ref_data_names_decision_task'.format(project)
+
+
+def build_reference_data_names(runnable_jobs):
+    '''
+    Map the unique key of every SETA supported runnable job to its reference
+    data name, for each build system.
     '''
-    # we cache the reference data names in order to reduce API calls
-    cache_key = '{}-{}-ref_data_names_cache'.format(project, build_system)
-    ref_data_names_map = cache.get(cache_key)
-    if ref_data_names_map:
-        return ref_data_names_map
-
-    logger.debug("We did not hit the cache.")
-    # cache expired so re-build the reference data names map; the map
-    # contains the ref_data_name of every Treeherder task for this project
     ignored_jobs = []
-    ref_data_names = {}
-
-    runnable_jobs = list_runnable_jobs(project)
+    ref_data_names = {build_system: {} for build_system in REF_DATA_NAMES_BUILD_SYSTEMS}
 
     for job in runnable_jobs:
         # get testtype e.g. web-platform-tests-4
@@ -102,14 +102,71 @@ def get_reference_data_names(project="autoland", build_system="taskcluster"):
                          buildtype=job['platform_option'],
                          platform=job['platform'])
 
-        if build_system == '*':
-            ref_data_names[key] = job['ref_data_name']
-        elif job['build_system_type'] == build_system:
-            ref_data_names[key] = job['ref_data_name']
+        if job['build_system_type'] in ref_data_names:
+            ref_data_names[job['build_system_type']][key] = job['ref_data_name']
 
     logger.debug('Ignoring %s', ', '.join(sorted(ignored_jobs)))
 
-    # update the cache
-    cache.set(cache_key, ref_data_names_map, SETA_REF_DATA_NAMES_CACHE_TIMEOUT)
+    return ref_data_names
+
+
+def update_reference_data_names(project, decision_task_id=None):
+    '''
+    Rebuild the cached reference data names of every build system for a
+    project, from a single download of its runnable jobs.
+    '''
+    ref_data_names = build_reference_data_names(list_runnable_jobs(project, decision_task_id))
+    cache.set_many({_ref_data_names_cache_key(project, build_system): names
+                    for build_system, names in ref_data_names.items()},
+                   SETA_REF_DATA_NAMES_CACHE_TIMEOUT)
+    return ref_data_names
+
+
+def refresh_reference_data_names(project):
+    '''
+    Keep the cached reference data names of a project current, only rebuilding
+    them when a new decision task has run since they were last built.
+    '''
+    decision_task_id = query_latest_gecko_decision_task_id(project)
+    cache_keys = [_ref_data_names_cache_key(project, build_system)
+                  for build_system in REF_DATA_NAMES_BUILD_SYSTEMS]
+    decision_task_cache_key = _decision_task_cache_key(project)
+
+    if (decision_task_id and cache.get(decision_task_cache_key) == decision_task_id and
+            all(cache.touch(key, SETA_REF_DATA_NAMES_CACHE_TIMEOUT) for key in cache_keys)):
+        logger.debug('Reference data names of %s are up to date', project)
+        return
+
+    logger.info('Updating the reference data names of %s for decision task %s', project, decision_task_id)
+    update_reference_data_names(project, decision_task_id)
+    cache.set(decision_task_cache_key, decision_task_id, SETA_REF_DATA_NAMES_CACHE_TIMEOUT)
+
 
+# The only difference between projects is that their list will be based
+# on their own specific runnable_jobs.json artifact
+def get_reference_data_names(project="autoland", build_system="taskcluster"):
+    '''
+    We want all reference data names for every task that runs on a specific project.
+
+    For example: "test-linux64/opt-mochitest-webgl-e10s-1"
+    '''
+    build_systems = REF_DATA_NAMES_BUILD_SYSTEMS if build_system == '*' else (build_system,)
+
+    # the reference data names are kept cached (see `refresh_reference_data_names`)
+    # in order to reduce API calls
+    cache_keys = {build_system: _ref_data_names_cache_key(project, build_system)
+                  for build_system in build_systems}
+    cached = cache.get_many(cache_keys.values())
+    if len(cached) == len(cache_keys):
+        ref_data_names_map = {build_system: cached[cache_key]
+                              for build_system, cache_key in cache_keys.items()}
+    else:
+        logger.debug("We did not hit the cache.")
+        # cache expired so re-build the reference data names map; the map
+        # contains the ref_data_name of every Treeherder task for this project
+        ref_data_names_map = update_reference_data_names(project)
+
+    ref_data_names = {}
+    for build_system in build_systems:
+        ref_data_names.update(ref_data_names_map.get(build_system, {}))
     return ref_data_names
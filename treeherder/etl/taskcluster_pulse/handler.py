@@ -12,6 +12,7 @@ import taskcluster_urls
 
 from treeherder.etl.schema import get_json_schema
 from treeherder.etl.taskcluster_pulse.parse_route import parseRoute
+from treeherder.utils.cache import LRUCache
 
 env = environ.Env()
 logger = logging.getLogger(__name__)
@@ -19,6 +20,14 @@ loop = asyncio.get_event_loop()
 projectsToIngest = env("PROJECTS_TO_INGEST", default=None)
 session = taskcluster.aio.createSession(loop=loop)
 
+# Task definitions never change, but are needed for each of the several
+# messages about the runs of a task, so they're kept for a while (by root
+# url and task id). At most this many are fetched concurrently in advance.
+TASK_DEFINITION_CACHE_SIZE = 5000
+TASK_DEFINITION_CACHE_TTL = 6 * 60 * 60
+TASK_DEFINITION_PREFETCH_CONCURRENCY = 10
+taskDefinitions = LRUCache(TASK_DEFINITION_CACHE_SIZE, ttl=TASK_DEFINITION_CACHE_TTL)
+
 
 # Build a mapping from exchange name to task status
 EXCHANGE_EVENT_MAP = {
@@ -112,8 +121,7 @@ def validateTask(task):
 async def handleMessage(message, taskDefinition=None):
     jobs = []
     taskId = message["payload"]["status"]["taskId"]
-    asyncQueue = taskcluster.aio.Queue({"rootUrl": message["root_url"]}, session=session)
-    task = (await asyncQueue.task(taskId)) if not taskDefinition else taskDefinition
+    task = taskDefinition or (await fetchTaskDefinition(message["root_url"], taskId))
 
     try:
         parsedRoute = parseRouteInfo("tc-treeherder", taskId, task["routes"], task)
@@ -173,6 +181,31 @@ async def handleMessage(message, taskDefinition=None):
     return jobs
 
 
+async def fetchTaskDefinition(root_url, taskId):
+    task = taskDefinitions.get((root_url, taskId))
+    if task is None:
+        asyncQueue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session)
+        task = await asyncQueue.task(taskId)
+        taskDefinitions.set((root_url, taskId), task)
+    return task
+
+
+# Fetches the definitions of the tasks of all the messages concurrently, so
+# that handling the messages one after another doesn't wait for each in turn.
+# Any that fail are left to be fetched (and fail) when handling their message.
+async def prefetchTaskDefinitions(messages):
+    semaphore = asyncio.Semaphore(TASK_DEFINITION_PREFETCH_CONCURRENCY)
+
+    async def prefetch(root_url, taskId):
+        async with semaphore:
+            await fetchTaskDefinition(root_url, taskId)
+
+    keys = {(message["root_url"], message["payload"]["status"]["taskId"]) for message in messages}
+    await asyncio.gather(*(prefetch(root_url, taskId) for (root_url, taskId) in keys
+                           if (root_url, taskId) not in taskDefinitions),
+                         return_exceptions=True)
+
+
 # Builds the basic Treeherder job message that's universal for all
 # messsage types.
 #
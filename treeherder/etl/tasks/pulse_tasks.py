@@ -7,7 +7,8 @@ import newrelic.agent
 
 from treeherder.etl.job_loader import JobLoader
 from treeherder.etl.push_loader import PushLoader
-from treeherder.etl.taskcluster_pulse.handler import handleMessage
+from treeherder.etl.taskcluster_pulse.handler import (handleMessage,
+                                                      prefetchTaskDefinitions)
 from treeherder.workers.task import retryable_task
 
 # NOTE: default values for root_url parameters can be removed once all tasks that lack
@@ -33,6 +34,49 @@ def store_pulse_tasks(pulse_job, exchange, routing_key, root_url='https://firefo
             JobLoader().process_job(run, root_url)
 
 
+@retryable_task(name='store-pulse-tasks-batch', max_retries=10)
+def store_pulse_tasks_batch(messages, root_url):
+    """
+    Fetches the tasks of a batch of pulse messages from Taskcluster, and
+    stores all their jobs together.
+
+    Any message which fails is handed over to ``store_pulse_tasks``, so that
+    it's retried on its own just as it would have been without batching.
+    """
+    loop = asyncio.get_event_loop()
+    newrelic.agent.add_custom_parameter("batch_size", len(messages))
+    # handleMessage expects messages in this format
+    handler_messages = [{
+        "exchange": exchange,
+        "payload": pulse_job,
+        "root_url": root_url,
+    } for (pulse_job, exchange, routing_key) in messages]
+    loop.run_until_complete(prefetchTaskDefinitions(handler_messages))
+
+    runs = []
+    failed = set()
+    for index, message in enumerate(handler_messages):
+        try:
+            message_runs = loop.run_until_complete(handleMessage(message))
+        except Exception:
+            failed.add(index)
+            continue
+        runs.extend((index, run) for run in message_runs if run)
+
+    # a message with several runs is retried in full if any of them fails,
+    # which is fine since storing the same job again changes nothing
+    failed_runs = {id(run) for (run, _) in JobLoader().process_jobs(
+        [run for (_, run) in runs], root_url)}
+    failed.update(index for (index, run) in runs if id(run) in failed_runs)
+
+    for index in sorted(failed):
+        pulse_job, exchange, routing_key = messages[index]
+        store_pulse_tasks.apply_async(
+            args=[pulse_job, exchange, routing_key, root_url],
+            queue='store_pulse_tasks'
+        )
+
+
 @retryable_task(name='store-pulse-pushes', max_retries=10)
 def store_pulse_pushes(body, exchange, routing_key, root_url='https://firefox-ci-tc.services.mozilla.com'):
     """
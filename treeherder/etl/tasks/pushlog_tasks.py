@@ -1,24 +1,100 @@
+import logging
+import time
+from concurrent.futures import (FIRST_COMPLETED,
+                                ThreadPoolExecutor,
+                                wait)
+
 import newrelic.agent
 from celery import task
+from django.conf import settings
+from django.db import connection
 
 from treeherder.etl.pushlog import HgPushlogProcess
 from treeherder.model.models import Repository
 
+logger = logging.getLogger(__name__)
+
+# How long fetching the pushlog of a repository may take, be it in a subtask
+# or in a thread of `fetch_push_logs_concurrently`.
+FETCH_PUSH_LOG_TIME_LIMIT = 10 * 60
+
 
 @task(name='fetch-push-logs')
 def fetch_push_logs():
     """
-    Run several fetch_hg_push_log subtasks, one per repository
+    Run several fetch_hg_push_log subtasks, one per repository, or if
+    ``PUSHLOG_POLL_THREADS`` is set, fetch all the pushlogs in this task
     """
-    for repo in Repository.objects.filter(dvcs_type='hg',
-                                          active_status="active"):
+    repositories = Repository.objects.filter(dvcs_type='hg',
+                                             active_status="active")
+    if settings.PUSHLOG_POLL_THREADS:
+        fetch_push_logs_concurrently([(repo.name, repo.url) for repo in repositories],
+                                     settings.PUSHLOG_POLL_THREADS)
+        return
+
+    for repo in repositories:
         fetch_hg_push_log.apply_async(
             args=(repo.name, repo.url),
             queue='pushlog'
         )
 
 
-@task(name='fetch-hg-push-logs', soft_time_limit=10 * 60)
+def fetch_push_logs_concurrently(repositories, threads):
+    """
+    Fetch the pushlogs of the given ``(name, url)`` repositories, up to
+    ``threads`` of them at a time. Since these share the connections to each
+    host (see `treeherder.utils.http.get_session`), polling many repositories
+    only connects to hg.mozilla.org a few times. A failure for one repository
+    is reported, but doesn't stop the others being fetched, nor does one
+    taking longer than ``FETCH_PUSH_LOG_TIME_LIMIT``, which is given up on.
+    """
+    started = {}
+
+    def fetch(repo_name, repo_url):
+        started[repo_name] = time.monotonic()
+        try:
+            fetch_hg_push_log(repo_name, repo_url)
+        finally:
+            # Each thread has a database connection of its own.
+            connection.close()
+
+    executor = ThreadPoolExecutor(threads)
+    futures = {executor.submit(fetch, repo_name, repo_url): repo_name
+               for (repo_name, repo_url) in repositories}
+    pending = set(futures)
+    timed_out = []
+    while pending:
+        # wait until a fetch is done, or until the first one running overruns
+        deadlines = [started[futures[future]] + FETCH_PUSH_LOG_TIME_LIMIT
+                     for future in pending if futures[future] in started]
+        timeout = (min(deadlines) - time.monotonic()) if deadlines else FETCH_PUSH_LOG_TIME_LIMIT
+        done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                future.result()
+            except Exception:
+                logger.exception("Failed to fetch the pushlog of %s", futures[future])
+                newrelic.agent.record_exception()
+
+        now = time.monotonic()
+        for future in list(pending):
+            repo_name = futures[future]
+            if repo_name in started and now - started[repo_name] >= FETCH_PUSH_LOG_TIME_LIMIT:
+                logger.error("Timed out fetching the pushlog of %s", repo_name)
+                timed_out.append(future)
+                pending.remove(future)
+        if sum(not future.done() for future in timed_out) >= threads:
+            # all the threads may be stuck, the remaining fetches would never run
+            for future in pending:
+                if future.cancel():
+                    logger.error("Gave up fetching the pushlog of %s", futures[future])
+            break
+
+    # don't hold up the next poll waiting for fetches which timed out
+    executor.shutdown(wait=False)
+
+
+@task(name='fetch-hg-push-logs', soft_time_limit=FETCH_PUSH_LOG_TIME_LIMIT)
 def fetch_hg_push_log(repo_name, repo_url):
     """
     Run a HgPushlog etl process
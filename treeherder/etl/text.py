@@ -27,3 +27,14 @@ def astral_filter(text):
         return text
 
     return filter_re.sub(convert_unicode_character_to_ascii_repr, text)
+
+
+def astral_filter_lines(lines):
+    """
+    Apply `astral_filter` to a list of lines, only searching the lines
+    individually when any of them contain an astral character.
+    """
+    if not filter_re.search('\n'.join(line for line in lines if line)):
+        return list(lines)
+
+    return [astral_filter(line) for line in lines]
@@ -1,8 +1,12 @@
 import logging
+from bisect import bisect_right
+from itertools import (accumulate,
+                       islice)
 
 import newrelic.agent
 
-from treeherder.utils.http import make_request
+from treeherder.utils.http import (iter_lines,
+                                   spool_download)
 
 from .artifactbuilders import (BuildbotJobArtifactBuilder,
                                BuildbotLogViewArtifactBuilder,
@@ -12,6 +16,8 @@ from .parsers import EmptyPerformanceData
 logger = logging.getLogger(__name__)
 # Max log size in bytes we will download (prior to decompression).
 MAX_DOWNLOAD_SIZE_IN_BYTES = 5 * 1024 * 1024
+# Number of log lines searched at once for the terms the parsers look for.
+PREFILTER_CHUNK_LINES = 10000
 
 
 class ArtifactBuilderCollection:
@@ -28,7 +34,7 @@ ArtifactBuilderCollection
 * If ``builders`` passed in, uses those as the artifact
 builders, otherwise creates the default artifact builders.
 * Reads the log from the log handle/url and walks each line
-calling into each artifact builder with each line for handling
+calling into each artifact builder whose parser wants the line
 * Maintains no state
 
 
@@ -85,14 +91,85 @@ BuildbotPerformanceDataArtifactBuilder
                 BuildbotPerformanceDataArtifactBuilder(url=self.url)
             ]
 
+    @property
+    def max_line_bytes(self):
+        """
+        The number of bytes of each line (not holding perf data) that matter.
+
+        Builders truncate such lines to MAX_LINE_LENGTH characters, which take
+        at most four bytes each in UTF-8, so there is no need to decode or
+        search any more of the line than that.
+        """
+        return 4 * max(builder.MAX_LINE_LENGTH for builder in self.builders)
+
+    def parse_lines(self, lines):
+        """
+        Run each builder against an iterable of undecoded log lines.
+
+        Most log lines are of no interest to any of the parsers, so the lines
+        are searched in chunks for the terms the parsers look for (see
+        ``ParserBase.wanted_terms``), and each line is only decoded if a
+        parser could want it, and only handed to the builders whose parser
+        wants it (see ``ParserBase.wants_line``) and isn't yet complete.
+        """
+        max_line_bytes = self.max_line_bytes
+        terms = {term for builder in self.builders for term in builder.parser.wanted_terms}
+        # which of the parsers want lines without any of the terms only
+        # changes as they parse lines
+        every_line_builders = self._every_line_builders()
+        lines = iter(lines)
+        line_count = 0
+        while True:
+            chunk = list(islice(lines, PREFILTER_CHUNK_LINES))
+            if not chunk:
+                break
+            with_terms = _lines_with_terms(chunk, terms)
+            for index, line in enumerate(chunk):
+                if index in with_terms:
+                    builders = self.builders
+                elif every_line_builders:
+                    builders = every_line_builders
+                else:
+                    continue
+                decoded_line = None
+                for builder in builders:
+                    parser = builder.parser
+                    if parser.complete:
+                        continue
+                    if decoded_line is None:
+                        if len(line) > max_line_bytes and b'PERFHERDER_DATA' not in line:
+                            line = line[:max_line_bytes]
+                        # Using `replace` to prevent malformed unicode (which might possibly exist
+                        # in test message output) from breaking parsing of the rest of the log.
+                        decoded_line = line.decode('utf-8', 'replace')
+                    if not parser.wants_line(decoded_line):
+                        continue
+                    builder.lineno = line_count + index
+                    try:
+                        builder.parse_line(decoded_line)
+                    except EmptyPerformanceData:
+                        logger.warning("We have parsed an empty PERFHERDER_DATA for %s", self.url)
+                    every_line_builders = self._every_line_builders()
+            line_count += len(chunk)
+
+        # Builders count every line they were run against, including the ones
+        # skipped above, whereas complete parsers stop counting lines.
+        for builder in self.builders:
+            if not builder.parser.complete:
+                builder.lineno = line_count
+
+    def _every_line_builders(self):
+        return [builder for builder in self.builders
+                if builder.parser.wants_every_line and not builder.parser.complete]
+
     def parse(self):
         """
         Iterate over each line of the log, running each parser against it.
 
-        Stream lines from the gzip file and run each parser against it,
-        building the ``artifact`` as we go.
+        Spool the (decompressed) log to a temporary file and run each parser
+        against its lines, building the ``artifact`` as we go.
         """
-        with make_request(self.url, stream=True) as response:
+        def check_download_size(response):
             download_size_in_bytes = int(response.headers.get('Content-Length', -1))
 
             # Temporary annotation of log size to help set thresholds in bug 1295997.
@@ -108,18 +185,11 @@ BuildbotPerformanceDataArtifactBuilder
             if download_size_in_bytes > MAX_DOWNLOAD_SIZE_IN_BYTES:
                 raise LogSizeException('Download size of %i bytes exceeds limit' % download_size_in_bytes)
 
-            # Lines must be explicitly decoded since `iter_lines()`` returns bytes by default
-            # and we cannot use its `decode_unicode=True` mode, since otherwise Unicode newline
+        with spool_download(self.url, check_response=check_download_size) as log:
+            # Lines must be split before being decoded, since otherwise Unicode newline
             # characters such as `\u0085` (which can appear in test output) are treated the same
-            # as `\n` or `\r`, and so split into unwanted additional lines by `iter_lines()`.
-            for line in response.iter_lines():
-                for builder in self.builders:
-                    try:
-                        # Using `replace` to prevent malformed unicode (which might possibly exist
-                        # in test message output) from breaking parsing of the rest of the log.
-                        builder.parse_line(line.decode('utf-8', 'replace'))
-                    except EmptyPerformanceData:
-                        logger.warning("We have parsed an empty PERFHERDER_DATA for %s", self.url)
+            # as `\n` or `\r`, and so split into unwanted additional lines.
+            self.parse_lines(iter_lines(log))
 
         # gather the artifacts from all builders
         for builder in self.builders:
@@ -135,3 +205,24 @@ BuildbotPerformanceDataArtifactBuilder
 
 class LogSizeException(Exception):
     pass
+
+
+
+def _lines_with_terms(lines, terms):
+    """
+    Return the indexes of the lines which contain any of the byte strings.
+
+    The lines are joined to search all of them with a single call, rather
+    than each line for each term in turn.
+    """
+    text = b'\n'.join(lines)
+    # the offset of the start of each line after the first one
+    ends = list(accumulate(len(line) + 1 for line in lines))
+    found = set()
+    for term in terms:
+        offset = text.find(term)
+        while offset != -1:
+            index = bisect_right(ends, offset)
+            found.add(index)
+            offset = text.find(term, ends[index])
+    return found
@@ -42,47 +42,51 @@ def crossreference_job(job):
 
 @transaction.atomic
 def _crossreference(job):
-    failure_lines = FailureLine.objects.filter(job_guid=job.guid)
-    text_log_errors = TextLogError.objects.filter(step__job=job).order_by('line_number')
+    failure_lines = list(FailureLine.objects.filter(job_guid=job.guid))
+    text_log_errors = list(TextLogError.objects.filter(
+        step__job=job).order_by('line_number').values_list('id', 'line'))
 
     if not failure_lines and text_log_errors:
         return False
 
-    match_iter = structured_iterator(failure_lines)
-    failure_line, repr_str = next(match_iter)
+    summaries = structured_summaries(failure_lines)
+    matched = 0
+    metadata = []
 
     # For each error in the text log, try to match the next unmatched
     # structured log line
-    for error in text_log_errors:
-        if repr_str and error.line.strip().endswith(repr_str):
-            logger.debug("Matched '%s'", error.line)
-            TextLogErrorMetadata.objects.get_or_create(text_log_error=error,
-                                                       failure_line=failure_line)
-            failure_line, repr_str = next(match_iter)
+    for error_id, line in text_log_errors:
+        if matched < len(summaries) and line.strip().endswith(summaries[matched][1]):
+            logger.debug("Matched '%s'", line)
+            metadata.append((error_id, summaries[matched][0].id))
+            matched += 1
         else:
-            logger.debug("Failed to match '%s'", error.line)
+            logger.debug("Failed to match '%s'", line)
+
+    # Errors which were matched when crossreferencing before are left as they are
+    existing = set(TextLogErrorMetadata.objects.filter(
+        text_log_error__step__job=job).values_list('text_log_error_id', 'failure_line_id'))
+    TextLogErrorMetadata.objects.bulk_create(
+        TextLogErrorMetadata(text_log_error_id=error_id, failure_line_id=failure_line_id)
+        for (error_id, failure_line_id) in metadata if (error_id, failure_line_id) not in existing)
 
     # We should have exhausted all structured lines
-    for failure_line, repr_str in match_iter:
-        # We can have a line without a pattern at the end if the log is truncated
-        if failure_line is None:
-            break
+    for failure_line, repr_str in summaries[matched:]:
         logger.warning("Crossreference %s: Failed to match structured line '%s' to an unstructured line",
                        job.id, repr_str)
 
     return True
 
 
-def structured_iterator(failure_lines):
-    """Create FailureLine, Tbpl-formatted-string tuples."""
+def structured_summaries(failure_lines):
+    """
+    Create FailureLine, Tbpl-formatted-string tuples, skipping the lines
+    without a summary (such as those marking a truncated log).
+    """
     summary = partial(failure_line_summary, TbplFormatter())
-    for failure_line in failure_lines:
-        repr_str = summary(failure_line)
-        if repr_str:
-            yield failure_line, repr_str
-
-    while True:
-        yield None, None
+    return [(failure_line, repr_str)
+            for (failure_line, repr_str) in zip(failure_lines, map(summary, failure_lines))
+            if repr_str]
 
 
 def failure_line_summary(formatter, failure_line):
@@ -1,5 +1,7 @@
 import json
 import logging
+from contextlib import (ExitStack,
+                        contextmanager)
 from itertools import islice
 
 import newrelic.agent
@@ -13,33 +15,40 @@ from treeherder.etl.text import astral_filter
 from treeherder.model.models import (FailureLine,
                                      Group,
                                      JobLog)
-from treeherder.utils.http import fetch_text
+from treeherder.utils.http import (iter_lines,
+                                   spool_download)
 
 logger = logging.getLogger(__name__)
 
 
 def store_failure_lines(job_log):
-    log_iter = fetch_log(job_log)
-    if not log_iter:
-        return False
-    return write_failure_lines(job_log, log_iter)
+    with fetch_log(job_log) as log_iter:
+        if not log_iter:
+            return False
+        return write_failure_lines(job_log, log_iter)
 
 
+@contextmanager
 def fetch_log(job_log):
-    try:
-        log_text = fetch_text(job_log.url)
-    except HTTPError as e:
-        job_log.update_status(JobLog.FAILED)
-        if e.response is not None and e.response.status_code in (403, 404):
+    """
+    Provide an iterator over the parsed lines of the log, or None if the log
+    is empty or can't be retrieved.
+
+    The log is spooled to a temporary file, so only the lines actually used
+    are ever held in memory.
+    """
+    with ExitStack() as stack:
+        try:
+            log = stack.enter_context(spool_download(job_log.url))
+        except HTTPError as e:
+            job_log.update_status(JobLog.FAILED)
+            if e.response is None or e.response.status_code not in (403, 404):
+                raise
             logger.warning("Unable to retrieve log for %s: %s",
                            job_log.url, e)
-            return
-        raise
-
-    if not log_text:
-        return
+            log = None
 
-    return (json.loads(item) for item in log_text.splitlines())
+        yield (json.loads(item) for item in iter_lines(log)) if log else None
 
 
 def write_failure_lines(job_log, log_iter):
@@ -93,12 +102,25 @@ def get_kwargs(failure_line):
             if key in failure_line}
 
 
-def create_failure_line(job_log, failure_line):
-    fl = FailureLine.objects.create(repository=job_log.job.repository,
-                                    job_guid=job_log.job.guid,
-                                    job_log=job_log,
-                                    **get_kwargs(failure_line))
-    if "group" in failure_line:
+def create(job_log, log_list):
+    repository = job_log.job.repository
+    job_guid = job_log.job.guid
+    FailureLine.objects.bulk_create(
+        FailureLine(repository=repository,
+                    job_guid=job_guid,
+                    job_log=job_log,
+                    **get_kwargs(failure_line))
+        for failure_line in log_list)
+    # MySQL doesn't return the ids of bulk created rows, so fetch the lines again.
+    by_line = {fl.line: fl for fl in FailureLine.objects.filter(
+        job_log=job_log,
+        line__in=[failure_line["line"] for failure_line in log_list])}
+    failure_lines = [by_line[failure_line["line"]] for failure_line in log_list]
+
+    grouped = []
+    for fl, failure_line in zip(failure_lines, log_list):
+        if "group" not in failure_line:
+            continue
         # Omit the filename before storing.
         group_path = failure_line["group"].rsplit("/", 1)[0]
 
@@ -111,25 +133,43 @@ def create_failure_line(job_log, failure_line):
                  "group": failure_line["group"],
                  "group_path": group_path,
                  "length": len(group_path),
-                 "repository": fl.repository,
-                 "job_guid": fl.job_guid,
+                 "repository": repository,
+                 "job_guid": job_guid,
                  "failure_line_id": fl.id
                  })
 
         # Save the value regardless
-        group, _ = Group.objects.get_or_create(name=group_path[:255])
-        group.failure_lines.add(fl)
-
-    return fl
+        grouped.append((fl, group_path[:255]))
 
+    if grouped:
+        groups = get_or_create_groups({name for _, name in grouped})
+        Group.failure_lines.through.objects.bulk_create(
+            Group.failure_lines.through(group=groups[name], failureline=fl)
+            for fl, name in grouped)
 
-def create(job_log, log_list):
-    failure_lines = [create_failure_line(job_log, failure_line)
-                     for failure_line in log_list]
     job_log.update_status(JobLog.PARSED)
     return failure_lines
 
 
+def get_or_create_groups(names):
+    """Return a dict of the Groups with the given names, creating any that are missing."""
+    groups = Group.objects.filter(name__in=names).in_bulk(field_name="name")
+    missing = names - groups.keys()
+    if missing:
+        try:
+            with transaction.atomic():
+                Group.objects.bulk_create(Group(name=name) for name in missing)
+        except IntegrityError:
+            # Other tasks created some of the groups concurrently, or names
+            # match an existing group according to the database collation
+            # (e.g. differing in case), so go through them one at a time.
+            for name in missing:
+                groups[name], _ = Group.objects.get_or_create(name=name)
+        else:
+            groups.update(Group.objects.filter(name__in=missing).in_bulk(field_name="name"))
+    return groups
+
+
 def replace_astral(log_list):
     for item in log_list:
         for key in ["test", "subtest", "message", "stack", "stackwalk_stdout",
@@ -16,6 +16,13 @@ class ParserBase:
     Base class for all parsers.
 
     """
+    # Byte strings, at least one of which is in (the UTF-8 encoding of) every
+    # line ``wants_line`` returns True for, unless ``wants_every_line``. Lines
+    # with none of them are skipped without even being decoded.
+    wanted_terms = ()
+    # Whether the parser may want lines without any of the ``wanted_terms``.
+    wants_every_line = True
+
     def __init__(self, name):
         """Setup the artifact to hold the extracted data."""
         self.name = name
@@ -26,6 +33,15 @@ class ParserBase:
         self.artifact = []
         self.complete = False
 
+    def wants_line(self, line):
+        """
+        Cheap check for whether the parser could do anything with a line.
+
+        Lines for which this returns False are not passed to ``parse_line``,
+        so it must only return False for lines that ``parse_line`` ignores.
+        """
+        return True
+
     def parse_line(self, line, lineno):
         """Parse a single line of the log"""
         raise NotImplementedError  # pragma no cover
@@ -102,6 +118,18 @@ class StepParser(ParserBase):
         }
         self.sub_parser = ErrorParser()
         self.state = self.STATES['awaiting_first_step']
+        self.wanted_terms = (b'========= ',) + self.sub_parser.wanted_terms
+
+    @property
+    def wants_every_line(self):
+        return self.state != self.STATES['step_in_progress']
+
+    def wants_line(self, line):
+        # Outside of a step every line matters, since it may start one. Within
+        # a step, only step markers and lines that may be errors do.
+        if self.state != self.STATES['step_in_progress']:
+            return True
+        return line.startswith('========= ') or self.sub_parser.wants_line(line)
 
     def parse_line(self, line, lineno):
         """Parse a single line of the log.
@@ -257,6 +285,9 @@ class StepParser(ParserBase):
 
 class TinderboxPrintParser(ParserBase):
 
+    wanted_terms = (b'TinderboxPrint',)
+    wants_every_line = False
+
     RE_TINDERBOXPRINT = re.compile(r'.*TinderboxPrint: ?(?P<line>.*)$')
 
     RE_UPLOADED_TO = re.compile(
@@ -299,6 +330,9 @@ class TinderboxPrintParser(ParserBase):
         """Setup the artifact to hold the job details."""
         super().__init__("job_details")
 
+    def wants_line(self, line):
+        return 'TinderboxPrint' in line
+
     def parse_line(self, line, lineno):
         """Parse a single line of the log"""
         match = self.RE_TINDERBOXPRINT.match(line) if line else None
@@ -410,6 +444,40 @@ class ErrorParser(ParserBase):
 
     RE_ERR_1_MATCH = re.compile(r"^\d+:\d+:\d+ +(?:ERROR|CRITICAL|FATAL) - ")
 
+    # Short literal fragments of which at least one is present in every line
+    # matched by the expressions above or by ``IN_SEARCH_TERMS``. Few log
+    # lines contain any of them, and a handful of substring checks is much
+    # cheaper than running the expressions, so they act as a prefilter.
+    # Python's ``re`` tries each branch of an alternation at every offset,
+    # which makes a single combined expression slower than these checks.
+    CANDIDATE_TERMS = (
+        "rror",  # error, Error, ERROR, fatal error, Automation Error:, ...
+        "RROR",  # ERROR - , FATAL ERROR, REFTEST ERROR, ERROR 403:, ...
+        "UNEXPECTED",
+        "CRASH",
+        "Assertion",
+        "ABORT",
+        "GeckoLinker",
+        "Sanitizer",
+        "timed out",
+        "wget",
+        "FAILED",
+        "***",  # make: ***, mozmake.exe: ***, bash.exe: ***
+        "fork",
+        "CRITICAL",
+        "FATAL",
+        "xception",  # Exception:, :exception]
+        "remoteFailed",
+        "cannot",
+        "abort",
+        "exceeded",
+        "stop build",
+    )
+    # Like all of the above, these are ASCII, so they're in a line exactly
+    # when they're in its UTF-8 encoding.
+    wanted_terms = (b'[taskcluster ',) + tuple(term.encode('utf-8') for term in CANDIDATE_TERMS)
+    wants_every_line = False
+
     # Looks for a leading value inside square brackets containing a "YYYY-"
     # year pattern but isn't a TaskCluster error indicator (like
     # ``taskcluster:error``.
@@ -466,15 +534,37 @@ class ErrorParser(ParserBase):
         if line.startswith('[taskcluster '):
             self.is_taskcluster = True
 
+        if not self.has_candidate_term(line):
+            return
+
         # For performance reasons, only do this if we have identified as
         # a TC task.
         if self.is_taskcluster:
-            line = re.sub(self.RE_TASKCLUSTER_NORMAL_PREFIX, "", line)
+            line = self.RE_TASKCLUSTER_NORMAL_PREFIX.sub("", line)
 
-        if self.is_error_line(line):
+        if self._is_error_line(line):
             self.add(line, lineno)
 
+    def wants_line(self, line):
+        return line.startswith('[taskcluster ') or self.has_candidate_term(line)
+
+    def has_candidate_term(self, line):
+        """
+        Cheap check for whether a line could possibly be an error line.
+
+        Stripping prefixes only ever removes text, so a line without any
+        candidate term cannot match, whichever prefixes it carries.
+        """
+        for term in self.CANDIDATE_TERMS:
+            if term in line:
+                return True
+        return False
+
     def is_error_line(self, line):
+        return self.has_candidate_term(line) and self._is_error_line(line)
+
+    def _is_error_line(self, line):
+        """Same as `is_error_line`, for lines known to have a candidate term."""
         if self.RE_EXCLUDE_1_SEARCH.search(line):
             return False
 
@@ -482,7 +572,7 @@ class ErrorParser(ParserBase):
             return True
 
         # Remove mozharness prefixes prior to matching
-        trimline = re.sub(self.RE_MOZHARNESS_PREFIX, "", line).rstrip()
+        trimline = self.RE_MOZHARNESS_PREFIX.sub("", line).rstrip()
         if self.RE_EXCLUDE_2_SEARCH.search(trimline):
             return False
 
@@ -498,9 +588,15 @@ class PerformanceParser(ParserBase):
     # ^M character representation of the windows end of line.
     RE_PERFORMANCE = re.compile(r'.*?PERFHERDER_DATA:\s+({.*})')
 
+    wanted_terms = (b'PERFHERDER_DATA',)
+    wants_every_line = False
+
     def __init__(self):
         super().__init__("performance_data")
 
+    def wants_line(self, line):
+        return 'PERFHERDER_DATA' in line
+
     def parse_line(self, line, lineno):
         match = self.RE_PERFORMANCE.match(line)
         if match:
@@ -1,13 +1,11 @@
 import logging
 
 import newrelic.agent
-import simplejson as json
 from celery.exceptions import SoftTimeLimitExceeded
 from requests.exceptions import HTTPError
 
 from treeherder.autoclassify.tasks import autoclassify
-from treeherder.etl.artifact import (serialize_artifact_json_blobs,
-                                     store_job_artifacts)
+from treeherder.etl.artifact import store_job_artifacts
 from treeherder.log_parser.artifactbuildercollection import (ArtifactBuilderCollection,
                                                              LogSizeException)
 from treeherder.log_parser.crossreference import crossreference_job
@@ -136,8 +134,7 @@ def post_log_artifacts(job_log):
         raise
 
     try:
-        serialized_artifacts = serialize_artifact_json_blobs(artifact_list)
-        store_job_artifacts(serialized_artifacts)
+        store_job_artifacts(artifact_list)
         job_log.update_status(JobLog.PARSED)
         logger.debug("Stored artifact for %s %s", job_log.job.repository.name,
                      job_log.job.id)
@@ -159,7 +156,7 @@ def extract_text_log_artifacts(job_log):
             "job_guid": job_log.job.guid,
             "name": name,
             "type": 'json',
-            "blob": json.dumps(artifact)
+            "blob": artifact
         })
 
     return artifact_list
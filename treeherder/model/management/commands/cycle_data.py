@@ -7,7 +7,8 @@ from django.db.utils import OperationalError
 from treeherder.model.models import (Job,
                                      JobGroup,
                                      JobType,
-                                     Machine)
+                                     Machine,
+                                     reference_data_deleted)
 from treeherder.perf.models import PerformanceDatum
 
 logging.basicConfig(format='%(levelname)s:%(message)s')
@@ -57,6 +58,9 @@ class TreeherderCycler(DataCycler):
 
         def prune(id_name, model):
             self.logger.warning('Pruning {}s'.format(model.__name__))
+            # ingestion workers keep their own copies of reference data, make
+            # them drop those before finding the unused rows...
+            reference_data_deleted()
             used_ids = Job.objects.only(id_name).values_list(id_name, flat=True).distinct()
             unused_ids = model.objects.exclude(id__in=used_ids).values_list('id', flat=True)
 
@@ -65,7 +69,12 @@ class TreeherderCycler(DataCycler):
             while len(unused_ids):
                 delete_ids = unused_ids[:self.chunk_size]
                 self.logger.warning('deleting {} of {}'.format(len(delete_ids), len(unused_ids)))
-                model.objects.filter(id__in=delete_ids).delete()
+                try:
+                    model.objects.filter(id__in=delete_ids).delete()
+                finally:
+                    # ...and again once rows are gone, in case they were
+                    # cached in the meantime
+                    reference_data_deleted()
                 unused_ids = unused_ids[self.chunk_size:]
 
         prune('job_type_id', JobType)
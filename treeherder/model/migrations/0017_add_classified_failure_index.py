@@ -0,0 +1,32 @@
+# Generated by Django 3.0.2 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import treeherder.model.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0016_add_index_commit_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassifiedFailureIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('lookup_key', models.CharField(max_length=40)),
+                ('score', models.DecimalField(decimal_places=2, max_digits=3)),
+                ('classified_failure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_entries', to='model.ClassifiedFailure')),
+            ],
+            options={
+                'db_table': 'classified_failure_index',
+                'unique_together': {('lookup_key', 'classified_failure')},
+            },
+            managers=[
+                ('objects', treeherder.model.models.ClassifiedFailureIndexManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.0.2 on 2026-10-18 10:12
+import json
+from hashlib import sha1
+
+from django.db import migrations
+
+from treeherder.utils.queryset import chunked_qs
+
+
+# Copies of `classification_index_lookups` and `classification_index_key` as
+# they were when the index was added, which the models may not keep.
+def classification_index_lookups(failure_line):
+    if failure_line.action == 'test_result' and failure_line.message is not None:
+        return [{
+            'action': 'test_result',
+            'test': failure_line.test,
+            'subtest': failure_line.subtest,
+            'status': failure_line.status,
+            'expected': failure_line.expected,
+            'message': failure_line.message,
+        }]
+    if failure_line.action == 'crash' and failure_line.signature not in (None, 'None'):
+        return [
+            {'action': 'crash', 'signature': failure_line.signature, 'test': failure_line.test},
+            {'action': 'crash', 'signature': failure_line.signature},
+        ]
+    return []
+
+
+def classification_index_key(lookup):
+    return sha1(json.dumps(sorted(lookup.items())).encode('utf-8')).hexdigest()
+
+
+def index_matches(apps, schema_editor):
+    """
+    Index the matches made before the classified failure index existed, which
+    the autoclassify matchers now look classifications up in exclusively.
+    """
+    ClassifiedFailureIndex = apps.get_model('model', 'ClassifiedFailureIndex')
+    TextLogErrorMatch = apps.get_model('model', 'TextLogErrorMatch')
+
+    matches = (TextLogErrorMatch.objects
+               .exclude(score=None)
+               .exclude(text_log_error___metadata__failure_line=None)
+               # errors marked as not to be considered for autoclassification
+               .exclude(text_log_error___metadata__best_classification=None,
+                        text_log_error___metadata__best_is_verified=True)
+               .select_related('text_log_error___metadata__failure_line'))
+    for chunk in chunked_qs(matches, chunk_size=10000):
+        scores = {}
+        for match in chunk:
+            failure_line = match.text_log_error._metadata.failure_line
+            for lookup in classification_index_lookups(failure_line):
+                entry = (classification_index_key(lookup), match.classified_failure_id)
+                scores[entry] = max(scores.get(entry, match.score), match.score)
+        ClassifiedFailureIndex.objects.add_scores(scores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('model', '0017_add_classified_failure_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_matches, migrations.RunPython.noop),
+    ]
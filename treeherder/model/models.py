@@ -1,5 +1,6 @@
 import datetime
 import itertools
+import json
 import logging
 import re
 import time
@@ -10,7 +11,8 @@ from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MinLengthValidator
-from django.db import (models,
+from django.db import (connections,
+                       models,
                        transaction)
 from django.db.models import (Count,
                               Max,
@@ -20,6 +22,7 @@ from django.db.utils import ProgrammingError
 from django.forms import model_to_dict
 from django.utils import timezone
 
+from treeherder.utils.cache import bump_cache_version
 from treeherder.webapp.api.utils import (REPO_GROUPS,
                                          to_timestamp)
 
@@ -29,6 +32,14 @@ logger = logging.getLogger(__name__)
 # https://dev.mysql.com/doc/refman/5.7/en/fulltext-boolean.html
 mysql_fts_operators_re = re.compile(r'[-+@<>()~*"]')
 
+# changes whenever reference data (e.g. machines, job types) is deleted, so that
+# processes keeping their own copies of it (see `treeherder.etl.jobs`) know to drop them
+REFERENCE_DATA_VERSION_CACHE_KEY = 'reference-data-version'
+
+
+def reference_data_deleted():
+    bump_cache_version(REFERENCE_DATA_VERSION_CACHE_KEY)
+
 
 class FailuresQuerySet(models.QuerySet):
     def by_bug(self, bug_id):
@@ -446,19 +457,68 @@ class JobManager(models.Manager):
                 .only("guid")
                 .values_list("guid", flat=True)
             )
-            FailureLine.objects.filter(job_guid__in=delete_guid).only("id").delete()
+            failure_lines = FailureLine.objects.filter(job_guid__in=delete_guid)
+            # the fields the classification index is keyed by, to update it
+            # once the matches of these lines are gone
+            indexed_lines = list(failure_lines.filter(action__in=("test_result", "crash"))
+                                 .only("action", "test", "subtest", "status",
+                                       "expected", "message", "signature"))
+            failure_lines.only("id").delete()
 
             # cycle jobs *after* related data has been deleted, to be sure
             # we don't have any orphan data
             logger.warning("delete jobs")
             self.filter(id__lt=max_id).only("id").delete()
 
+            logger.warning("pruning the classification index")
+            ClassifiedFailureIndex.objects.prune(indexed_lines)
+
             jobs_cycled += max_chunk["count"]
 
             if sleep_time:
                 # Allow some time for other queries to get through
                 time.sleep(sleep_time)
 
+    def upsert(self, job, update_fields):
+        """
+        Saves the unsaved ``job`` with a single statement, which either inserts
+        it or, if there is a job with the same guid already, updates the
+        ``update_fields`` of that one instead. Returns the id of the job.
+
+        Just as for jobs being ingested, an existing job is left as it is once
+        completed, and isn't moved from running back to pending.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        fields = [field for field in job._meta.concrete_fields if not field.primary_key]
+        values = [field.get_db_prep_save(field.pre_save(job, True), connection)
+                  for field in fields]
+
+        keep_existing = "{state} = 'completed' OR ({state} = 'running' AND VALUES({state}) = 'pending')".format(
+            state=qn('state'))
+        # MySQL makes these assignments in order, and the others depend on the
+        # existing state, so that has to be assigned last
+        update_columns = sorted((job._meta.get_field(name).column for name in update_fields),
+                                key=lambda column: column == 'state')
+        assignments = ['{column} = IF({keep}, {column}, VALUES({column}))'.format(
+            column=qn(column), keep=keep_existing) for column in update_columns]
+
+        sql = ('INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+               # makes the id of an existing job available like that of a new one
+               'ON DUPLICATE KEY UPDATE {id} = LAST_INSERT_ID({id}), {assignments}').format(
+            table=qn(job._meta.db_table),
+            columns=', '.join(qn(field.column) for field in fields),
+            placeholders=', '.join(['%s'] * len(fields)),
+            id=qn(job._meta.pk.column),
+            assignments=', '.join(assignments))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            job.id = cursor.lastrowid
+
+        job._state.adding = False
+        job._state.db = self.db
+        return job.id
+
 
 class Job(models.Model):
     """
@@ -1168,6 +1228,7 @@ class ClassifiedFailure(models.Model):
         """
         match_ids_to_delete = list(self.update_matches(other))
         TextLogErrorMatch.objects.filter(id__in=match_ids_to_delete).delete()
+        ClassifiedFailureIndex.objects.replace(self, other)
 
         # Update best classifications
         self.best_for_errors.update(best_classification=other)
@@ -1285,12 +1346,13 @@ class TextLogError(models.Model):
         if classification is None:
             classification = ClassifiedFailure.objects.create()
 
-        TextLogErrorMatch.objects.create(
+        match = TextLogErrorMatch.objects.create(
             text_log_error=self,
             classified_failure=classification,
             matcher_name=matcher_name,
             score=1,
         )
+        ClassifiedFailureIndex.objects.add_matches([match])
 
     def verify_classification(self, classification):
         """
@@ -1302,6 +1364,9 @@ class TextLogError(models.Model):
         if classification not in self.classified_failures.all():
             self.create_match("ManualDetector", classification)
 
+        was_ignored = (self.metadata is not None and self.metadata.best_classification is None and
+                       self.metadata.best_is_verified)
+
         # create a TextLogErrorMetadata instance for this TextLogError if it
         # doesn't exist.  We can't use update_or_create here since OneToOne
         # relations don't use an object manager so a missing relation is simply
@@ -1315,6 +1380,11 @@ class TextLogError(models.Model):
             self.metadata.best_is_verified = True
             self.metadata.save(update_fields=['best_classification', 'best_is_verified'])
 
+        # The matches of ignored errors aren't indexed
+        failure_line = self.get_failure_line()
+        if failure_line and (classification is None) != was_ignored:
+            ClassifiedFailureIndex.objects.rebuild([failure_line])
+
         # Send event to NewRelic when a verifing an autoclassified failure.
         match = self.matches.filter(classified_failure=classification).first()
         if not match:
@@ -1394,3 +1464,146 @@ class TextLogErrorMatch(models.Model):
     def __str__(self):
         return "{0} {1}".format(
             self.text_log_error.id, self.classified_failure.id)
+
+
+def classification_index_lookups(failure_line):
+    """
+    Return the combinations of fields of a FailureLine by which the matchers
+    look up the classifications of earlier lines like it.
+    """
+    if failure_line.action == 'test_result' and failure_line.message is not None:
+        return [{
+            'action': 'test_result',
+            'test': failure_line.test,
+            'subtest': failure_line.subtest,
+            'status': failure_line.status,
+            'expected': failure_line.expected,
+            'message': failure_line.message,
+        }]
+    if failure_line.action == 'crash' and failure_line.signature not in (None, 'None'):
+        return [
+            {'action': 'crash', 'signature': failure_line.signature, 'test': failure_line.test},
+            {'action': 'crash', 'signature': failure_line.signature},
+        ]
+    return []
+
+
+def classification_index_key(lookup):
+    """Hash the given FailureLine fields into a ClassifiedFailureIndex lookup key."""
+    return sha1(json.dumps(sorted(lookup.items())).encode('utf-8')).hexdigest()
+
+
+class ClassifiedFailureIndexManager(models.Manager):
+    # the backfill of the index runs in a data migration
+    use_in_migrations = True
+
+    def add_matches(self, matches):
+        """
+        Record the scores of new TextLogErrorMatches against the keys of their
+        failure lines, keeping the best score for each classified failure.
+
+        This has to be called for every match created, which the matchers
+        otherwise won't find.
+        """
+        scores = {}
+        for match in matches:
+            metadata = match.text_log_error.metadata
+            if match.score is None or metadata is None or metadata.failure_line is None:
+                continue
+            if metadata.best_classification_id is None and metadata.best_is_verified:
+                # the error was marked as not to be considered for autoclassification
+                continue
+            for lookup in classification_index_lookups(metadata.failure_line):
+                entry = (classification_index_key(lookup), match.classified_failure_id)
+                scores[entry] = max(scores.get(entry, match.score), match.score)
+
+        self.add_scores(scores)
+
+    def add_scores(self, scores):
+        """Save the given {(key, classified failure id): score}, keeping any better existing scores."""
+        if not scores:
+            return
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        sql = ('INSERT INTO {table} ({key}, {classified_failure}, {score}) VALUES {values} '
+               'ON DUPLICATE KEY UPDATE {score} = GREATEST({score}, VALUES({score}))').format(
+            table=qn(self.model._meta.db_table),
+            key=qn('lookup_key'),
+            classified_failure=qn('classified_failure_id'),
+            score=qn('score'),
+            values=', '.join(['(%s, %s, %s)'] * len(scores)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for ((key, classified_failure_id), score) in scores.items()
+                                 for value in (key, classified_failure_id, score)])
+
+    def rebuild(self, failure_lines):
+        """
+        Recompute the entries of the keys of the given FailureLines from all
+        the TextLogErrorMatches of lines like them.
+        """
+        self._rebuild(self._lookups(failure_lines))
+
+    def prune(self, failure_lines):
+        """
+        Recompute the existing entries of the keys of the given FailureLines,
+        once (some of) the TextLogErrorMatches of those lines were deleted.
+        """
+        lookups = self._lookups(failure_lines)
+        indexed = set(self.filter(lookup_key__in=list(lookups))
+                          .values_list('lookup_key', flat=True)
+                          .distinct())
+        self._rebuild({key: lookup for (key, lookup) in lookups.items() if key in indexed})
+
+    def _lookups(self, failure_lines):
+        return {classification_index_key(lookup): lookup
+                for failure_line in failure_lines
+                for lookup in classification_index_lookups(failure_line)}
+
+    @transaction.atomic
+    def _rebuild(self, lookups):
+        for (key, lookup) in lookups.items():
+            scores = (TextLogErrorMatch.objects
+                      .filter(**{'text_log_error___metadata__failure_line__' + field: value
+                                 for field, value in lookup.items()})
+                      .exclude(text_log_error___metadata__best_classification=None,
+                               text_log_error___metadata__best_is_verified=True)
+                      .exclude(score=None)
+                      .values_list('classified_failure')
+                      .annotate(best_score=Max('score')))
+            self.filter(lookup_key=key).delete()
+            self.bulk_create(ClassifiedFailureIndex(lookup_key=key,
+                                                    classified_failure_id=classified_failure_id,
+                                                    score=score)
+                             for (classified_failure_id, score) in scores)
+
+    def replace(self, classified_failure, other):
+        """Merge the entries of a ClassifiedFailure into those of the other."""
+        entries = self.filter(classified_failure=classified_failure)
+        self.add_scores({(key, other.id): score for (key, score) in entries.values_list('lookup_key', 'score')})
+        entries.delete()
+
+
+class ClassifiedFailureIndex(models.Model):
+    """
+    The best score with which lines like a FailureLine have been matched to each
+    ClassifiedFailure, keyed by a hash of the fields the matchers compare.
+
+    This lets the matchers look up the classifications of a line directly,
+    rather than searching the TextLogErrorMatches of every similar line.
+    """
+    id = models.BigAutoField(primary_key=True)
+    lookup_key = models.CharField(max_length=40)
+    classified_failure = models.ForeignKey(ClassifiedFailure,
+                                           related_name="index_entries",
+                                           on_delete=models.CASCADE)
+    score = models.DecimalField(max_digits=3, decimal_places=2)
+
+    objects = ClassifiedFailureIndexManager()
+
+    class Meta:
+        db_table = 'classified_failure_index'
+        unique_together = ('lookup_key', 'classified_failure')
+
+    def __str__(self):
+        return "{0} {1} {2}".format(self.lookup_key, self.classified_failure_id, self.score)
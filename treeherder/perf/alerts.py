@@ -19,6 +19,7 @@ from treeherder.perf.models import (BackfillRecord,
                                     BackfillReport,
                                     PerformanceAlert,
                                     PerformanceAlertSummary,
+                                    PerformanceAnalysisState,
                                     PerformanceDatum,
                                     PerformanceSignature)
 from treeherder.perfalert.perfalert import (RevisionDatum,
@@ -56,17 +57,10 @@ def generate_new_alerts_in_series(signature):
         'summary__push__time').order_by(
         '-summary__push__time').values_list(
         'summary__push__time', flat=True)[:1]
+    latest_alert_timestamp = latest_alert_timestamp[0] if latest_alert_timestamp else None
     if latest_alert_timestamp:
         series = series.filter(
-            push_timestamp__gt=latest_alert_timestamp[0])
-
-    revision_data = {}
-    for d in series:
-        if not revision_data.get(d.push_id):
-            revision_data[d.push_id] = RevisionDatum(
-                int(time.mktime(d.push_timestamp.timetuple())),
-                d.push_id, [])
-        revision_data[d.push_id].values.append(d.value)
+            push_timestamp__gt=latest_alert_timestamp)
 
     min_back_window = signature.min_back_window
     if min_back_window is None:
@@ -81,10 +75,41 @@ def generate_new_alerts_in_series(signature):
     if alert_threshold is None:
         alert_threshold = settings.PERFHERDER_REGRESSION_THRESHOLD
 
-    analyzed_series = detect_changes(revision_data.values(),
+    # only the tail of the series needs analyzing if we can resume from
+    # where the previous analysis left off
+    state = _get_resumable_analysis_state(signature, series, max_alert_age,
+                                          latest_alert_timestamp,
+                                          min_back_window, max_back_window,
+                                          fore_window)
+    if state:
+        analyzed_revisions = [
+            _revision_from_json(revision) for revision in json.loads(state.back_window)]
+        last_seen_regression = state.last_seen_regression
+        last_datum_id = state.last_datum_id
+        series = series.filter(push_timestamp__gte=state.tail_push_timestamp)
+    else:
+        analyzed_revisions = []
+        last_seen_regression = 0
+        last_datum_id = 0
+
+    revision_data = {}
+    push_timestamps = {}
+    for (datum_id, push_id, push_timestamp, value) in series.values_list(
+            'id', 'push_id', 'push_timestamp', 'value'):
+        if not revision_data.get(push_id):
+            revision_data[push_id] = RevisionDatum(
+                int(time.mktime(push_timestamp.timetuple())),
+                push_id, [])
+            push_timestamps[push_id] = push_timestamp
+        revision_data[push_id].values.append(value)
+        last_datum_id = max(last_datum_id, datum_id)
+
+    analyzed_series = detect_changes(analyzed_revisions + list(revision_data.values()),
                                      min_back_window=min_back_window,
                                      max_back_window=max_back_window,
-                                     fore_window=fore_window)
+                                     fore_window=fore_window,
+                                     resume_from=len(analyzed_revisions),
+                                     last_seen_regression=last_seen_regression)
 
     with transaction.atomic():
         for (prev, cur) in zip(analyzed_series, analyzed_series[1:]):
@@ -132,6 +157,95 @@ def generate_new_alerts_in_series(signature):
                         't_value': t_value
                     })
 
+        _store_analysis_state(signature, analyzed_series, push_timestamps,
+                              resume_from=max(len(analyzed_revisions), 1),
+                              latest_alert_timestamp=latest_alert_timestamp,
+                              last_datum_id=last_datum_id,
+                              min_back_window=min_back_window,
+                              max_back_window=max_back_window,
+                              fore_window=fore_window)
+
+
+def _get_resumable_analysis_state(signature, series, max_alert_age,
+                                  latest_alert_timestamp, min_back_window,
+                                  max_back_window, fore_window):
+    '''
+    Returns the stored analysis state of the series, if it still describes it
+    '''
+    state = PerformanceAnalysisState.objects.filter(signature=signature).first()
+    if state is None:
+        return None
+
+    if (state.latest_alert_timestamp != latest_alert_timestamp or
+            state.tail_push_timestamp < max_alert_age or
+            (state.min_back_window, state.max_back_window, state.fore_window) !=
+            (min_back_window, max_back_window, fore_window)):
+        return None
+
+    # new data for pushes before the tail (e.g. backfills or retriggers of
+    # older pushes) changes results we considered final
+    if series.filter(id__gt=state.last_datum_id,
+                     push_timestamp__lt=state.tail_push_timestamp).exists():
+        return None
+
+    return state
+
+
+def _store_analysis_state(signature, analyzed_series, push_timestamps,
+                          resume_from, latest_alert_timestamp, last_datum_id,
+                          min_back_window, max_back_window, fore_window):
+    '''
+    Remembers where the analysis of the series can be resumed from
+
+    A revision's t-value is final once its fore window is complete, and
+    whether it's a change point is final once its successor's t-value is.
+    Everything from the first revision which isn't final onward (the tail)
+    gets analyzed again next time.
+    '''
+    if len(analyzed_series) <= resume_from:
+        PerformanceAnalysisState.objects.filter(signature=signature).delete()
+        return
+
+    incomplete = next((i for i in range(resume_from, len(analyzed_series))
+                       if analyzed_series[i].amount_next_data < fore_window),
+                      len(analyzed_series))
+    tail_start = max(incomplete - 1, resume_from)
+    # the tail is fetched by push timestamp, so it mustn't split revisions
+    # with the same timestamp
+    while (tail_start > resume_from and
+           analyzed_series[tail_start - 1].push_timestamp == analyzed_series[tail_start].push_timestamp):
+        tail_start -= 1
+    if analyzed_series[tail_start - 1].push_timestamp == analyzed_series[tail_start].push_timestamp:
+        PerformanceAnalysisState.objects.filter(signature=signature).delete()
+        return
+
+    back_window = analyzed_series[max(tail_start - max_back_window, 0):tail_start]
+    PerformanceAnalysisState.objects.update_or_create(
+        signature=signature,
+        defaults={
+            'latest_alert_timestamp': latest_alert_timestamp,
+            'min_back_window': min_back_window,
+            'max_back_window': max_back_window,
+            'fore_window': fore_window,
+            'last_datum_id': last_datum_id,
+            'tail_push_timestamp': min(push_timestamps[revision.push_id]
+                                       for revision in analyzed_series[tail_start:]),
+            'last_seen_regression': analyzed_series[tail_start].last_seen_regression,
+            'back_window': json.dumps([_revision_to_json(revision)
+                                       for revision in back_window])
+        })
+
+
+def _revision_to_json(revision):
+    return [revision.push_timestamp, revision.push_id, revision.t, revision.values]
+
+
+def _revision_from_json(revision_json):
+    (push_timestamp, push_id, t, values) = revision_json
+    revision = RevisionDatum(push_timestamp, push_id, values)
+    revision.t = t
+    return revision
+
 
 class AlertsPicker:
     '''
@@ -5,7 +5,8 @@ from django.db import (connection,
 
 from treeherder.perf.models import (PerformanceAlert,
                                     PerformanceDatum,
-                                    PerformanceSignature)
+                                    PerformanceSignature,
+                                    signatures_deleted)
 
 RAPTOR_TP6_SUBTESTS = 'raptor-tp6-subtests'
 USE_CASES = [RAPTOR_TP6_SUBTESTS]
@@ -126,6 +127,7 @@ class Command(BaseCommand):
 
     def remove_signatures(self, signatures):
         PerformanceSignature.objects.filter(id__in=signatures).delete()
+        signatures_deleted()
 
     def reassign(self, signature_pairs):
         with transaction.atomic():
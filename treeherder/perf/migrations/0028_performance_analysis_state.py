@@ -0,0 +1,32 @@
+# Generated by Django 3.0.3 on 2020-03-23 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('perf', '0027_support_perfherder_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceAnalysisState',
+            fields=[
+                ('signature', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis_state', serialize=False, to='perf.PerformanceSignature')),
+                ('latest_alert_timestamp', models.DateTimeField(null=True)),
+                ('min_back_window', models.IntegerField()),
+                ('max_back_window', models.IntegerField()),
+                ('fore_window', models.IntegerField()),
+                ('last_datum_id', models.BigIntegerField()),
+                ('tail_push_timestamp', models.DateTimeField()),
+                ('last_seen_regression', models.IntegerField()),
+                ('back_window', models.TextField()),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'performance_analysis_state',
+            },
+        ),
+    ]
@@ -13,9 +13,18 @@ from treeherder.model.models import (Job,
                                      Repository)
 from treeherder.perf.exceptions import (MaxRuntimeExceeded,
                                         NoDataCyclingAtAll)
+from treeherder.utils.cache import bump_cache_version
 
 SIGNATURE_HASH_LENGTH = 40
 
+# changes whenever signatures are deleted or modified, so that processes keeping
+# their own copies of signatures (see `treeherder.etl.perf`) know to drop them
+SIGNATURES_VERSION_CACHE_KEY = 'perf-signatures-version'
+
+
+def signatures_deleted():
+    bump_cache_version(SIGNATURES_VERSION_CACHE_KEY)
+
 
 class PerformanceFramework(models.Model):
     name = models.SlugField(max_length=255, unique=True)
@@ -149,13 +158,16 @@ into chunks of chunk_size size."""
             # also remove any signatures which are (no longer) associated with
             # a job
             logger.warning('Removing performance signatures with missing jobs...')
-            for signature in PerformanceSignature.objects.all():
-                self._maybe_quit(started_at, max_overall_runtime)
-
-                if not self.filter(
-                        repository_id=signature.repository_id,  # leverages (repository, signature) compound index
-                        signature_id=signature.id).exists():
-                    signature.delete()
+            try:
+                for signature in PerformanceSignature.objects.all():
+                    self._maybe_quit(started_at, max_overall_runtime)
+
+                    if not self.filter(
+                            repository_id=signature.repository_id,  # leverages (repository, signature) compound index
+                            signature_id=signature.id).exists():
+                        signature.delete()
+            finally:
+                signatures_deleted()
         except NoDataCyclingAtAll as ex:
             logger.warning('Exception: {}'.format(ex))
         except MaxRuntimeExceeded as ex:
@@ -245,6 +257,48 @@ class PerformanceDatum(models.Model):
         return "{} {}".format(self.value, self.push_timestamp)
 
 
+class PerformanceAnalysisState(models.Model):
+    '''
+    Resumable alert analysis of a performance series
+
+    Keeps what the change detection needs to pick up where it left off, so
+    that new datums only require analyzing the tail of the series instead of
+    all of it. Any change the stored state cannot account for (a new alert,
+    different alert windows or data arriving for older pushes) simply causes
+    a full analysis and a fresh state.
+    '''
+    signature = models.OneToOneField(PerformanceSignature,
+                                     on_delete=models.CASCADE,
+                                     primary_key=True,
+                                     related_name='analysis_state')
+
+    # series is analyzed from after the push of the latest alert
+    latest_alert_timestamp = models.DateTimeField(null=True)
+    min_back_window = models.IntegerField()
+    max_back_window = models.IntegerField()
+    fore_window = models.IntegerField()
+
+    # highest datum id accounted for by this state
+    last_datum_id = models.BigIntegerField()
+
+    # revisions from this push timestamp onward still need to be analyzed
+    tail_push_timestamp = models.DateTimeField()
+    last_seen_regression = models.IntegerField()
+
+    # the analyzed revisions right before the tail, as a JSON list
+    # of [push_timestamp, push_id, t, values]
+    back_window = models.TextField()
+
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "performance_analysis_state"
+
+    def __str__(self):
+        return "PerformanceAnalysisState(signature #{}, tail from {})".format(
+            self.signature_id, self.tail_push_timestamp)
+
+
 class IssueTracker(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, blank=False)
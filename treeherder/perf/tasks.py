@@ -1,12 +1,38 @@
 import newrelic.agent
+from django.conf import settings
+from django.core.cache import cache
 
 from treeherder.perf.alerts import generate_new_alerts_in_series
 from treeherder.perf.models import PerformanceSignature
 from treeherder.workers.task import retryable_task
 
+# safety net in case a scheduled task never runs (e.g. lost worker), after
+# which new datums may schedule alert generation again
+ALERT_SCHEDULING_TIMEOUT = 60 * 60
+
+
+def _pending_alerts_cache_key(signature_id):
+    return 'perf-alerts-pending-{}'.format(signature_id)
+
+
+def schedule_alert_generation(signature_id):
+    """
+    Schedules alert generation for a signature which received new data
+
+    Only one task per signature is pending at any time; new data arriving
+    before it runs is picked up by that same task.
+    """
+    if cache.add(_pending_alerts_cache_key(signature_id), True, ALERT_SCHEDULING_TIMEOUT):
+        generate_alerts.apply_async(
+            args=[signature_id],
+            queue='generate_perf_alerts',
+            countdown=settings.PERFHERDER_ALERTS_SCHEDULING_DELAY.total_seconds())
+
 
 @retryable_task(name='generate-alerts', max_retries=10)
 def generate_alerts(signature_id):
     newrelic.agent.add_custom_parameter("signature_id", str(signature_id))
+    # data arriving from now on needs another analysis
+    cache.delete(_pending_alerts_cache_key(signature_id))
     signature = PerformanceSignature.objects.get(id=signature_id)
     generate_new_alerts_in_series(signature)
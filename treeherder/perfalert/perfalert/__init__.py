@@ -1,3 +1,4 @@
+import bisect
 import copy
 import functools
 
@@ -110,42 +111,187 @@ class RevisionDatum:
                                            self.t, self.change_detected)
 
 
+class RevisionSeries:
+    '''
+    Flattened view of a sorted list of revisions
+
+    The values of revision `i` are `values[offsets[i]:offsets[i+1]]`, so the
+    extent of a window of revisions can be found by bisecting the offsets and
+    its (weighted) average and variance computed in constant time from
+    running totals, instead of rebuilding the window as a list of
+    `RevisionDatum`.
+
+    The running totals are taken over the values scaled to exact integers, so
+    subtracting them never loses precision to cancellation, however large the
+    values are compared to their noise.
+    '''
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+        self.num_revisions = len(offsets) - 1
+
+        # every float is an integer multiple of a power of two: scale all the
+        # values by the smallest one that makes each of them an integer
+        ratios = [float(value).as_integer_ratio() for value in values]
+        self.scale = max((denominator.bit_length() - 1
+                          for (_, denominator) in ratios), default=0)
+
+        self.sums = [0]
+        self.squares = [0]
+        total = 0
+        squares = 0
+        for (numerator, denominator) in ratios:
+            scaled = numerator << (self.scale - denominator.bit_length() + 1)
+            total += scaled
+            squares += scaled * scaled
+            self.sums.append(total)
+            self.squares.append(squares)
+
+        # totals of the revision sums and counts, plain and multiplied by the
+        # revision index, from which the linear weighting of a window follows
+        self.revision_sums = [0]
+        self.index_sums = [0]
+        self.index_counts = [0]
+        for j in range(self.num_revisions):
+            revision_sum = self.sums[offsets[j+1]] - self.sums[offsets[j]]
+            self.revision_sums.append(self.revision_sums[-1] + revision_sum)
+            self.index_sums.append(self.index_sums[-1] + j * revision_sum)
+            self.index_counts.append(self.index_counts[-1] +
+                                     j * (offsets[j+1] - offsets[j]))
+
+    @classmethod
+    def from_revision_data(cls, revision_data):
+        values = []
+        offsets = [0]
+        for datum in revision_data:
+            values.extend(datum.values)
+            offsets.append(len(values))
+        return cls(values, offsets)
+
+    def count(self, start, end):
+        return self.offsets[end] - self.offsets[start]
+
+    def back_window_start(self, i, max_values, max_revisions):
+        '''
+        First revision of the window ending just before revision `i`, taking
+        revisions backwards until we have `max_values` values or
+        `max_revisions` revisions, whichever comes first
+        '''
+        start = bisect.bisect_right(self.offsets, self.offsets[i] - max_values) - 1
+        return min(max(start, i - max_revisions, 0), i)
+
+    def fore_window_end(self, i, min_values):
+        '''
+        End (exclusive) of the window starting at revision `i`, taking
+        revisions forwards until we have at least `min_values` values
+        '''
+        end = bisect.bisect_left(self.offsets, self.offsets[i] + min_values)
+        return max(min(end, self.num_revisions), i)
+
+    def stats(self, start, end, weighting=None):
+        '''
+        Same result as `analyze()` over revisions `start` to `end` (exclusive),
+        up to the rounding of the result.
+
+        `weighting` is None for uniform weights, or 'back' / 'fore' to apply
+        `linear_weights` falling off from the end / start of the window
+        respectively, like `calc_t` does for the back and fore windows.
+        '''
+        if end <= start:
+            return {"avg": 0.0, "n": 0, "variance": 0.0}
+
+        first = self.offsets[start]
+        last = self.offsets[end]
+        n = last - first
+        total = self.sums[last] - self.sums[first]
+        squares = self.squares[last] - self.squares[first]
+
+        # the weighted average is weighted_sum / sum_of_weights, both kept as
+        # integers: the linear weights (m - k) / m of the k-th revision of an
+        # m revision window are scaled by m, which cancels out
+        if weighting is None:
+            weighted_sum = total
+            sum_of_weights = n
+        else:
+            revisions_total = self.revision_sums[end] - self.revision_sums[start]
+            index_total = self.index_sums[end] - self.index_sums[start]
+            index_count = self.index_counts[end] - self.index_counts[start]
+            if weighting == 'back':
+                # weight j - start + 1 for revision j, nearest revision first
+                weighted_sum = index_total - (start - 1) * revisions_total
+                sum_of_weights = index_count - (start - 1) * n
+            else:
+                # weight end - j for revision j
+                weighted_sum = end * revisions_total - index_total
+                sum_of_weights = end * n - index_count
+        avg = weighted_sum / (sum_of_weights << self.scale)
+
+        if n > 1:
+            # sum((d - avg) ** 2) multiplied by sum_of_weights ** 2
+            spread = (squares * sum_of_weights * sum_of_weights -
+                      2 * weighted_sum * sum_of_weights * total +
+                      n * weighted_sum * weighted_sum)
+            variance = spread / ((sum_of_weights * sum_of_weights * (n - 1))
+                                 << (2 * self.scale))
+        else:
+            variance = 0.0
+
+        return {"avg": avg, "n": n, "variance": variance}
+
+    def calc_t(self, back_start, i, fore_end):
+        '''
+        Same result as `calc_t(back, fore, linear_weights)`, where back are
+        the revisions `back_start` up to `i` (nearest first) and fore the
+        revisions `i` up to `fore_end`
+        '''
+        if back_start == i or fore_end == i:
+            return 0
+
+        s1 = self.stats(back_start, i, 'back')
+        s2 = self.stats(i, fore_end, 'fore')
+        delta_s = s2['avg'] - s1['avg']
+
+        if delta_s == 0:
+            return 0
+        if s1['variance'] == 0 and s2['variance'] == 0:
+            return float('inf')
+
+        return delta_s / (((s1['variance'] / s1['n']) + (s2['variance'] / s2['n'])) ** 0.5)
+
+
 def detect_changes(data, min_back_window=12, max_back_window=24,
-                   fore_window=12, t_threshold=7):
+                   fore_window=12, t_threshold=7, resume_from=1,
+                   last_seen_regression=0):
     # Use T-Tests
     # Analyze test data using T-Tests, comparing data[i-j:i] to data[i:i+k]
+    #
+    # `resume_from` allows continuing a previous analysis: the revisions
+    # before it (once sorted) are only used as history and are expected to
+    # already have their t-value, while `last_seen_regression` is the value
+    # it had when the previous analysis reached that revision
     data = sorted(data)
+    series = RevisionSeries.from_revision_data(data)
+    resume_from = max(resume_from, 1)
 
-    last_seen_regression = 0
-    for i in range(1, len(data)):
+    for i in range(resume_from, len(data)):
         di = data[i]
+        di.last_seen_regression = last_seen_regression
 
         # keep on getting previous data until we've either got at least 12
         # data points *or* we've hit the maximum back window
-        jw = []
-        di.amount_prev_data = 0
-        prev_indice = i - 1
-        while di.amount_prev_data < max_back_window and prev_indice >= 0 and (
-                (i - prev_indice) <= min(max(last_seen_regression,
-                                             min_back_window),
-                                         max_back_window)):
-            jw.append(data[prev_indice])
-            di.amount_prev_data += len(jw[-1].values)
-            prev_indice -= 1
+        back_start = series.back_window_start(
+            i, max_back_window, min(max(last_seen_regression, min_back_window),
+                                    max_back_window))
+        di.amount_prev_data = series.count(back_start, i)
 
         # accumulate present + future data until we've got at least 12 values
-        kw = []
-        di.amount_next_data = 0
-        next_indice = i
-        while di.amount_next_data < fore_window and next_indice < len(data):
-            kw.append(data[next_indice])
-            di.amount_next_data += len(kw[-1].values)
-            next_indice += 1
-
-        di.historical_stats = analyze(jw)
-        di.forward_stats = analyze(kw)
-
-        di.t = abs(calc_t(jw, kw, linear_weights))
+        fore_end = series.fore_window_end(i, fore_window)
+        di.amount_next_data = series.count(i, fore_end)
+
+        di.historical_stats = series.stats(back_start, i)
+        di.forward_stats = series.stats(i, fore_end)
+
+        di.t = abs(series.calc_t(back_start, i, fore_end))
         # add additional historical data points next time if we
         # haven't detected a likely regression
         if di.t > t_threshold:
@@ -155,7 +301,7 @@ def detect_changes(data, min_back_window=12, max_back_window=24,
 
     # Now that the t-test scores are calculated, go back through the data to
     # find where changes most likely happened.
-    for i in range(1, len(data)):
+    for i in range(resume_from, len(data)):
         di = data[i]
 
         # if we don't have enough data yet, skip for now (until more comes
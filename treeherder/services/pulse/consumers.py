@@ -1,5 +1,6 @@
 import logging
 import threading
+import time
 
 import environ
 import newrelic.agent
@@ -9,7 +10,8 @@ from kombu import (Connection,
 from kombu.mixins import ConsumerMixin
 
 from treeherder.etl.tasks.pulse_tasks import (store_pulse_pushes,
-                                              store_pulse_tasks)
+                                              store_pulse_tasks,
+                                              store_pulse_tasks_batch)
 from treeherder.utils.http import fetch_json
 
 from .exchange import get_exchange
@@ -147,20 +149,59 @@ class PulseConsumer(ConsumerMixin):
 
 class TaskConsumer(PulseConsumer):
     queue_suffix = env("PULSE_TASKS_QUEUE_NAME", default="tasks")
+    # Messages are queued for storing in batches of up to this many, each
+    # waiting at most this long for more messages. Batches of one message
+    # are stored by ``store_pulse_tasks`` itself.
+    batch_size = env.int("PULSE_TASKS_BATCH_SIZE", default=1)
+    batch_wait_ms = env.int("PULSE_TASKS_BATCH_WAIT_MS", default=500)
+
+    def __init__(self, source, build_routing_key):
+        super().__init__(source, build_routing_key)
+        self.batch = []
+        self.batch_started = None
 
     def bindings(self):
         return TASKCLUSTER_TASK_BINDINGS
 
+    def run(self, _tokens=1, **kwargs):
+        if self.batch_size > 1:
+            # wake up often enough to queue batches which have waited long enough
+            kwargs.setdefault('safety_interval', min(1, self.batch_wait_ms / 1000))
+        super().run(_tokens, **kwargs)
+
     @newrelic.agent.background_task(name='pulse-listener-tasks.on_message', group='Pulse Listener')
     def on_message(self, body, message):
         exchange = message.delivery_info['exchange']
         routing_key = message.delivery_info['routing_key']
         logger.debug('received job message from %s#%s', exchange, routing_key)
-        store_pulse_tasks.apply_async(
-            args=[body, exchange, routing_key, self.root_url],
+        if self.batch_size <= 1:
+            store_pulse_tasks.apply_async(
+                args=[body, exchange, routing_key, self.root_url],
+                queue='store_pulse_tasks'
+            )
+            message.ack()
+            return
+
+        if not self.batch:
+            self.batch_started = time.monotonic()
+        self.batch.append((body, exchange, routing_key, message))
+        if len(self.batch) >= self.batch_size:
+            self.queue_batch()
+
+    def on_iteration(self):
+        if self.batch and time.monotonic() - self.batch_started >= self.batch_wait_ms / 1000:
+            self.queue_batch()
+
+    def queue_batch(self):
+        batch, self.batch = self.batch, []
+        store_pulse_tasks_batch.apply_async(
+            args=[[(body, exchange, routing_key) for (body, exchange, routing_key, _) in batch],
+                  self.root_url],
             queue='store_pulse_tasks'
         )
-        message.ack()
+        # only acknowledged once queued, so that they're redelivered if we stop before
+        for (_, _, _, message) in batch:
+            message.ack()
 
 
 class PushConsumer(PulseConsumer):
@@ -1,4 +1,5 @@
 import logging
+import time
 from collections import defaultdict
 from datetime import timedelta
 
@@ -18,6 +19,9 @@ from treeherder.seta.update_job_priority import update_job_priority_table
 
 logger = logging.getLogger(__name__)
 
+# The number of job notes read at a time by get_failures_fixed_by_commit
+FIXED_BY_COMMIT_CHUNK_SIZE = 10000
+
 
 class AnalyzeFailures:
     def __init__(self, **options):
@@ -71,70 +75,102 @@ def get_failures_fixed_by_commit():
             job__signature__build_platform__in=SETA_UNSUPPORTED_PLATFORMS
         ).exclude(
             text=""
-        ).select_related('job', 'job__signature', 'job__job_type')
-
-    # check if at least one fixed by commit job meets our requirements without populating queryset
-    if not fixed_by_commit_data_set.exists():
-        logger.warning("We couldn't find any fixed-by-commit jobs")
-        return failures
+        ).order_by('id').values_list(
+            'id',
+            'text',
+            'job__signature__build_system_type',  # e.g. taskcluster
+            'job__job_type__name',  # e.g. Mochitest
+            'job__signature__name',  # buildername or task label
+            'job__option_collection_hash',
+            'job__signature__build_platform',
+        )
+
+    # The same few thousand jobtypes get starred over and over, so only parse each once
+    testtypes = {}
+    query_time = parse_time = 0
+    job_notes = 0
+    last_id = 0
+    while True:
+        start = time.time()
+        # process the fixed by commit jobs in id ordered chunks, to keep memory use flat
+        chunk = list(fixed_by_commit_data_set.filter(id__gt=last_id)[:FIXED_BY_COMMIT_CHUNK_SIZE])
+        query_time += time.time() - start
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        job_notes += len(chunk)
+
+        start = time.time()
+        for (_, text, build_system_type, job_type_name, ref_data_name,
+             option_collection_hash, build_platform) in chunk:
+            # if we have http://hg.mozilla.org/rev/<rev> and <rev>, we will only use <rev>
+            revision_id = text.strip('/')
+            revision_id = revision_id.split('/')[-1]
+
+            # This prevents the empty string case and ignores bug ids
+            if not revision_id or len(revision_id) < 12:
+                continue
 
-    # now process the fixed by commit jobs in batches using django's queryset iterator
-    for job_note in fixed_by_commit_data_set.iterator():
-        # if we have http://hg.mozilla.org/rev/<rev> and <rev>, we will only use <rev>
-        revision_id = job_note.text.strip('/')
-        revision_id = revision_id.split('/')[-1]
-
-        # This prevents the empty string case and ignores bug ids
-        if not revision_id or len(revision_id) < 12:
-            continue
-
-        # We currently don't guarantee that text is actually a revision
-        # Even if not perfect the main idea is that a bunch of jobs were annotated with
-        # a unique identifier. The assumption is that the text is unique
-        #
-        # I've seen these values being used:
-        #  * 12 char revision
-        #  * 40 char revision
-        #  * link to revision on hg
-        #  * revisionA & revisionB
-        #  * should be fixed by <revision>
-        #  * bug id
-        #
-        # Note that if some jobs are annotated with the 12char revision and others with the
-        # 40char revision we will have two disjunct set of failures
-        #
-        # Some of this will be improved in https://bugzilla.mozilla.org/show_bug.cgi?id=1323536
-
-        try:
-            # check if jobtype is supported by SETA (see treeherder/seta/settings.py)
-            if job_note.job.signature.build_system_type != 'buildbot':
-                if not job_note.job.job_type.name.startswith(tuple(SETA_SUPPORTED_TC_JOBTYPES)):
-                    continue
-
-            testtype = parse_testtype(
-                build_system_type=job_note.job.signature.build_system_type,  # e.g. taskcluster
-                job_type_name=job_note.job.job_type.name,  # e.g. Mochitest
-                platform_option=job_note.job.get_platform_option(option_collection_map),  # e.g. 'opt'
-                ref_data_name=job_note.job.signature.name,  # buildername or task label
-            )
-
-            if testtype:
-                if is_job_blacklisted(testtype):
-                    continue
-            else:
-                logger.warning('We were unable to parse %s/%s',
-                               job_note.job.job_type.name, job_note.job.signature.name)
+            # We currently don't guarantee that text is actually a revision
+            # Even if not perfect the main idea is that a bunch of jobs were annotated with
+            # a unique identifier. The assumption is that the text is unique
+            #
+            # I've seen these values being used:
+            #  * 12 char revision
+            #  * 40 char revision
+            #  * link to revision on hg
+            #  * revisionA & revisionB
+            #  * should be fixed by <revision>
+            #  * bug id
+            #
+            # Note that if some jobs are annotated with the 12char revision and others with the
+            # 40char revision we will have two disjunct set of failures
+            #
+            # Some of this will be improved in https://bugzilla.mozilla.org/show_bug.cgi?id=1323536
+
+            key = (build_system_type, job_type_name, ref_data_name)
+            if key not in testtypes:
+                testtypes[key] = get_seta_testtype(*key)
+            testtype = testtypes[key]
+            if not testtype:
                 continue
 
             # we now have a legit fixed-by-commit job failure
+            platform_option = option_collection_map.get(option_collection_hash) if option_collection_hash else ''
             failures[revision_id].append(unique_key(
                 testtype=testtype,
-                buildtype=job_note.job.get_platform_option(option_collection_map),  # e.g. 'opt'
-                platform=job_note.job.signature.build_platform
+                buildtype=platform_option,  # e.g. 'opt'
+                platform=build_platform
             ))
-        except models.Job.DoesNotExist:
-            logger.warning('job_note %s has no job associated to it', job_note.id)
-            continue
+        parse_time += time.time() - start
 
+    if not job_notes:
+        logger.warning("We couldn't find any fixed-by-commit jobs")
+        return failures
+
+    logger.info("Read %s fixed_by_commit job notes of %s jobtypes in %.1fs, and processed them in %.1fs",
+                job_notes, len(testtypes), query_time, parse_time)
     logger.warning("Number of fixed_by_commit revisions: %s", len(failures))
     return failures
+
+
+def get_seta_testtype(build_system_type, job_type_name, ref_data_name):
+    """Return the testtype of a job, or None if the job is not supported by SETA"""
+    # check if jobtype is supported by SETA (see treeherder/seta/settings.py)
+    if build_system_type != 'buildbot':
+        if not job_type_name.startswith(tuple(SETA_SUPPORTED_TC_JOBTYPES)):
+            return None
+
+    testtype = parse_testtype(
+        build_system_type=build_system_type,
+        job_type_name=job_type_name,
+        platform_option=None,  # unused when parsing the testtype
+        ref_data_name=ref_data_name,
+    )
+
+    if not testtype:
+        logger.warning('We were unable to parse %s/%s', job_type_name, ref_data_name)
+        return None
+    if is_job_blacklisted(testtype):
+        return None
+    return testtype
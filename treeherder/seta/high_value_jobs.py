@@ -1,32 +1,21 @@
 import logging
+from collections import defaultdict
 
 from treeherder.etl.seta import job_priorities_to_jobtypes
 
 logger = logging.getLogger(__name__)
 
 
-def is_matched(failure, removals):
-    found = False
-    if failure in removals:
-        found = True
-
-    return found
-
-
 def check_removal(failures, removals):
+    """Return the failures which are still caught by a job which isn't in removals"""
+    removals = set(removals)
     results = {}
     for failure in failures:
-        results[failure] = []
-        for failure_job in failures[failure]:
-            found = is_matched(failure_job, removals)
-
-            # we will add the test to the resulting structure unless we find a match
-            # in the jobtype we are trying to ignore.
-            if not found:
-                results[failure].append(failure_job)
-
-        if not results[failure]:
-            del results[failure]
+        # we will keep the jobs of a failure unless they are a jobtype we are trying to ignore.
+        remaining_jobs = [failure_job for failure_job in failures[failure]
+                          if failure_job not in removals]
+        if remaining_jobs:
+            results[failure] = remaining_jobs
 
     return results
 
@@ -44,20 +33,36 @@ def build_removals(active_jobs, failures, target):
     number_of_failures = int((target / 100) * len(failures))
     low_value_jobs = []
 
+    # Index the revisions each jobtype catches, and count how many of the jobtypes
+    # not yet removed catch each revision, so a removal only touches its own revisions.
+    caught_revisions = defaultdict(list)
+    catchers = {}
+    for revision, failure_jobs in failures.items():
+        failure_jobs = set(failure_jobs)
+        for failure_job in failure_jobs:
+            caught_revisions[failure_job].append(revision)
+        if failure_jobs:
+            catchers[revision] = len(failure_jobs)
+    remaining_failures = len(catchers)
+    removed_jobs = set()
+
     for jobtype in active_jobs:
+        if jobtype in removed_jobs:
+            low_value_jobs.append(jobtype)
+            continue
+
         # Determine if removing an active job will reduce the number of failures we would catch
         # or stay the same
-        remaining_failures = check_removal(failures, [jobtype])
+        revisions = caught_revisions.get(jobtype, [])
+        failed_revisions = [revision for revision in revisions if catchers[revision] == 1]
 
-        if len(remaining_failures) >= number_of_failures:
+        if remaining_failures - len(failed_revisions) >= number_of_failures:
             low_value_jobs.append(jobtype)
-            failures = remaining_failures
+            removed_jobs.add(jobtype)
+            for revision in revisions:
+                catchers[revision] -= 1
+            remaining_failures -= len(failed_revisions)
         else:
-            failed_revisions = []
-            for revision in failures:
-                if revision not in remaining_failures:
-                    failed_revisions.append(revision)
-
             logger.info("jobtype: %s is the root failure(s) of these %s revisions",
                         jobtype, failed_revisions)
 
@@ -81,11 +86,8 @@ def get_high_value_jobs(fixed_by_commit_jobs, target=100):
         target=target)
 
     # Only return high value jobs
-    for low_value_job in low_value_jobs:
-        try:
-            active_jobs.remove(low_value_job)
-        except ValueError:
-            logger.warning("%s is missing from the job list", low_value_job)
+    low_value_jobs = set(low_value_jobs)
+    active_jobs = [jobtype for jobtype in active_jobs if jobtype not in low_value_jobs]
 
     total = len(fixed_by_commit_jobs)
     total_detected = check_removal(fixed_by_commit_jobs, low_value_jobs)
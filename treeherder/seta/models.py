@@ -25,6 +25,7 @@ class JobPriorityManager(models.Manager):
         """
         # Only job priorities that don't have an expiration date (2 weeks for new jobs or year 2100
         # for jobs update via load_preseed) are updated
+        high_value_jobs = set(high_value_jobs)
         for jp in JobPriority.objects.filter(expiration_date__isnull=True):
             if jp.unique_identifier() not in high_value_jobs:
                 if jp.priority != SETA_LOW_VALUE_PRIORITY:
@@ -1,4 +1,6 @@
+from treeherder.etl.seta import refresh_reference_data_names
 from treeherder.seta.analyze_failures import AnalyzeFailures
+from treeherder.seta.settings import SETA_PROJECTS
 from treeherder.workers.task import retryable_task
 
 
@@ -6,3 +8,10 @@ from treeherder.workers.task import retryable_task
 def seta_analyze_failures():
     '''We analyze all starred test failures from the last four months which were fixed by a commit.'''
     AnalyzeFailures().run()
+
+
+@retryable_task(name='seta-refresh-reference-data-names', max_retries=3, soft_time_limit=5*60)
+def seta_refresh_reference_data_names():
+    '''Keep the reference data names the Gecko decision task asks SETA about cached.'''
+    for project in SETA_PROJECTS:
+        refresh_reference_data_names(project)
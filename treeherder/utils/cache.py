@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+class LRUCache:
+    """
+    A process-local mapping holding at most `max_size` entries, which evicts
+    the least recently used entries first. With a `ttl` (in seconds), entries
+    also expire that long after being set.
+
+        >>> cache = LRUCache(2)
+        >>> cache.set('a', 1)
+        >>> cache.set('b', 2)
+        >>> cache.get('a')
+        1
+        >>> cache.set('c', 3)
+        >>> cache.get('b') is None
+        True
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Maps each key to its value and expiry time (or None).
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get_entry(key) is not None
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                return default
+            return self._entries.pop(key)[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def bump_cache_version(version_key):
+    """
+    Makes every `VersionedLRUCache` using `version_key`, in any process,
+    drop its entries the next time it is refreshed.
+    """
+    cache.set(version_key, time.time(), None)
+
+
+class VersionedLRUCache(LRUCache):
+    """
+    An `LRUCache` of process-local copies of shared data (e.g. database rows),
+    which drops all of its entries whenever the version stored under
+    `version_key` in the shared cache changes, i.e. once something calls
+    `bump_cache_version(version_key)` because the copies may be stale.
+
+    Call `refresh()` before relying on the entries, e.g. once per task.
+    """
+
+    def __init__(self, version_key, max_size, ttl=None):
+        super().__init__(max_size, ttl=ttl)
+        self.version_key = version_key
+        self._version = None
+
+    def refresh(self):
+        version = cache.get_or_set(self.version_key, time.time(), None)
+        if version != self._version:
+            self.clear()
+            self._version = version
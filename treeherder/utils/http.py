@@ -1,17 +1,67 @@
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+
 import newrelic.agent
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import (ProtocolError,
+                                ReadTimeoutError)
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Size of the blocks a buffer is split into lines by, see `iter_lines()`.
+LINES_BLOCK_SIZE = 1024 * 1024
+# The number of hosts, and connections to each of them, kept open for reuse
+# by the requests of a process. More concurrent requests to a host than that
+# make extra connections, which are closed once done, rather than wait (with
+# no timeout) for a pooled one to be free.
+MAX_POOLED_HOSTS = 50
+MAX_CONNECTIONS_PER_HOST = 10
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the session shared by the requests of this process (and all its
+    threads), whose keep-alive connections save connecting to (and TLS
+    handshakes with) the same hosts over and over.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        # A forked process (e.g. a celery worker) mustn't use the connections
+        # of its parent.
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            # Unlike a browser, the requests of the session are unrelated.
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=MAX_POOLED_HOSTS,
+                                  pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
 
 
 def make_request(url, method='GET', headers=None, timeout=30, **kwargs):
     """A wrapper around requests to set defaults & call raise_for_status()."""
     headers = headers or {}
     headers['User-Agent'] = 'treeherder/{}'.format(settings.SITE_HOSTNAME)
-    response = requests.request(method,
-                                url,
-                                headers=headers,
-                                timeout=timeout,
-                                **kwargs)
+    response = get_session().request(method,
+                                     url,
+                                     headers=headers,
+                                     timeout=timeout,
+                                     **kwargs)
     if response.history:
         params = {
             'url': url,
@@ -38,3 +88,108 @@ def fetch_json(url, params=None, headers=None):
 def fetch_text(url):
     response = make_request(url)
     return response.text
+
+
+def download_to_file(url, file, check_response=None, max_attempts=3):
+    """
+    Download the body of ``url`` into the binary ``file``, undoing any gzip or
+    deflate Content-Encoding, and return the response.
+
+    If the connection drops part way through, the download is resumed from
+    where it stopped using a HTTP Range request, rather than started over
+    (unless the server doesn't support them). ``check_response`` is called
+    with the response before its body is read, e.g. to check its size.
+    """
+    received = 0  # The number of (still encoded) bytes of the body written so far.
+    for attempt in range(1, max_attempts + 1):
+        headers = {'Range': 'bytes={}-'.format(received)} if received else None
+        try:
+            with make_request(url, headers=headers, stream=True) as response:
+                if response.status_code != 206:
+                    # This is either the first attempt, or the server has
+                    # ignored the range and sent the whole body again.
+                    file.seek(0)
+                    file.truncate()
+                    received = 0
+                    if check_response:
+                        check_response(response)
+                    encoding = response.headers.get('Content-Encoding')
+                    decompressor = (_Decompressor() if encoding in ('gzip', 'deflate')
+                                    else None)
+
+                for chunk in response.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                    file.write(decompressor.decompress(chunk) if decompressor else chunk)
+                    received += len(chunk)
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                ProtocolError, ReadTimeoutError) as e:
+            if attempt == max_attempts:
+                raise
+            logger.warning("Resuming download of %s after %i bytes: %s", url, received, e)
+
+
+class _Decompressor:
+    """
+    Incrementally decompresses gzip or deflate encoded content, which like
+    urllib3 does, allows for several gzip members and trailing garbage.
+    """
+
+    def __init__(self):
+        self._obj = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        self._other_members = False
+
+    def decompress(self, data):
+        decompressed = []
+        while data and self._obj:
+            try:
+                decompressed.append(self._obj.decompress(data))
+            except zlib.error:
+                if not self._other_members:
+                    raise
+                # Ignore anything following the members.
+                self._obj = None
+                break
+            data = self._obj.unused_data
+            if data:
+                self._obj = zlib.decompressobj(32 + zlib.MAX_WBITS)
+                self._other_members = True
+        return b''.join(decompressed)
+
+
+@contextmanager
+def spool_download(url, check_response=None):
+    """
+    Download the body of ``url`` to a temporary file, and provide its contents
+    as a memory mapped buffer (or ``b''`` if empty).
+
+    Unlike reading the response as it arrives, this doesn't need the whole
+    body in memory, and a dropped connection doesn't mean starting over.
+    The arguments are as for ``download_to_file``.
+    """
+    with tempfile.TemporaryFile() as file:
+        download_to_file(url, file, check_response=check_response)
+        file.flush()
+        if not file.tell():
+            # Empty files can't be memory mapped.
+            yield b''
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+def iter_lines(buffer):
+    """
+    Lazily split a bytes-like buffer (such as a memory map) into lines, as
+    ``buffer.splitlines()`` would, without copying the whole buffer at once.
+
+        >>> list(iter_lines(b'foo\\r\\nbar\\rbaz\\n\\nqux'))
+        [b'foo', b'bar', b'baz', b'', b'qux']
+    """
+    start, size = 0, len(buffer)
+    while start < size:
+        # Split blocks at a line feed, so that no line break spans two blocks.
+        stop = buffer.rfind(b'\n', start, start + LINES_BLOCK_SIZE) + 1
+        if not stop:
+            stop = buffer.find(b'\n', start + LINES_BLOCK_SIZE) + 1 or size
+        yield from buffer[start:stop].splitlines()
+        start = stop